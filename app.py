@@ -1,16 +1,31 @@
 import pygame
-import random
 import math
 import time
-import sqlite3
-import datetime
-import pickle
 import os
+from collections import OrderedDict
+
+from database import DatabaseManager, DatabaseWorker, RunUploadQueue, post_runs
+from engine import GameEngine, log_category
+from catalog import SKILLS_DB, LOOT_DB, BOSS_WEAPONS
 
 # --- KONFIGURACE ---
 WIDTH, HEIGHT = 1000, 800
 TILE_SIZE = 60
 FPS = 60
+MAX_FPS = FPS  # strop snímků i během animací a psaní
+ADAPTIVE_FPS = True  # v klidu spí na pygame.event.wait místo clock.tick
+INPUT_BURST_MS = 500
+IDLE_WAIT_MS = 1000
+DB_TUNED = False  # WAL + busy timeout, když hra a web běží nad stejnou databází současně
+RUNS_URL = None  # např. "http://localhost:5000/api/runs" - runy jdou po dávkách na web místo přímo do DB
+RUNS_TOKEN = os.environ.get("SOLOLEVELING_INGEST_TOKEN", "")  # klíč, který web vyžaduje od klientů
+UPLOAD_BATCH = 20
+DB_TIMEOUT = 10.0  # s - požadavek na databázi, který se do té doby nevyřídí, skončí chybou
+DB_POLL_MS = 50  # jak často se při čekání na databázi kontroluje výsledek
+RANKING_LINES = 5  # žebříček na obrazovce konce hry
+RECORD_DIR = "recordings"  # nahrávky běhů pro replay.py (None = nenahrávat)
+RECORD_KEEP = 50  # nejvýš tolik nejnovějších nahrávek, starší se při nové nahrávce mažou
+HISTORY_LINES = 22  # řádků na obrazovce historie logu
 
 # --- BARVY (SOLO LEVELING NEON PALETTE) ---
 BG_COLOR = (5, 8, 15)
@@ -25,232 +40,95 @@ NEON_GRAY = (100, 100, 120)
 TXT_WHITE = (240, 240, 255)
 TXT_GRAY = (150, 150, 170)
 MANA_BLUE = (0, 100, 255)
+LOG_COLORS = {"SYSTEM": NEON_BLUE, "COMBAT": NEON_RED, "INFO": TXT_WHITE}
 
-# --- LOOT SYSTÉM ---
-LOOT_STANDARD = ["Demon Horn", "Torn Cloth", "Beast Fang", "Shadow Core", "Broken Bone", "Magic Dust", "Goblin Ear",
-                 "Wolf Pelt"]
-LOOT_CRAFTING = ["Iron Ore", "Magic Crystal"]
-
-LOOT_DB = {
-    "Demon Horn": 15, "Torn Cloth": 5, "Beast Fang": 25,
-    "Shadow Core": 50, "Broken Bone": 10, "Magic Dust": 35,
-    "Goblin Ear": 8, "Wolf Pelt": 12,
-    "Iron Ore": 10, "Magic Crystal": 20,
-    "Weapon Scraps": 150, "Armor Scraps": 100
-}
-
-# --- BOSS ZBRANĚ ---
-BOSS_WEAPONS = {
-    "Vulcan's Club": (15, 25, "str", 1.5, 1000),
-    "Metus' Scythe": (10, 30, "int", 1.6, 1500),
-    "Baran's Daggers": (20, 35, "dex", 1.8, 2500)
-}
-
-# --- BESTIÁŘ ---
-DEMON_TYPES = [
-    ("Goblin", 1, (100, 150, 100), 15, 3, 4, 5),
-    ("Low Rank Demon", 1, (150, 150, 150), 20, 5, 5, 10),
-    ("Dire Wolf", 2, (120, 120, 150), 25, 6, 8, 12),
-    ("Flying Demon", 3, (180, 120, 120), 30, 8, 10, 15),
-    ("Hobgoblin", 4, (100, 180, 100), 45, 12, 18, 25),
-    ("Cerberus", 5, (200, 100, 50), 60, 15, 25, 50),
-    ("Shadow Beast", 7, (80, 80, 80), 70, 18, 30, 35),
-    ("High Orc", 10, (50, 150, 50), 80, 20, 35, 40),
-    ("Vampire", 12, (200, 50, 50), 100, 25, 45, 60),
-    ("Demon Knight", 15, (100, 100, 200), 120, 30, 60, 80),
-    ("Death Knight", 18, (80, 50, 150), 140, 40, 80, 100),
-    ("Arch-Lich", 20, (150, 50, 200), 150, 50, 100, 150),
-    ("Bone Dragon", 25, (220, 220, 220), 200, 60, 150, 200),
-]
-
-# --- DEFINICE SKILLŮ ---
-SKILLS_DB = {
-    "FIGHTER": {"Q": ("Smash", 10, 3, 2.0, "DMG"), "W": ("Iron Skin", 15, 5, 10, "BUFF"),
-                "E": ("War Cry", 20, 8, 0.5, "HEAL")},
-    "ASSASSIN": {"Q": ("Vital Strike", 10, 2, 1.5, "DMG"), "W": ("Poison Edge", 15, 4, 2.5, "DMG"),
-                 "E": ("Shadow Step", 20, 6, 0, "ESCAPE")},
-    "MAGE": {"Q": ("Fireball", 15, 2, 2.5, "DMG"), "W": ("Ice Barrier", 20, 5, 20, "BUFF"),
-             "E": ("Meteor", 50, 10, 5.0, "DMG")},
-    "MONARCH": {"Q": ("Dominator's Touch", 10, 1, 2.0, "DMG"), "W": ("Ruler's Authority", 20, 4, 3.0, "DMG"),
-                "E": ("Full Recovery", 50, 10, 1.0, "HEAL")}
-}
-
-# --- CLASSES ---
-CLASSES = {
-    "FIGHTER": {"stats": {"vigor": 15, "str": 12, "dex": 5, "int": 5, "sense": 5, "def": 3, "mana": 30},
-                "weapon": ("Vanguard Shield", 8, 12, "str", 1.0, 0)},
-    "ASSASSIN": {"stats": {"vigor": 8, "str": 8, "dex": 16, "int": 10, "sense": 15, "def": 0, "mana": 40},
-                 "weapon": ("Kasaka's Fang", 10, 18, "dex", 1.3, 0)},
-    "MAGE": {"stats": {"vigor": 6, "str": 4, "dex": 8, "int": 20, "sense": 10, "def": 0, "mana": 100},
-             "weapon": ("Orb of Greed", 12, 20, "int", 1.4, 0)},
-    "MONARCH": {"stats": {"vigor": 15, "str": 15, "dex": 15, "int": 20, "sense": 15, "def": 2, "mana": 80},
-                "weapon": ("Kamish's Wrath", 25, 40, "str", 1.8, 0)}
-}
-
-
-# --- DATABÁZE ---
-class DatabaseManager:
-    def __init__(self, db_name="sololeveling_v15.db"):
-        self.conn = sqlite3.connect(db_name)
-        self.cursor = self.conn.cursor()
-        self.create_table()
-
-    def create_table(self):
-        self.cursor.execute('''CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, password TEXT)''')
-        self.cursor.execute(
-            '''CREATE TABLE IF NOT EXISTS hunters (id INTEGER PRIMARY KEY, date TEXT, name TEXT, class TEXT, floor INTEGER, level INTEGER, souls INTEGER)''')
-        self.conn.commit()
-
-    def verify_login(self, username, password):
-        self.cursor.execute('SELECT * FROM users WHERE username=?', (username,))
-        user = self.cursor.fetchone()
-        if user is None:
-            # Hráč neexistuje na webu, nepustíme ho do hry!
-            return False
-        else:
-            return user[1] == password
-
-    def save_run(self, name, p_class, floor, level, souls):
-        date = datetime.datetime.now().strftime("%Y-%m-%d")
-        self.cursor.execute('INSERT INTO hunters (date, name, class, floor, level, souls) VALUES (?,?,?,?,?,?)',
-                            (date, name, p_class, floor, level, souls))
-        self.conn.commit()
-
-    def get_rankings(self):
-        self.cursor.execute('SELECT * FROM hunters ORDER BY floor DESC, level DESC LIMIT 8')
-        return self.cursor.fetchall()
-
-
-# --- ENTITY ---
-class Weapon:
-    def __init__(self, name, min_d, max_d, stat, rank, val):
-        self.name, self.min_dmg, self.max_dmg = name, min_d, max_d
-        self.scaling_stat, self.scaling_rank, self.value = stat, rank, val
-
-
-class Player:
-    def __init__(self, name, class_key="FIGHTER"):
-        self.name = name
-        self.grid_x, self.grid_y = 0, 0
-        self.prev_x, self.prev_y = 0, 0
-        self.class_name = class_key
-
-        c = CLASSES[class_key]
-        self.stats = c["stats"].copy()
-        self.level, self.xp, self.xp_next = 1, 0, 100
-        self.souls, self.shadows = 0, 0
-        self.stat_points = 0
-        self.has_holy_water = False
-
-        w = c["weapon"]
-        self.weapon = Weapon(w[0], w[1], w[2], w[3], w[4], w[5])
-        self.armor_name = "Basic Clothes"
-        self.inventory = ["Healing Stone"]
-
-        self.max_hp, self.current_hp = 0, 0
-        self.max_mana, self.current_mana = 0, 0
-        self.total_def = 0
-        self.cooldowns = {"Q": 0, "W": 0, "E": 0}
-
-        self.recalculate()
-        self.current_hp = self.max_hp
-        self.current_mana = self.max_mana
-
-    def recalculate(self):
-        self.max_hp = (self.stats["vigor"] * 10)
-        self.max_mana = (self.stats["int"] * 5) + self.stats.get("mana", 20)
-        self.total_def = self.stats["def"] + (self.stats["str"] // 5)
-        if self.current_hp > self.max_hp: self.current_hp = self.max_hp
-        if self.current_mana > self.max_mana: self.current_mana = self.max_mana
-
-    def check_level_up(self):
-        leveled_up = False
-        while self.xp >= self.xp_next:
-            self.xp -= self.xp_next
-            self.level += 1
-            self.stat_points += 5
-            self.xp_next = int(self.xp_next * 1.2)
-            leveled_up = True
-        if leveled_up:
-            self.recalculate()
-            self.current_hp = self.max_hp
-            self.current_mana = self.max_mana
-        return leveled_up
-
-    def tick_cooldowns(self):
-        for k in self.cooldowns:
-            if self.cooldowns[k] > 0: self.cooldowns[k] -= 1
-        regen = max(1, int(self.max_mana * 0.05))
-        self.current_mana = min(self.max_mana, self.current_mana + regen)
-        if self.has_holy_water:
-            hp_regen = max(2, int(self.max_hp * 0.05))
-            self.current_hp = min(self.max_hp, self.current_hp + hp_regen)
-
-    def attack(self):
-        base = random.randint(self.weapon.min_dmg, self.weapon.max_dmg)
-        stat = self.stats.get(self.weapon.scaling_stat, 10)
-        total = base + int(stat * self.weapon.scaling_rank)
-        crit = random.randint(1, 100) <= min(self.stats["sense"], 50)
-        if crit: total = int(total * 1.5)
-        return total, crit
-
-    def use_shadows(self):
-        if self.shadows >= 3:
-            self.shadows -= 3
-            return self.stats["int"] * 5
-        return 0
-
-    def get_power_rating(self):
-        avg_dmg = (self.weapon.min_dmg + self.weapon.max_dmg) / 2
-        stat_bonus = self.stats[self.weapon.scaling_stat] * self.weapon.scaling_rank
-        return self.max_hp + ((avg_dmg + stat_bonus) * 6) + (self.total_def * 5)
-
-
-class Enemy:
-    def __init__(self, floor, is_boss=False):
-        self.is_boss = is_boss
-        scale = 1.0 + (floor * 0.15)
-        if is_boss:
-            if floor < 20:
-                name = "VULCAN"
-            elif floor < 50:
-                name = "METUS"
-            else:
-                name = "BARAN"
-            self.name = name;
-            self.color = NEON_RED
-            self.hp, self.dmg = int(300 * scale), int(30 * scale)
-            self.xp, self.souls = int(500 * scale), int(300 * scale)
-        else:
-            avail = [e for e in DEMON_TYPES if e[1] <= floor] or [DEMON_TYPES[0]]
-            n, _, c, hp, d, xp_val, s = random.choice(avail)
-            self.name, self.color = n, c
-            self.hp, self.dmg = int(hp * scale), int(d * scale)
-            self.xp, self.souls = int(xp_val * scale), int(s * scale)
-        self.max_hp = self.hp
-
-    def get_power_rating(self):
-        return self.max_hp + (self.dmg * 6)
-
-
-class Room:
-    def __init__(self, from_dir=None):
-        self.enemies = []
-        self.exits = {'N': False, 'S': False, 'E': False, 'W': False}
-        for d in ['N', 'S', 'E', 'W']:
-            if random.random() > 0.4: self.exits[d] = True
-        if from_dir:
-            self.exits[{'N': 'S', 'S': 'N', 'E': 'W', 'W': 'E'}[from_dir]] = True
+# --- OVLÁDÁNÍ ---
+COMBAT_KEYS = {pygame.K_SPACE: "ATTACK", pygame.K_q: "Q", pygame.K_w: "W", pygame.K_e: "E",
+               pygame.K_s: "SHADOWS", pygame.K_h: "POTION", pygame.K_u: "RUN"}
+STAT_KEYS = {pygame.K_1: "str", pygame.K_2: "dex", pygame.K_3: "int", pygame.K_4: "vigor", pygame.K_5: "sense"}
 
 
 # --- GRAPHICS HELPER ---
-def draw_glow_rect(surface, color, rect, thickness=2, glow_size=10):
-    pygame.draw.rect(surface, color, rect, thickness)
+class LRUCache:
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.hits, self.misses = 0, 0
+
+    def get(self, key):
+        item = self.items.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.items.move_to_end(key)
+        return item
+
+    def put(self, key, item):
+        self.items[key] = item
+        self.items.move_to_end(key)
+        while len(self.items) > self.max_size:
+            self.items.popitem(last=False)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.items)}
+
+
+GLOW_CACHE = LRUCache(256)
+TEXT_CACHE = LRUCache(512)
+FONTS = {}
+
+
+def get_font(size):
+    font = FONTS.get(size)
+    if font is None:
+        font = FONTS[size] = pygame.font.Font(None, size)
+    return font
+
+
+def render_text(text, color, size=24):
+    # Hotové povrchy textu, font.render se volá jen pro nový text
+    key = (text, tuple(color), size)
+    surf = TEXT_CACHE.get(key)
+    if surf is None:
+        surf = get_font(size).render(text, True, color)
+        TEXT_CACHE.put(key, surf)
+    return surf
+
+
+def build_glow_sprite(color, w, h, thickness, glow_size):
+    # Všechny prstence záře + samotný rámeček do jednoho povrchu
+    pad = max(glow_size - 1, 0)
+    s = pygame.Surface((w + pad * 2, h + pad * 2), pygame.SRCALPHA)
     for i in range(glow_size):
         alpha = int(100 - (i * (100 / glow_size)))
-        s = pygame.Surface((rect[2] + i * 2, rect[3] + i * 2), pygame.SRCALPHA)
-        pygame.draw.rect(s, (*color, alpha), (0, 0, rect[2] + i * 2, rect[3] + i * 2), 1)
-        surface.blit(s, (rect[0] - i, rect[1] - i))
+        pygame.draw.rect(s, (*color, alpha), (pad - i, pad - i, w + i * 2, h + i * 2), 1)
+    pygame.draw.rect(s, color, (pad, pad, w, h), thickness)
+    if pygame.display.get_surface() is not None: s = s.convert_alpha()
+    return s
+
+
+def draw_glow_rect(surface, color, rect, thickness=2, glow_size=10):
+    key = (tuple(color), int(rect[2]), int(rect[3]), thickness, glow_size)
+    sprite = GLOW_CACHE.get(key)
+    if sprite is None:
+        sprite = build_glow_sprite(*key)
+        GLOW_CACHE.put(key, sprite)
+    pad = max(glow_size - 1, 0)
+    surface.blit(sprite, (rect[0] - pad, rect[1] - pad))
+
+
+class DirtyRegions:
+    def __init__(self):
+        self.keys = {}
+
+    def changed(self, name, key):
+        if name in self.keys and self.keys[name] == key: return False
+        self.keys[name] = key
+        return True
+
+    def invalidate(self):
+        self.keys.clear()
 
 
 # --- GAME ENGINE ---
@@ -260,9 +138,26 @@ class Game:
         self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
         pygame.display.set_caption("Solo Leveling: Arise")
         self.clock = pygame.time.Clock()
-        self.font = pygame.font.Font(None, 24)
-        self.title_font = pygame.font.Font(None, 40)
-        self.db = DatabaseManager()
+        self.font = get_font(24)
+        self.title_font = get_font(40)
+        self.db = DatabaseWorker(lambda: DatabaseManager(tuned=DB_TUNED), DB_TIMEOUT)
+        self.requests = {}  # jméno -> (Future z DatabaseWorker, funkce volaná po dokončení)
+        self.run_status, self.rankings = "", None
+        self.uploads = RunUploadQueue("runs_queue.jsonl", post_runs(RUNS_URL, RUNS_TOKEN), UPLOAD_BATCH) if RUNS_URL else None
+        self.bg_layer, self.overlays = None, {}
+        self.regions = DirtyRegions()
+        self.input_rev = 0
+        self.adaptive, self.max_fps = ADAPTIVE_FPS, MAX_FPS
+        self.frames_rendered, self.frames_total, self.last_input = 0, 0, 0
+        cx, cy = WIDTH // 2, HEIGHT // 2
+        screen_rect = self.screen.get_rect()
+        self.layers = [
+            ("map", pygame.Rect(cx - 5 * TILE_SIZE - 4, cy - 5 * TILE_SIZE - 4, 11 * TILE_SIZE + 8,
+                                11 * TILE_SIZE + 8).clip(screen_rect), self.draw_map),
+            ("hud", pygame.Rect(WIDTH - 300, 0, 300, HEIGHT), self.draw_hud),
+            ("log", pygame.Rect(0, HEIGHT - 250, WIDTH, 250), self.draw_log),
+            ("combat", pygame.Rect(cx - 159, cy - 159, 318, 284), self.draw_combat),
+        ]
 
         self.state = "LOGIN"
         self.input_user = ""
@@ -271,262 +166,65 @@ class Game:
         self.login_error = ""
 
         self.selected_class = "FIGHTER"
-        self.reset_game_data()
         self.save_file = "savegame_mmo.dat"
+        self.engine = GameEngine(self.save_file, record_dir=RECORD_DIR, record_keep=RECORD_KEEP)
+        self.reset_game_data()
+
+    # Stav hry drží GameEngine, Game jen čte pro vykreslení
+    player = property(lambda self: self.engine.player)
+    map = property(lambda self: self.engine.map)
+    log = property(lambda self: self.engine.log)
+    floor = property(lambda self: self.engine.floor)
+    store = property(lambda self: self.engine.store)
+    map_rev = property(lambda self: self.engine.map_rev)
 
     def reset_game_data(self):
-        self.player, self.map, self.log = None, {}, []
-        self.floor = 1
-        self.has_key, self.boss_spawned, self.boss_active = False, False, False
-        self.boss_coords, self.player_moves = None, 0
+        self.engine.reset()
         self.inv_sel = 0
-        self.pending_level_up = False
-        self.store = [("Healing Stone", 100), ("Killer Dagger", 500), ("STR Boost", 300), ("AGI Boost", 300)]
-
-    def save_game(self):
-        data = {"player": self.player, "floor": self.floor, "map": self.map, "log": self.log, "has_key": self.has_key,
-                "boss_spawned": self.boss_spawned, "boss_active": self.boss_active, "boss_coords": self.boss_coords,
-                "store": self.store}
-        try:
-            with open(self.save_file, "wb") as f:
-                pickle.dump(data, f)
-        except:
-            pass
-
-    def load_game(self):
-        if not os.path.exists(self.save_file): return False
-        try:
-            with open(self.save_file, "rb") as f:
-                data = pickle.load(f)
-            self.player = data["player"]
-            if not hasattr(self.player, 'stat_points'): self.player.stat_points = 0
-            if not hasattr(self.player, 'has_holy_water'): self.player.has_holy_water = False
-            if not hasattr(self.player, 'armor_name'): self.player.armor_name = "Basic Clothes"
-
-            if self.player.name != self.input_user: return False
-            self.floor, self.map, self.log = data["floor"], data["map"], data["log"]
-            self.has_key, self.boss_spawned = data["has_key"], data.get("boss_spawned", False)
-            self.boss_active, self.boss_coords = data.get("boss_active", False), data.get("boss_coords", None)
-            self.store = data.get("store", [])
-            return True
-        except:
-            return False
-
-    def check_shop_unlocks(self):
-        if self.floor >= 5:
-            for i in [("Elixir of Life", 500), ("Shadow Armor", 1500)]:
-                if i not in self.store: self.store.append(i)
-        if self.floor >= 10:
-            for i in [("Demon King's Sword", 2500), ("Orb of Avarice", 2000)]:
-                if i not in self.store: self.store.append(i)
-
-    def start_game(self):
-        self.player = Player(self.input_user, self.selected_class)
-        self.floor = 1
-        self.map = {(0, 0): Room()}
-        self.map[(0, 0)].exits = {'N': True, 'S': True, 'E': True, 'W': True}
-        self.log = [f"SYSTEM: Welcome, Hunter {self.input_user}."]
-        self.has_key, self.boss_spawned, self.boss_active = False, False, False
-        self.boss_coords, self.player_moves = None, 0
-        self.pending_level_up = False
-
-    def add_log(self, txt):
-        self.log.append(txt)
-        if len(self.log) > 8: self.log.pop(0)
-
-    def generate_room(self, x, y, from_dir):
-        if (x, y) not in self.map:
-            r = Room(from_dir)
-            if random.random() < (0.5 + self.floor * 0.02) and (x != 0 or y != 0):
-                for _ in range(random.randint(1, 3)): r.enemies.append(Enemy(self.floor))
-            if self.has_key and not self.boss_spawned and math.hypot(x, y) > 5:
-                r.enemies = [Enemy(self.floor, is_boss=True)]
-                self.boss_spawned, self.boss_active, self.boss_coords = True, True, (x, y)
-                self.add_log("WARNING: Boss Signature Detected!")
-            self.map[(x, y)] = r
-
-    def move_boss(self):
-        if not self.boss_active or not self.boss_coords: return
-        bx, by = self.boss_coords
-        px, py = self.player.grid_x, self.player.grid_y
-        if (bx, by) == (px, py): return
-
-        nbx, nby = bx, by
-        if bx < px:
-            nbx += 1
-        elif bx > px:
-            nbx -= 1
-        if nbx == bx:
-            if by < py:
-                nby += 1
-            elif by > py:
-                nby -= 1
-
-        if (nbx, nby) in self.map:
-            old_room, target_room = self.map[(bx, by)], self.map[(nbx, nby)]
-            boss_obj = next((e for e in old_room.enemies if e.is_boss), None)
-            if boss_obj:
-                old_room.enemies.remove(boss_obj)
-                target_room.enemies.append(boss_obj)
-                self.boss_coords = (new_bx, new_by) = (nbx, nby)
-                if (nbx, nby) == (px, py):
-                    self.add_log("ALERT: BOSS HAS FOUND YOU!")
-                    self.state = "COMBAT"
-
-    def move(self, dx, dy, d_str):
-        curr = self.map[(self.player.grid_x, self.player.grid_y)]
-        if curr.enemies: return
-        if not curr.exits.get(d_str): return
-
-        nx, ny = self.player.grid_x + dx, self.player.grid_y + dy
-        self.player.prev_x, self.player.prev_y = self.player.grid_x, self.player.grid_y
-        self.generate_room(nx, ny, d_str)
-        self.player.grid_x, self.player.grid_y = nx, ny
-
-        self.player_moves += 1
-        if self.player_moves % 2 == 0: self.move_boss()
-        self.save_game()
-
-        if self.map[(nx, ny)].enemies:
-            self.state = "COMBAT"
-            self.add_log(f"ENEMIES: {len(self.map[(nx, ny)].enemies)} targets.")
-
-    def get_sellable_loot_value(self):
-        return sum(LOOT_DB.get(item, 0) for item in self.player.inventory)
-
-    def count_item(self, item_name):
-        return sum(1 for i in self.player.inventory if i == item_name)
-
-    def remove_items(self, item_name, count):
-        for _ in range(count):
-            if item_name in self.player.inventory:
-                self.player.inventory.remove(item_name)
-
-    def combat(self, action):
-        room = self.map[(self.player.grid_x, self.player.grid_y)]
-        target = room.enemies[0]
-        turn_ended = True
-
-        if action in ["Q", "W", "E"]:
-            s_name, s_cost, s_cd, s_val, s_type = SKILLS_DB[self.player.class_name][action]
-            if self.player.current_mana < s_cost:
-                self.add_log("SYSTEM: Not enough Mana!");
-                turn_ended = False
-            elif self.player.cooldowns[action] > 0:
-                self.add_log(f"SYSTEM: {s_name} is on CD!");
-                turn_ended = False
-            else:
-                self.player.current_mana -= s_cost
-                self.player.cooldowns[action] = s_cd
-                self.add_log(f"SKILL: Used {s_name}!")
-
-                if s_type == "DMG":
-                    dmg, crit = self.player.attack()
-                    dmg = int(dmg * s_val)
-                    target.hp -= dmg
-                    self.add_log(f"HIT: {dmg} Damage!")
-                elif s_type == "HEAL":
-                    heal = int(self.player.max_hp * s_val) if s_val < 1.0 else int(s_val)
-                    self.player.current_hp = min(self.player.max_hp, self.player.current_hp + heal)
-                    self.add_log(f"HEAL: Recovered {heal} HP.")
-                elif s_type == "BUFF":
-                    self.add_log("BUFF: Effect applied.")
-                elif s_type == "ESCAPE":
-                    self.player.grid_x, self.player.grid_y = self.player.prev_x, self.player.prev_y
-                    self.state = "EXPLORE";
-                    self.add_log("SYSTEM: Vanished into shadows!")
-                    return
-
-        elif action == "RUN":
-            cost = 50 * self.floor
-            if self.player.souls >= cost:
-                self.player.souls -= cost
-                self.player.grid_x, self.player.grid_y = self.player.prev_x, self.player.prev_y
-                self.state = "EXPLORE";
-                self.add_log("ESCAPED!");
-                return
-            else:
-                self.add_log("SYSTEM: Insufficient Souls.");
-                turn_ended = False
-
-        elif action == "ATTACK":
-            dmg, crit = self.player.attack()
-            target.hp -= dmg
-            self.add_log(f"ATTACK: {dmg}{' [CRIT]' if crit else ''}")
-
-        elif action == "SHADOWS":
-            dmg = self.player.use_shadows()
-            if dmg > 0:
-                self.add_log(f"ARISE: {dmg} DMG to all.")
-                for e in room.enemies: e.hp -= dmg
-            else:
-                self.add_log("SYSTEM: Need 3 Shadows.");
-                turn_ended = False
-
-        dead_enemies = [e for e in room.enemies if e.hp <= 0]
-        room.enemies = [e for e in room.enemies if e.hp > 0]
-
-        for e in dead_enemies:
-            self.player.souls += e.souls
-            self.player.xp += e.xp
-            if random.random() < 0.3: self.player.shadows += 1
-
-            if e.is_boss:
-                self.boss_active, self.boss_coords = False, None
-                if e.name == "VULCAN" and random.random() < 0.3:
-                    self.player.inventory.append("Vulcan's Club")
-                    self.add_log("EPIC DROP: Vulcan's Club!")
-                elif e.name == "METUS" and random.random() < 0.3:
-                    self.player.inventory.append("Metus' Scythe")
-                    self.add_log("EPIC DROP: Metus' Scythe!")
-                elif e.name == "BARAN" and random.random() < 0.3:
-                    self.player.inventory.append("Baran's Daggers")
-                    self.add_log("EPIC DROP: Baran's Daggers!")
-
-                if self.floor == 10:
-                    self.player.inventory.append("Purified Blood")
-                elif self.floor == 20:
-                    self.player.inventory.append("World Tree Fragment")
-                elif self.floor == 30:
-                    self.player.inventory.append("Echoing Spring Water")
+        self.history_top = 0
+
+    def act(self, action, arg=None):
+        prev = self.engine.state
+        self.engine.step(action, arg)
+        if self.engine.state != prev:
+            self.state = self.engine.state
+            if self.state == "GAMEOVER":
+                run = (self.player.name, self.player.class_name, self.floor, self.player.level, self.player.souls)
+                self.rankings = None
+                if self.uploads:
+                    self.uploads.put(*run)
+                    self.run_status = "Run queued for upload."
+                else:
+                    # Žebříček se zařadí za uložení, takže už obsahuje tento run
+                    self.run_status = "Saving run..."
+                    self.request("save", self.db.save_run(*run), self.run_saved)
+                    self.request("rankings", self.db.get_rankings(RANKING_LINES), self.rankings_loaded)
+
+    # --- DATABÁZE (vlákno DatabaseWorker, smyčka jen kontroluje hotové požadavky) ---
+    def request(self, name, future, done):
+        self.requests[name] = (future, done)
+
+    def poll_requests(self):
+        for name, (future, done) in list(self.requests.items()):
+            if future.done():
+                del self.requests[name]
+                done(future)
+                self.input_rev += 1  # překreslit obrazovku s výsledkem
+
+    def login_done(self, future):
+        if future.exception():
+            self.login_error = "Database busy, try again."
+        elif future.result():
+            self.state = "MENU"
+            self.login_error = ""
+        else:
+            self.login_error = "Invalid Login! Register on the WEBSITE first."
 
-            else:
-                if random.random() < 0.4:
-                    if random.random() < 0.5:
-                        drop = random.choice(LOOT_STANDARD)
-                    else:
-                        drop = random.choice(LOOT_CRAFTING)
-                    self.player.inventory.append(drop)
-                    self.add_log(f"DROPPED: {drop}")
-
-            if not self.has_key and random.random() < 0.1:
-                self.has_key = True;
-                self.add_log("ITEM: Found Key.")
-
-        if self.player.check_level_up():
-            self.add_log("SYSTEM: LEVEL UP! Press [C] to Upgrade Stats.")
-
-        if not room.enemies:
-            if any(e.is_boss for e in dead_enemies):
-                self.floor += 1;
-                self.check_shop_unlocks();
-                self.state = "NEXT_FLOOR"
-            else:
-                self.state = "EXPLORE";
-                self.save_game()
-            return
-
-        if turn_ended:
-            self.player.tick_cooldowns()
-            dmg_taken = sum(max(1, e.dmg - self.player.total_def) for e in room.enemies)
-            if dmg_taken > 0:
-                self.player.current_hp -= dmg_taken
-                self.add_log(f"DEFENSE: Took {dmg_taken} dmg.")
-            if self.player.current_hp <= 0:
-                self.db.save_run(self.player.name, self.player.class_name, self.floor, self.player.level,
-                                 self.player.souls)
-                if os.path.exists(self.save_file): os.remove(self.save_file)
-                self.state = "GAMEOVER"
+    def run_saved(self, future):
+        self.run_status = "Run not saved: database busy." if future.exception() else "Run saved."
+
+    def rankings_loaded(self, future):
+        self.rankings = [] if future.exception() else future.result()
 
     def get_name_color(self, enemy):
         p_pow = self.player.get_power_rating()
@@ -539,41 +237,55 @@ class Game:
             return NEON_GOLD
 
     # --- DRAWING ---
-    def draw_bg(self):
-        self.screen.fill(BG_COLOR)
-        for x in range(0, WIDTH, 40): pygame.draw.line(self.screen, GRID_COLOR, (x, 0), (x, HEIGHT))
-        for y in range(0, HEIGHT, 40): pygame.draw.line(self.screen, GRID_COLOR, (0, y), (WIDTH, y))
-        pygame.draw.rect(self.screen, NEON_BLUE, (0, 0, WIDTH, HEIGHT), 2)
+    def build_bg(self):
+        w, h = self.screen.get_size()
+        bg = pygame.Surface((w, h)).convert()
+        bg.fill(BG_COLOR)
+        for x in range(0, w, 40): pygame.draw.line(bg, GRID_COLOR, (x, 0), (x, h))
+        for y in range(0, h, 40): pygame.draw.line(bg, GRID_COLOR, (0, y), (w, y))
+        pygame.draw.rect(bg, NEON_BLUE, (0, 0, w, h), 2)
+        self.bg_layer, self.overlays = bg, {}
+        self.player_glow = pygame.Surface((40, 40), pygame.SRCALPHA)
+        pygame.draw.circle(self.player_glow, (*NEON_BLUE, 100), (20, 20), 18)
+        self.regions.invalidate()
 
-    def draw_game(self):
-        self.draw_bg()
+    def draw_bg(self):
+        if self.bg_layer is None or self.bg_layer.get_size() != self.screen.get_size(): self.build_bg()
+        self.screen.blit(self.bg_layer, (0, 0))
+
+    def draw_overlay(self, alpha):
+        # Jeden tmavý povrch na úroveň průhlednosti, znovu se staví jen se změnou okna
+        if self.bg_layer is None or self.bg_layer.get_size() != self.screen.get_size(): self.build_bg()
+        overlay = self.overlays.get(alpha)
+        if overlay is None:
+            overlay = pygame.Surface(self.screen.get_size()).convert()
+            overlay.fill((0, 0, 0))
+            overlay.set_alpha(alpha)
+            self.overlays[alpha] = overlay
+        self.screen.blit(overlay, (0, 0))
+
+    def draw_map(self):
         cx, cy = WIDTH // 2, HEIGHT // 2
-        for dy in range(-5, 6):
-            for dx in range(-5, 6):
-                gx, gy = self.player.grid_x + dx, self.player.grid_y - dy
-                sx, sy = cx + dx * TILE_SIZE, cy + dy * TILE_SIZE
-                if (gx, gy) in self.map:
-                    room = self.map[(gx, gy)]
-                    col = NEON_RED if room.enemies else NEON_GRAY
-                    pygame.draw.rect(self.screen, (10, 10, 15), (sx, sy, TILE_SIZE, TILE_SIZE))
-                    draw_glow_rect(self.screen, col, (sx, sy, TILE_SIZE, TILE_SIZE), 1, 5)
-
-                    if room.enemies:
-                        ec = NEON_GOLD if room.enemies[0].is_boss else NEON_RED
-                        radius = 10 + len(room.enemies) * 2
-                        pygame.draw.circle(self.screen, ec, (sx + 30, sy + 30), radius)
-
-                        # ČÍSLO POČTU NEPŘÁTEL NA MAPĚ
-                        num_txt = self.font.render(str(len(room.enemies)), True, (0, 0, 0))
-                        self.screen.blit(num_txt,
-                                         (sx + 30 - num_txt.get_width() // 2, sy + 30 - num_txt.get_height() // 2))
+        px, py = self.player.grid_x, self.player.grid_y
+        for gx, gy, mask, enemies in self.map.rooms_in_rect(px - 5, py - 5, px + 5, py + 5):
+            sx, sy = cx + (gx - px) * TILE_SIZE, cy + (py - gy) * TILE_SIZE
+            col = NEON_RED if enemies else NEON_GRAY
+            pygame.draw.rect(self.screen, (10, 10, 15), (sx, sy, TILE_SIZE, TILE_SIZE))
+            draw_glow_rect(self.screen, col, (sx, sy, TILE_SIZE, TILE_SIZE), 1, 5)
+
+            if enemies:
+                ec = NEON_GOLD if enemies[0].is_boss else NEON_RED
+                radius = 10 + len(enemies) * 2
+                pygame.draw.circle(self.screen, ec, (sx + 30, sy + 30), radius)
+
+                # ČÍSLO POČTU NEPŘÁTEL NA MAPĚ
+                num_txt = render_text(str(len(enemies)), (0, 0, 0))
+                self.screen.blit(num_txt, (sx + 30 - num_txt.get_width() // 2, sy + 30 - num_txt.get_height() // 2))
 
         pygame.draw.circle(self.screen, NEON_BLUE, (cx + 30, cy + 30), 12)
-        s = pygame.Surface((40, 40), pygame.SRCALPHA)
-        pygame.draw.circle(s, (*NEON_BLUE, 100), (20, 20), 18)
-        self.screen.blit(s, (cx + 10, cy + 10))
+        self.screen.blit(self.player_glow, (cx + 10, cy + 10))
 
-        # HUD
+    def draw_hud(self):
         px = WIDTH - 300
         pygame.draw.rect(self.screen, (5, 10, 15), (px, 0, 300, HEIGHT))
         pygame.draw.line(self.screen, NEON_BLUE, (px, 0), (px, HEIGHT), 2)
@@ -581,7 +293,7 @@ class Game:
 
         def txt(t, c=TXT_WHITE, sz=24):
             nonlocal y
-            self.screen.blit(pygame.font.Font(None, sz).render(t, True, c), (px + 20, y))
+            self.screen.blit(render_text(t, c, sz), (px + 20, y))
             y += sz + 5
 
         txt(f"FLOOR: {self.floor}", NEON_BLUE, 40)
@@ -614,16 +326,16 @@ class Game:
                 col = TXT_GRAY; suffix = f" (CD: {cd})"
             elif self.player.current_mana < s_cost:
                 col = NEON_RED
-            self.screen.blit(self.font.render(f"[{k}] {s_name}{suffix}", True, col), (px + 20, y));
+            self.screen.blit(render_text(f"[{k}] {s_name}{suffix}", col), (px + 20, y));
             y += 25
 
         y += 10
         txt("[I] Inv  [C] Char  [K] Craft  [H] Help", NEON_GREEN)
 
         if self.player.has_holy_water:
-            self.screen.blit(self.font.render("BUFF: Holy Water Regen", True, NEON_GREEN), (px + 20, y))
+            self.screen.blit(render_text("BUFF: Holy Water Regen", NEON_GREEN), (px + 20, y))
         elif self.player.stat_points > 0 and int(time.time() * 2) % 2 == 0:
-            self.screen.blit(self.font.render(f"POINTS AVAILABLE: {self.player.stat_points} [C]", True, NEON_GOLD),
+            self.screen.blit(render_text(f"POINTS AVAILABLE: {self.player.stat_points} [C]", NEON_GOLD),
                              (px + 20, y))
         y += 25
 
@@ -634,42 +346,314 @@ class Game:
                 pygame.draw.rect(self.screen, NEON_GREEN if curr.exits[d] else NEON_RED,
                                  (px + 20 + pos[0], y + pos[1], 20, 20))
 
-        for l in self.log:
-            c = NEON_BLUE if "SYSTEM" in l else (NEON_RED if "COMBAT" in l else TXT_WHITE)
-            self.screen.blit(self.font.render(l, True, c), (20, HEIGHT - 250 + self.log.index(l) * 25))
+    def draw_log(self):
+        for i, entry in enumerate(self.log.entries()):
+            if entry.surface is None: entry.surface = render_text(entry.text, LOG_COLORS[entry.category])
+            self.screen.blit(entry.surface, (20, HEIGHT - 250 + i * 25))
 
+    def draw_combat(self):
+        cx, cy = WIDTH // 2, HEIGHT // 2
         if self.state == "COMBAT":
             e = self.map[(self.player.grid_x, self.player.grid_y)].enemies[0]
             col = self.get_name_color(e)
             draw_glow_rect(self.screen, col, (cx - 150, cy - 150, 300, 100), 2)
             pygame.draw.rect(self.screen, (0, 0, 0), (cx - 150, cy - 150, 300, 100))
-            self.screen.blit(self.title_font.render(e.name, True, col), (cx - 100, cy - 130))
-            self.screen.blit(self.font.render(f"HP: {e.hp}/{e.max_hp}", True, TXT_WHITE), (cx - 50, cy - 90))
-            self.screen.blit(self.font.render("[SPACE] ATTACK   [Q/W/E] SKILLS", True, NEON_BLUE), (cx - 140, cy + 100))
+            self.screen.blit(render_text(e.name, col, 40), (cx - 100, cy - 130))
+            self.screen.blit(render_text(f"HP: {e.hp}/{e.max_hp}", TXT_WHITE), (cx - 50, cy - 90))
+            self.screen.blit(render_text("[SPACE] ATTACK   [Q/W/E] SKILLS", NEON_BLUE), (cx - 140, cy + 100))
+
+    def draw_game(self):
+        self.draw_bg()
+        for name, rect, draw in self.layers: draw()
+
+    def region_keys(self):
+        p = self.player
+        cooldowns = tuple(p.cooldowns.values())
+        blink = p.stat_points > 0 and not p.has_holy_water and int(time.time() * 2) % 2 == 0
+        hud = (self.floor, p.name, p.level, p.current_hp, p.max_hp, p.current_mana, p.max_mana, p.xp, p.xp_next,
+               p.souls, cooldowns, p.stat_points, p.has_holy_water, blink, p.grid_x, p.grid_y, self.map_rev)
+        combat = None
+        if self.state == "COMBAT":
+            e = self.map[(p.grid_x, p.grid_y)].enemies[0]
+            combat = (e.name, e.hp, e.max_hp, self.get_name_color(e))
+        return {"map": (p.grid_x, p.grid_y, self.map_rev), "hud": hud, "log": self.log.rev, "combat": combat}
+
+    def render_frame(self):
+        # Vrací seznam obdélníků pro pygame.display.update, prázdný když se nic nezměnilo
+        screen_rect = self.screen.get_rect()
+        if self.state not in ["EXPLORE", "COMBAT"]:
+            if not self.regions.changed("frame", (self.state, screen_rect.size, self.input_rev)): return []
+            self.draw_screen()
+            return [screen_rect]
+
+        keys = self.region_keys()
+        if self.regions.changed("frame", (self.state, screen_rect.size)):
+            self.regions.invalidate()
+            self.regions.changed("frame", (self.state, screen_rect.size))
+            for name in keys: self.regions.changed(name, keys[name])
+            self.draw_game()
+            return [screen_rect]
+
+        dirty = [rect for name, rect, draw in self.layers if self.regions.changed(name, keys[name])]
+        for rect in dirty:
+            self.screen.set_clip(rect)
+            self.screen.blit(self.bg_layer, rect.topleft, rect)
+            for name, layer_rect, draw in self.layers:
+                if layer_rect.colliderect(rect): draw()
+        self.screen.set_clip(None)
+        return dirty
+
+    def draw_screen(self):
+        self.draw_bg()
+
+        if self.state == "LOGIN":
+            self.screen.blit(render_text("SYSTEM LOGIN", NEON_BLUE, 40), (WIDTH // 2 - 120, 200))
+            c_user = NEON_GREEN if self.active_field == "user" else NEON_BLUE
+            draw_glow_rect(self.screen, c_user, (WIDTH // 2 - 150, 280, 300, 40), 2)
+            self.screen.blit(render_text(f"User: {self.input_user}", TXT_WHITE), (WIDTH // 2 - 140, 290))
+
+            c_pass = NEON_GREEN if self.active_field == "pass" else NEON_BLUE
+            draw_glow_rect(self.screen, c_pass, (WIDTH // 2 - 150, 350, 300, 40), 2)
+            pwd_display = "*" * len(self.input_pass)
+            self.screen.blit(render_text(f"Pass: {pwd_display}", TXT_WHITE), (WIDTH // 2 - 140, 360))
+
+            self.screen.blit(render_text("[TAB] Switch Field   [ENTER] Login", TXT_GRAY),
+                             (WIDTH // 2 - 140, 430))
+            if "login" in self.requests:
+                self.screen.blit(render_text("Verifying...", NEON_GOLD), (WIDTH // 2 - 50, 480))
+            elif self.login_error: self.screen.blit(render_text(self.login_error, NEON_RED),
+                                                    (WIDTH // 2 - 220, 480))
+
+        elif self.state == "MENU":
+            cx, cy = WIDTH // 2 - 200, 420
+            for i, c in enumerate(["FIGHTER", "ASSASSIN", "MAGE"]):
+                col = NEON_GOLD if self.selected_class == c else NEON_GRAY
+                draw_glow_rect(self.screen, col, (cx + i * 140, cy, 120, 60), 2 if self.selected_class == c else 1)
+                self.screen.blit(render_text(c, col), (cx + i * 140 + 15, cy + 20))
+            if os.path.exists(self.save_file):
+                self.screen.blit(
+                    render_text(f"Welcome {self.input_user} | [C] CONTINUE", NEON_GREEN, 40),
+                    (WIDTH // 2 - 220, 570))
+            self.screen.blit(render_text("Press [ENTER] for NEW GAME", TXT_WHITE),
+                             (WIDTH // 2 - 120, 630))
+
+        elif self.state == "STORE":
+            self.draw_overlay(240)
+            self.screen.blit(render_text("SYSTEM STORE", NEON_BLUE, 40), (100, 50))
+            self.screen.blit(render_text(f"Souls: {self.player.souls}", NEON_PURPLE), (100, 100))
+            sell_val = self.engine.get_sellable_loot_value()
+            if sell_val > 0:
+                self.screen.blit(
+                    render_text(f"Press [SPACE] to Sell All Loot (+{sell_val} Souls)", NEON_GREEN),
+                    (100, 140))
+            else:
+                self.screen.blit(render_text("No loot to sell.", TXT_GRAY), (100, 140))
+            for i, item in enumerate(self.store):
+                col = NEON_GOLD if i == self.store_sel else TXT_WHITE
+                self.screen.blit(
+                    render_text(f"{'> ' if i == self.store_sel else ''}{item[0]} ... {item[1]} Souls", col), (100, 200 + i * 40))
+
+        elif self.state == "NEXT_FLOOR":
+            self.screen.blit(render_text("FLOOR CLEAR", NEON_GOLD, 40), (WIDTH // 2 - 100, 300))
+            self.screen.blit(render_text("[ENTER] Next Floor", TXT_WHITE), (WIDTH // 2 - 70, 350))
+
+        elif self.state == "GAMEOVER":
+            self.screen.blit(render_text("YOU DIED", NEON_RED, 40), (WIDTH // 2 - 80, 300))
+            self.screen.blit(render_text("[ENTER] Menu", TXT_WHITE), (WIDTH // 2 - 60, 360))
+            self.screen.blit(render_text(self.run_status, TXT_GRAY), (WIDTH // 2 - 100, 410))
+            self.screen.blit(render_text(f"Run seed: {self.engine.seed:016x}", TXT_GRAY, 20), (20, HEIGHT - 40))
+            if "rankings" in self.requests:
+                self.screen.blit(render_text("Loading rankings...", TXT_GRAY), (WIDTH // 2 - 100, 460))
+            elif self.rankings:
+                self.screen.blit(render_text("TOP HUNTERS", NEON_GOLD), (WIDTH // 2 - 100, 460))
+                for i, (_, _, name, cls, floor, level, souls) in enumerate(self.rankings):
+                    self.screen.blit(render_text(f"#{i + 1} {name}  {cls}  Floor {floor}  Lv {level}", TXT_WHITE, 20),
+                                     (WIDTH // 2 - 100, 495 + i * 28))
+
+        else:
+            self.draw_game()
+
+            if self.state == "CHARACTER":
+                self.draw_overlay(220)
+                self.screen.blit(render_text("CHARACTER PROFILE", NEON_BLUE, 40),
+                                 (WIDTH // 2 - 150, 50))
+                self.screen.blit(render_text(f"Available Points: {self.player.stat_points}", NEON_GOLD),
+                                 (WIDTH // 2 - 90, 120))
+                opts = [
+                    (f"STR: {self.player.stats['str']}", "1", "+ DMG, Defense"),
+                    (f"AGI: {self.player.stats['dex']}", "2", "+ Crit Damage"),
+                    (f"INT: {self.player.stats['int']}", "3", "+ Max Mana, Shadow DMG"),
+                    (f"VIT: {self.player.stats['vigor']}", "4", "+ Max HP"),
+                    (f"SNS: {self.player.stats['sense']}", "5", "+ Crit Chance")
+                ]
+                cy = 180
+                for text, key, desc in opts:
+                    self.screen.blit(render_text(text, TXT_WHITE), (WIDTH // 2 - 200, cy))
+                    self.screen.blit(render_text(desc, TXT_GRAY), (WIDTH // 2 - 80, cy))
+                    if self.player.stat_points > 0: self.screen.blit(
+                        render_text(f"Press [{key}] to Upgrade", NEON_GREEN), (WIDTH // 2 + 100, cy))
+                    cy += 40
+
+                self.screen.blit(render_text("--- EQUIPPED ---", NEON_GOLD), (WIDTH // 2 - 200, cy + 30))
+                self.screen.blit(render_text(f"Weapon: {self.player.weapon.name} (DMG: {self.player.weapon.min_dmg}-{self.player.weapon.max_dmg})", TXT_WHITE), (WIDTH // 2 - 200, cy + 60))
+                self.screen.blit(
+                    render_text(f"Armor: {self.player.armor_name} (Total DEF: {self.player.total_def})", TXT_WHITE), (WIDTH // 2 - 200, cy + 90))
+                self.screen.blit(render_text("Press [C] or [ESC] to Close", NEON_RED),
+                                 (WIDTH // 2 - 120, HEIGHT - 80))
+
+            elif self.state == "INVENTORY":
+                self.draw_overlay(230)
+                self.screen.blit(render_text("SYSTEM INVENTORY", NEON_BLUE, 40), (100, 50))
+
+                items = self.player.inventory.items()
+                if self.inv_sel >= len(items) and items: self.inv_sel = len(items) - 1
+
+                iy = 120
+                if not items:
+                    self.screen.blit(render_text("Inventory is empty.", TXT_GRAY), (100, iy))
+                else:
+                    for i, (item, count) in enumerate(items):
+                        col = NEON_GOLD if i == self.inv_sel else TXT_WHITE
+                        prefix = "> " if i == self.inv_sel else "  "
+                        self.screen.blit(render_text(f"{prefix}{count}x {item}", col), (100, iy))
+                        iy += 30
+
+                if items:
+                    sel_item = items[self.inv_sel][0]
+                    pygame.draw.rect(self.screen, (10, 15, 20), (500, 120, 400, 400))
+                    draw_glow_rect(self.screen, NEON_BLUE, (500, 120, 400, 400), 2)
+                    self.screen.blit(render_text(sel_item, NEON_GOLD, 40), (520, 140))
+
+                    if sel_item in BOSS_WEAPONS:
+                        w = BOSS_WEAPONS[sel_item]
+                        self.screen.blit(render_text("Type: Rare Boss Weapon", NEON_PURPLE), (520, 190))
+                        self.screen.blit(render_text(f"Damage: {w[0]} - {w[1]}", TXT_WHITE), (520, 220))
+                        self.screen.blit(render_text(f"Scaling: {w[2].upper()} (x{w[3]})", NEON_GREEN),
+                                         (520, 250))
+                        self.screen.blit(render_text(f"Sell Value: {w[4]} Souls", TXT_GRAY), (520, 280))
+                        self.screen.blit(render_text("[E] to Equip   [SPACE] to Sell 1x", NEON_BLUE),
+                                         (520, 360))
+                    elif sel_item in LOOT_DB:
+                        val = LOOT_DB[sel_item]
+                        self.screen.blit(render_text("Type: Material / Loot", TXT_GRAY), (520, 190))
+                        self.screen.blit(render_text(f"Sell Value: {val} Souls", NEON_GOLD), (520, 220))
+                        self.screen.blit(render_text("[SPACE] to Sell 1x", NEON_BLUE), (520, 360))
+                    else:
+                        self.screen.blit(render_text("Type: Consumable / Material", NEON_GREEN),
+                                         (520, 190))
+                        self.screen.blit(render_text("Cannot be sold.", TXT_GRAY), (520, 220))
+
+                self.screen.blit(render_text(f"Total Souls: {self.player.souls}", NEON_PURPLE),
+                                 (100, 90))
+                self.screen.blit(
+                    render_text("Press [UP/DOWN] to browse  |  [I] or [ESC] to Close", NEON_RED),
+                    (WIDTH // 2 - 200, HEIGHT - 80))
+
+            elif self.state == "CRAFTING":
+                self.draw_overlay(230)
+                self.screen.blit(render_text("CRAFTING SYSTEM", NEON_PURPLE, 40),
+                                 (WIDTH // 2 - 150, 50))
+
+                bld = self.player.inventory.count("Purified Blood");
+                trf = self.player.inventory.count("World Tree Fragment")
+                wat = self.player.inventory.count("Echoing Spring Water");
+                ore = self.player.inventory.count("Iron Ore");
+                cry = self.player.inventory.count("Magic Crystal")
+
+                self.screen.blit(render_text(f"Your Materials: Blood({bld}) Tree({trf}) Water({wat}) | Ore({ore}) Crystal({cry})", TXT_GRAY), (WIDTH // 2 - 300, 100))
+
+                self.screen.blit(render_text("[1] Craft: HOLY WATER OF LIFE", NEON_GOLD),
+                                 (WIDTH // 2 - 250, 160))
+                self.screen.blit(
+                    render_text("Required: 1x Purified Blood, 1x World Tree Fragment, 1x Echoing Spring Water", TXT_WHITE), (WIDTH // 2 - 230, 190))
+                self.screen.blit(render_text("Effect: Permanent HP Regeneration in Combat", NEON_GREEN),
+                                 (WIDTH // 2 - 230, 220))
+                if self.player.has_holy_water: self.screen.blit(
+                    render_text("STATUS: ALREADY CONSUMED", NEON_RED), (WIDTH // 2 + 100, 160))
+
+                self.screen.blit(render_text("[2] Craft: HEALING STONE   [SHIFT+2] Craft max", NEON_BLUE),
+                                 (WIDTH // 2 - 250, 280))
+                self.screen.blit(render_text("Required: 2x Magic Crystal, 1x Iron Ore", TXT_WHITE),
+                                 (WIDTH // 2 - 230, 310))
+                self.screen.blit(render_text("Effect: Consumable Potion (Heals 50 HP)", NEON_GREEN),
+                                 (WIDTH // 2 - 230, 340))
+
+                self.screen.blit(render_text("Press [K] or [ESC] to Close", NEON_RED),
+                                 (WIDTH // 2 - 120, HEIGHT - 100))
+
+            elif self.state == "HELP":
+                self.draw_overlay(220)
+                self.screen.blit(render_text("SYSTEM CONTROLS", NEON_BLUE, 40), (WIDTH // 2 - 150, 50))
+                controls = [
+                    ("[ARROWS]", "Move through the Dungeon"),
+                    ("[SPACE]", "Attack in Combat / Sell All Loot in Store"),
+                    ("[Q], [W], [E]", "Use Class Skills (Requires Mana)"),
+                    ("[S]", "Arise! Shadow Extraction AOE Attack"),
+                    ("[H]", "Use Healing Potion in Combat"),
+                    ("[U]", "Retreat from Combat (Costs Souls, Enemies stay)"),
+                    ("[C]", "Open Character Stats & Equipment"),
+                    ("[I]", "Open Interactive Inventory"),
+                    ("[K]", "Open Crafting Menu"),
+                    ("[B]", "Open Store (Only outside combat)"),
+                    ("[L]", "Open Log History"),
+                ]
+                cy = 150
+                for key, desc in controls:
+                    self.screen.blit(render_text(key, NEON_GOLD), (WIDTH // 2 - 250, cy))
+                    self.screen.blit(render_text(f"- {desc}", TXT_WHITE), (WIDTH // 2 - 100, cy))
+                    cy += 40
+                self.screen.blit(render_text("Press [H] or [ESC] to Close", NEON_RED),
+                                 (WIDTH // 2 - 120, HEIGHT - 100))
+
+            elif self.state == "HISTORY":
+                self.draw_overlay(230)
+                self.screen.blit(render_text("SYSTEM LOG HISTORY", NEON_BLUE, 40), (100, 40))
+                total = self.log.history_len()
+                for i, line in enumerate(self.log.history_slice(self.history_top, self.history_top + HISTORY_LINES)):
+                    self.screen.blit(render_text(line, LOG_COLORS[log_category(line)]), (100, 100 + i * 25))
+                self.screen.blit(render_text(f"{self.history_top + 1}-{min(total, self.history_top + HISTORY_LINES)} / {total}",
+                                             TXT_GRAY), (WIDTH - 250, 50))
+                self.screen.blit(render_text("[UP/DOWN] Scroll  [PGUP/PGDN] Page  |  [L] or [ESC] to Close", NEON_RED),
+                                 (WIDTH // 2 - 250, HEIGHT - 80))
+
+    def next_effect_ms(self):
+        # Jediný časovaný efekt je blikající "POINTS AVAILABLE" v HUDu (přepíná se po 0.5 s);
+        # při čekání na databázi se budí často, aby výsledek hned ukázal
+        if self.requests: return DB_POLL_MS
+        p = self.player
+        if self.state in ["EXPLORE", "COMBAT"] and p.stat_points > 0 and not p.has_holy_water:
+            t = time.time() * 2
+            return max(1, min(IDLE_WAIT_MS, int((math.floor(t) + 1 - t) * 500) + 1))
+        return IDLE_WAIT_MS
+
+    def next_events(self):
+        events = []
+        if self.adaptive and (time.time() - self.last_input) * 1000 > INPUT_BURST_MS:
+            event = pygame.event.wait(self.next_effect_ms())
+            if event.type != pygame.NOEVENT: events.append(event)
+        events += pygame.event.get()
+        if any(e.type == pygame.KEYDOWN for e in events): self.last_input = time.time()
+        return events
 
     def run(self):
         running = True
         self.store_sel = 0
         while running:
-            self.clock.tick(FPS)
+            self.clock.tick(self.max_fps)
+            self.frames_total += 1
 
-            if self.state == "EXPLORE":
-                curr_room = self.map.get((self.player.grid_x, self.player.grid_y))
-                if curr_room and curr_room.enemies: self.state = "COMBAT"
-
-            for event in pygame.event.get():
+            for event in self.next_events():
                 if event.type == pygame.QUIT: running = False
                 if event.type == pygame.KEYDOWN:
+                    self.input_rev += 1
 
                     if self.state == "LOGIN":
                         if event.key == pygame.K_TAB:
                             self.active_field = "pass" if self.active_field == "user" else "user"
                         elif event.key == pygame.K_RETURN:
-                            if self.db.verify_login(self.input_user, self.input_pass):
-                                self.state = "MENU"
-                                self.login_error = ""
-                            else:
-                                self.login_error = "Invalid Login! Register on the WEBSITE first."
+                            if "login" not in self.requests:
+                                self.request("login", self.db.verify_login(self.input_user, self.input_pass),
+                                             self.login_done)
                         elif event.key == pygame.K_BACKSPACE:
                             if self.active_field == "user":
                                 self.input_user = self.input_user[:-1]
@@ -683,12 +667,12 @@ class Game:
 
                     elif self.state == "MENU":
                         if event.key == pygame.K_RETURN:
-                            self.start_game()
-                            self.state = "EXPLORE"
+                            self.engine.start(self.input_user, self.selected_class)
+                            self.state = self.engine.state
                         elif event.key == pygame.K_c:
-                            if self.load_game():
-                                self.state = "EXPLORE"
-                                self.add_log("SYSTEM: Welcome back.")
+                            if self.engine.load_game(self.input_user):
+                                self.state = self.engine.state
+                                self.engine.add_log("SYSTEM: Welcome back.")
                         if event.key == pygame.K_1: self.selected_class = "FIGHTER"
                         if event.key == pygame.K_2: self.selected_class = "ASSASSIN"
                         if event.key == pygame.K_3: self.selected_class = "MAGE"
@@ -696,13 +680,13 @@ class Game:
 
                     elif self.state == "EXPLORE":
                         if event.key == pygame.K_UP:
-                            self.move(0, 1, 'N')
+                            self.act("MOVE_N")
                         elif event.key == pygame.K_DOWN:
-                            self.move(0, -1, 'S')
+                            self.act("MOVE_S")
                         elif event.key == pygame.K_RIGHT:
-                            self.move(1, 0, 'E')
+                            self.act("MOVE_E")
                         elif event.key == pygame.K_LEFT:
-                            self.move(-1, 0, 'W')
+                            self.act("MOVE_W")
                         elif event.key == pygame.K_b:
                             self.state = "STORE"
                         elif event.key == pygame.K_i:
@@ -714,362 +698,81 @@ class Game:
                             self.state = "CHARACTER"
                         elif event.key == pygame.K_k:
                             self.state = "CRAFTING"
+                        elif event.key == pygame.K_l:
+                            self.state = "HISTORY"
+                            self.history_top = max(0, self.log.history_len() - HISTORY_LINES)
 
                     elif self.state in ["HELP"]:
                         if event.key in [pygame.K_h, pygame.K_ESCAPE]: self.state = "EXPLORE"
 
+                    elif self.state == "HISTORY":
+                        last = max(0, self.log.history_len() - HISTORY_LINES)
+                        step = {pygame.K_UP: -1, pygame.K_DOWN: 1, pygame.K_PAGEUP: -HISTORY_LINES,
+                                pygame.K_PAGEDOWN: HISTORY_LINES}.get(event.key, 0)
+                        if event.key in [pygame.K_l, pygame.K_ESCAPE]:
+                            self.state = "EXPLORE"
+                        elif step:
+                            self.history_top = min(last, max(0, self.history_top + step))
+
                     elif self.state == "CHARACTER":
                         if event.key in [pygame.K_c, pygame.K_ESCAPE]:
                             self.state = "EXPLORE"
-                        elif self.player.stat_points > 0:
-                            if event.key == pygame.K_1:
-                                self.player.stats['str'] += 1; self.player.stat_points -= 1
-                            elif event.key == pygame.K_2:
-                                self.player.stats['dex'] += 1; self.player.stat_points -= 1
-                            elif event.key == pygame.K_3:
-                                self.player.stats['int'] += 1; self.player.stat_points -= 1
-                            elif event.key == pygame.K_4:
-                                self.player.stats['vigor'] += 1; self.player.stat_points -= 1
-                            elif event.key == pygame.K_5:
-                                self.player.stats['sense'] += 1; self.player.stat_points -= 1
-                            self.player.recalculate()
+                        elif event.key in STAT_KEYS:
+                            self.act("STAT", STAT_KEYS[event.key])
 
                     # --- ANIME INTERAKTIVNÍ INVENTÁŘ ---
                     elif self.state == "INVENTORY":
-                        unique_items = sorted(list(set(self.player.inventory)))
+                        unique_items = self.player.inventory.names()
                         if event.key in [pygame.K_i, pygame.K_ESCAPE]:
                             self.state = "EXPLORE"
                         elif event.key == pygame.K_DOWN and unique_items:
                             self.inv_sel = (self.inv_sel + 1) % len(unique_items)
                         elif event.key == pygame.K_UP and unique_items:
                             self.inv_sel = (self.inv_sel - 1) % len(unique_items)
-                        elif event.key == pygame.K_SPACE and unique_items:
-                            item = unique_items[self.inv_sel]
-                            val = LOOT_DB.get(item, 0)
-                            if item in BOSS_WEAPONS: val = BOSS_WEAPONS[item][4]
-
-                            if val > 0:
-                                self.player.souls += val
-                                self.player.inventory.remove(item)
-                                self.add_log(f"SOLD: 1x {item} (+{val} Souls)")
-                                unique_items = sorted(list(set(self.player.inventory)))
-                                if self.inv_sel >= len(unique_items): self.inv_sel = max(0, len(unique_items) - 1)
-                            else:
-                                self.add_log("SYSTEM: Cannot sell this item.")
-
-                        elif event.key == pygame.K_e and unique_items:
-                            item = unique_items[self.inv_sel]
-                            if item in BOSS_WEAPONS:
-                                self.player.inventory.append("Weapon Scraps")
-                                w = BOSS_WEAPONS[item]
-                                self.player.weapon = Weapon(item, w[0], w[1], w[2], w[3], w[4])
-                                self.player.inventory.remove(item)
-                                self.add_log(f"EQUIPPED: {item}")
-                                unique_items = sorted(list(set(self.player.inventory)))
-                                if self.inv_sel >= len(unique_items): self.inv_sel = max(0, len(unique_items) - 1)
-                                self.player.recalculate()
+                        elif event.key in [pygame.K_SPACE, pygame.K_e] and unique_items:
+                            self.act("SELL" if event.key == pygame.K_SPACE else "EQUIP", unique_items[self.inv_sel])
+                            unique_items = self.player.inventory.names()
+                            if self.inv_sel >= len(unique_items): self.inv_sel = max(0, len(unique_items) - 1)
 
                     elif self.state == "CRAFTING":
                         if event.key in [pygame.K_k, pygame.K_ESCAPE]:
                             self.state = "EXPLORE"
                         elif event.key == pygame.K_1:
-                            if not self.player.has_holy_water:
-                                if self.count_item("Purified Blood") >= 1 and self.count_item(
-                                        "World Tree Fragment") >= 1 and self.count_item("Echoing Spring Water") >= 1:
-                                    self.remove_items("Purified Blood", 1);
-                                    self.remove_items("World Tree Fragment", 1);
-                                    self.remove_items("Echoing Spring Water", 1)
-                                    self.player.has_holy_water = True
-                                    self.add_log("SYSTEM: Holy Water of Life CRAFTED! (Perm Regen)")
-                                else:
-                                    self.add_log("SYSTEM: Missing Boss Materials.")
-                            else:
-                                self.add_log("SYSTEM: Already consumed Holy Water.")
+                            self.act("CRAFT", "HOLY_WATER")
                         elif event.key == pygame.K_2:
-                            if self.count_item("Magic Crystal") >= 2 and self.count_item("Iron Ore") >= 1:
-                                self.remove_items("Magic Crystal", 2);
-                                self.remove_items("Iron Ore", 1)
-                                self.player.inventory.append("Healing Stone")
-                                self.add_log("SYSTEM: Healing Stone Crafted.")
-                            else:
-                                self.add_log("SYSTEM: Missing Materials.")
+                            # SHIFT+2 vyrobí co nejvíc kamenů naráz
+                            self.act("CRAFT", ("HEALING_STONE", None) if event.mod & pygame.KMOD_SHIFT else "HEALING_STONE")
 
                     elif self.state == "COMBAT":
-                        if event.key == pygame.K_SPACE:
-                            self.combat("ATTACK")
-                        elif event.key == pygame.K_q:
-                            self.combat("Q")
-                        elif event.key == pygame.K_w:
-                            self.combat("W")
-                        elif event.key == pygame.K_e:
-                            self.combat("E")
-                        elif event.key == pygame.K_s:
-                            self.combat("SHADOWS")
-                        elif event.key == pygame.K_h:
-                            self.combat("POTION")
-                        elif event.key == pygame.K_u:
-                            self.combat("RUN")
+                        if event.key in COMBAT_KEYS: self.act(COMBAT_KEYS[event.key])
 
                     elif self.state == "STORE":
                         if event.key == pygame.K_b:
                             self.state = "EXPLORE"
                         elif event.key == pygame.K_SPACE:
-                            val = self.get_sellable_loot_value()
-                            if val > 0:
-                                self.player.souls += val
-                                self.player.inventory = [i for i in self.player.inventory if i not in LOOT_DB]
-                                self.add_log(f"SOLD ALL LOOT: +{val} Souls")
+                            self.act("SELL_ALL")
                         elif event.key == pygame.K_DOWN:
                             self.store_sel = (self.store_sel + 1) % len(self.store)
                         elif event.key == pygame.K_UP:
                             self.store_sel = (self.store_sel - 1) % len(self.store)
                         elif event.key == pygame.K_RETURN:
-                            item = self.store[self.store_sel]
-                            name, cost = item
-                            if self.player.souls >= cost:
-                                self.player.souls -= cost
-                                if "Healing" in name or "Elixir" in name:
-                                    self.player.inventory.append(name)
-                                elif "Dagger" in name or "Orb" in name or "Sword" in name:
-                                    self.player.inventory.append("Weapon Scraps")
-                                    self.player.weapon = Weapon(name, int(cost / 50), int(cost / 30), "str", 1.5, cost)
-                                    self.add_log("Old Weapon dismantled.")
-                                elif "Armor" in name:
-                                    self.player.inventory.append("Armor Scraps")
-                                    self.player.armor_name = name
-                                    self.player.stats["def"] += 5;
-                                    self.player.recalculate()
-                                    self.add_log("Old Armor dismantled.")
-                                elif "Daily" in name:
-                                    if "Strength" in name:
-                                        self.player.stats["str"] += 2
-                                    else:
-                                        self.player.stats["dex"] += 2
-                                    self.player.recalculate()
-                                self.add_log(f"Purchased {name}.")
-                            else:
-                                self.add_log("Insufficient Souls.")
+                            self.act("BUY", self.store_sel)
 
                     elif self.state == "NEXT_FLOOR":
-                        if event.key == pygame.K_RETURN:
-                            self.map = {(0, 0): Room()}
-                            self.map[(0, 0)].exits = {'N': True, 'S': True, 'E': True, 'W': True}
-                            self.player.grid_x, self.player.grid_y = 0, 0
-                            self.has_key, self.boss_spawned = False, False
-                            self.state = "EXPLORE"
-                            self.save_game()
+                        if event.key == pygame.K_RETURN: self.act("NEXT_FLOOR")
 
                     elif self.state == "GAMEOVER":
                         if event.key == pygame.K_RETURN: self.reset_game_data(); self.state = "MENU"
 
-            self.draw_bg()
-
-            if self.state == "LOGIN":
-                self.screen.blit(self.title_font.render("SYSTEM LOGIN", True, NEON_BLUE), (WIDTH // 2 - 120, 200))
-                c_user = NEON_GREEN if self.active_field == "user" else NEON_BLUE
-                draw_glow_rect(self.screen, c_user, (WIDTH // 2 - 150, 280, 300, 40), 2)
-                self.screen.blit(self.font.render(f"User: {self.input_user}", True, TXT_WHITE), (WIDTH // 2 - 140, 290))
-
-                c_pass = NEON_GREEN if self.active_field == "pass" else NEON_BLUE
-                draw_glow_rect(self.screen, c_pass, (WIDTH // 2 - 150, 350, 300, 40), 2)
-                pwd_display = "*" * len(self.input_pass)
-                self.screen.blit(self.font.render(f"Pass: {pwd_display}", True, TXT_WHITE), (WIDTH // 2 - 140, 360))
-
-                self.screen.blit(self.font.render("[TAB] Switch Field   [ENTER] Login", True, TXT_GRAY),
-                                 (WIDTH // 2 - 140, 430))
-                if self.login_error: self.screen.blit(self.font.render(self.login_error, True, NEON_RED),
-                                                      (WIDTH // 2 - 220, 480))
-
-            elif self.state == "MENU":
-                cx, cy = WIDTH // 2 - 200, 420
-                for i, c in enumerate(["FIGHTER", "ASSASSIN", "MAGE"]):
-                    col = NEON_GOLD if self.selected_class == c else NEON_GRAY
-                    draw_glow_rect(self.screen, col, (cx + i * 140, cy, 120, 60), 2 if self.selected_class == c else 1)
-                    self.screen.blit(self.font.render(c, True, col), (cx + i * 140 + 15, cy + 20))
-                if os.path.exists(self.save_file):
-                    self.screen.blit(
-                        self.title_font.render(f"Welcome {self.input_user} | [C] CONTINUE", True, NEON_GREEN),
-                        (WIDTH // 2 - 220, 570))
-                self.screen.blit(self.font.render("Press [ENTER] for NEW GAME", True, TXT_WHITE),
-                                 (WIDTH // 2 - 120, 630))
-
-            elif self.state == "STORE":
-                overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA);
-                overlay.fill((0, 0, 0, 240));
-                self.screen.blit(overlay, (0, 0))
-                self.screen.blit(self.title_font.render("SYSTEM STORE", True, NEON_BLUE), (100, 50))
-                self.screen.blit(self.font.render(f"Souls: {self.player.souls}", True, NEON_PURPLE), (100, 100))
-                sell_val = self.get_sellable_loot_value()
-                if sell_val > 0:
-                    self.screen.blit(
-                        self.font.render(f"Press [SPACE] to Sell All Loot (+{sell_val} Souls)", True, NEON_GREEN),
-                        (100, 140))
-                else:
-                    self.screen.blit(self.font.render("No loot to sell.", True, TXT_GRAY), (100, 140))
-                for i, item in enumerate(self.store):
-                    col = NEON_GOLD if i == self.store_sel else TXT_WHITE
-                    self.screen.blit(
-                        self.font.render(f"{'> ' if i == self.store_sel else ''}{item[0]} ... {item[1]} Souls", True,
-                                         col), (100, 200 + i * 40))
-
-            elif self.state == "NEXT_FLOOR":
-                self.screen.blit(self.title_font.render("FLOOR CLEAR", True, NEON_GOLD), (WIDTH // 2 - 100, 300))
-                self.screen.blit(self.font.render("[ENTER] Next Floor", True, TXT_WHITE), (WIDTH // 2 - 70, 350))
+            self.poll_requests()
+            rects = self.render_frame()
+            if rects:
+                pygame.display.update(rects)
+                self.frames_rendered += 1
 
-            elif self.state == "GAMEOVER":
-                self.screen.blit(self.title_font.render("YOU DIED", True, NEON_RED), (WIDTH // 2 - 80, 300))
-                self.screen.blit(self.font.render("[ENTER] Menu", True, TXT_WHITE), (WIDTH // 2 - 60, 360))
-
-            else:
-                self.draw_game()
-
-                if self.state == "CHARACTER":
-                    overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA);
-                    overlay.fill((0, 0, 0, 220));
-                    self.screen.blit(overlay, (0, 0))
-                    self.screen.blit(self.title_font.render("CHARACTER PROFILE", True, NEON_BLUE),
-                                     (WIDTH // 2 - 150, 50))
-                    self.screen.blit(self.font.render(f"Available Points: {self.player.stat_points}", True, NEON_GOLD),
-                                     (WIDTH // 2 - 90, 120))
-                    opts = [
-                        (f"STR: {self.player.stats['str']}", "1", "+ DMG, Defense"),
-                        (f"AGI: {self.player.stats['dex']}", "2", "+ Crit Damage"),
-                        (f"INT: {self.player.stats['int']}", "3", "+ Max Mana, Shadow DMG"),
-                        (f"VIT: {self.player.stats['vigor']}", "4", "+ Max HP"),
-                        (f"SNS: {self.player.stats['sense']}", "5", "+ Crit Chance")
-                    ]
-                    cy = 180
-                    for text, key, desc in opts:
-                        self.screen.blit(self.font.render(text, True, TXT_WHITE), (WIDTH // 2 - 200, cy))
-                        self.screen.blit(self.font.render(desc, True, TXT_GRAY), (WIDTH // 2 - 80, cy))
-                        if self.player.stat_points > 0: self.screen.blit(
-                            self.font.render(f"Press [{key}] to Upgrade", True, NEON_GREEN), (WIDTH // 2 + 100, cy))
-                        cy += 40
-
-                    self.screen.blit(self.font.render("--- EQUIPPED ---", True, NEON_GOLD), (WIDTH // 2 - 200, cy + 30))
-                    self.screen.blit(self.font.render(
-                        f"Weapon: {self.player.weapon.name} (DMG: {self.player.weapon.min_dmg}-{self.player.weapon.max_dmg})",
-                        True, TXT_WHITE), (WIDTH // 2 - 200, cy + 60))
-                    self.screen.blit(
-                        self.font.render(f"Armor: {self.player.armor_name} (Total DEF: {self.player.total_def})", True,
-                                         TXT_WHITE), (WIDTH // 2 - 200, cy + 90))
-                    self.screen.blit(self.font.render("Press [C] or [ESC] to Close", True, NEON_RED),
-                                     (WIDTH // 2 - 120, HEIGHT - 80))
-
-                elif self.state == "INVENTORY":
-                    overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA);
-                    overlay.fill((0, 0, 0, 230));
-                    self.screen.blit(overlay, (0, 0))
-                    self.screen.blit(self.title_font.render("SYSTEM INVENTORY", True, NEON_BLUE), (100, 50))
-
-                    counts = {i: self.player.inventory.count(i) for i in set(self.player.inventory)}
-                    unique_items = sorted(list(counts.keys()))
-                    if self.inv_sel >= len(unique_items) and unique_items: self.inv_sel = len(unique_items) - 1
-
-                    iy = 120
-                    if not unique_items:
-                        self.screen.blit(self.font.render("Inventory is empty.", True, TXT_GRAY), (100, iy))
-                    else:
-                        for i, item in enumerate(unique_items):
-                            col = NEON_GOLD if i == self.inv_sel else TXT_WHITE
-                            prefix = "> " if i == self.inv_sel else "  "
-                            self.screen.blit(self.font.render(f"{prefix}{counts[item]}x {item}", True, col), (100, iy))
-                            iy += 30
-
-                    if unique_items:
-                        sel_item = unique_items[self.inv_sel]
-                        pygame.draw.rect(self.screen, (10, 15, 20), (500, 120, 400, 400))
-                        draw_glow_rect(self.screen, NEON_BLUE, (500, 120, 400, 400), 2)
-                        self.screen.blit(self.title_font.render(sel_item, True, NEON_GOLD), (520, 140))
-
-                        if sel_item in BOSS_WEAPONS:
-                            w = BOSS_WEAPONS[sel_item]
-                            self.screen.blit(self.font.render("Type: Rare Boss Weapon", True, NEON_PURPLE), (520, 190))
-                            self.screen.blit(self.font.render(f"Damage: {w[0]} - {w[1]}", True, TXT_WHITE), (520, 220))
-                            self.screen.blit(self.font.render(f"Scaling: {w[2].upper()} (x{w[3]})", True, NEON_GREEN),
-                                             (520, 250))
-                            self.screen.blit(self.font.render(f"Sell Value: {w[4]} Souls", True, TXT_GRAY), (520, 280))
-                            self.screen.blit(self.font.render("[E] to Equip   [SPACE] to Sell 1x", True, NEON_BLUE),
-                                             (520, 360))
-                        elif sel_item in LOOT_DB:
-                            val = LOOT_DB[sel_item]
-                            self.screen.blit(self.font.render("Type: Material / Loot", True, TXT_GRAY), (520, 190))
-                            self.screen.blit(self.font.render(f"Sell Value: {val} Souls", True, NEON_GOLD), (520, 220))
-                            self.screen.blit(self.font.render("[SPACE] to Sell 1x", True, NEON_BLUE), (520, 360))
-                        else:
-                            self.screen.blit(self.font.render("Type: Consumable / Material", True, NEON_GREEN),
-                                             (520, 190))
-                            self.screen.blit(self.font.render("Cannot be sold.", True, TXT_GRAY), (520, 220))
-
-                    self.screen.blit(self.font.render(f"Total Souls: {self.player.souls}", True, NEON_PURPLE),
-                                     (100, 90))
-                    self.screen.blit(
-                        self.font.render("Press [UP/DOWN] to browse  |  [I] or [ESC] to Close", True, NEON_RED),
-                        (WIDTH // 2 - 200, HEIGHT - 80))
-
-                elif self.state == "CRAFTING":
-                    overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA);
-                    overlay.fill((0, 0, 0, 230));
-                    self.screen.blit(overlay, (0, 0))
-                    self.screen.blit(self.title_font.render("CRAFTING SYSTEM", True, NEON_PURPLE),
-                                     (WIDTH // 2 - 150, 50))
-
-                    bld = self.player.inventory.count("Purified Blood");
-                    trf = self.player.inventory.count("World Tree Fragment")
-                    wat = self.player.inventory.count("Echoing Spring Water");
-                    ore = self.player.inventory.count("Iron Ore");
-                    cry = self.player.inventory.count("Magic Crystal")
-
-                    self.screen.blit(self.font.render(
-                        f"Your Materials: Blood({bld}) Tree({trf}) Water({wat}) | Ore({ore}) Crystal({cry})", True,
-                        TXT_GRAY), (WIDTH // 2 - 300, 100))
-
-                    self.screen.blit(self.font.render("[1] Craft: HOLY WATER OF LIFE", True, NEON_GOLD),
-                                     (WIDTH // 2 - 250, 160))
-                    self.screen.blit(
-                        self.font.render("Required: 1x Purified Blood, 1x World Tree Fragment, 1x Echoing Spring Water",
-                                         True, TXT_WHITE), (WIDTH // 2 - 230, 190))
-                    self.screen.blit(self.font.render("Effect: Permanent HP Regeneration in Combat", True, NEON_GREEN),
-                                     (WIDTH // 2 - 230, 220))
-                    if self.player.has_holy_water: self.screen.blit(
-                        self.font.render("STATUS: ALREADY CONSUMED", True, NEON_RED), (WIDTH // 2 + 100, 160))
-
-                    self.screen.blit(self.font.render("[2] Craft: HEALING STONE", True, NEON_BLUE),
-                                     (WIDTH // 2 - 250, 280))
-                    self.screen.blit(self.font.render("Required: 2x Magic Crystal, 1x Iron Ore", True, TXT_WHITE),
-                                     (WIDTH // 2 - 230, 310))
-                    self.screen.blit(self.font.render("Effect: Consumable Potion (Heals 50 HP)", True, NEON_GREEN),
-                                     (WIDTH // 2 - 230, 340))
-
-                    self.screen.blit(self.font.render("Press [K] or [ESC] to Close", True, NEON_RED),
-                                     (WIDTH // 2 - 120, HEIGHT - 100))
-
-                elif self.state == "HELP":
-                    overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA);
-                    overlay.fill((0, 0, 0, 220));
-                    self.screen.blit(overlay, (0, 0))
-                    self.screen.blit(self.title_font.render("SYSTEM CONTROLS", True, NEON_BLUE), (WIDTH // 2 - 150, 50))
-                    controls = [
-                        ("[ARROWS]", "Move through the Dungeon"),
-                        ("[SPACE]", "Attack in Combat / Sell All Loot in Store"),
-                        ("[Q], [W], [E]", "Use Class Skills (Requires Mana)"),
-                        ("[S]", "Arise! Shadow Extraction AOE Attack"),
-                        ("[H]", "Use Healing Potion in Combat"),
-                        ("[U]", "Retreat from Combat (Costs Souls, Enemies stay)"),
-                        ("[C]", "Open Character Stats & Equipment"),
-                        ("[I]", "Open Interactive Inventory"),
-                        ("[K]", "Open Crafting Menu"),
-                        ("[B]", "Open Store (Only outside combat)"),
-                    ]
-                    cy = 150
-                    for key, desc in controls:
-                        self.screen.blit(self.font.render(key, True, NEON_GOLD), (WIDTH // 2 - 250, cy))
-                        self.screen.blit(self.font.render(f"- {desc}", True, TXT_WHITE), (WIDTH // 2 - 100, cy))
-                        cy += 40
-                    self.screen.blit(self.font.render("Press [H] or [ESC] to Close", True, NEON_RED),
-                                     (WIDTH // 2 - 120, HEIGHT - 100))
-
-            pygame.display.flip()
+        self.engine.close()
+        self.db.close()
+        if self.uploads: self.uploads.close()
 
     pygame.quit()
 
@@ -0,0 +1,179 @@
+import sys
+import time
+import random
+import numpy as np
+
+from engine import GameEngine, Enemy
+from catalog import CLASSES, DEMON_TYPES, SKILLS_DB
+
+# Dávkový simulátor soubojů pro ladění balance - stejná pravidla jako GameEngine.combat,
+# jen tisíce/miliony soubojů najednou v NumPy polích.
+
+STAT_NAMES = ["vigor", "str", "dex", "int", "sense", "def", "mana"]
+SKILL_KEYS = ["Q", "W", "E"]
+MAX_TURNS = 500
+
+DEMON_MIN_FLOOR = np.array([d[1] for d in DEMON_TYPES])
+DEMON_HP = np.array([d[3] for d in DEMON_TYPES], dtype=np.float64)
+DEMON_DMG = np.array([d[4] for d in DEMON_TYPES], dtype=np.float64)
+
+
+def class_builds(class_keys=None):
+    # Výchozí buildy tříd (staty + zbraň z CLASSES) jako pole
+    class_keys = list(class_keys or CLASSES)
+    stats = np.array([[CLASSES[c]["stats"].get(k, 0) for k in STAT_NAMES] for c in class_keys], dtype=np.int64)
+    weapons = np.array([[w[1], w[2], STAT_NAMES.index(w[3]), w[4]] for w in
+                        (CLASSES[c]["weapon"] for c in class_keys)], dtype=np.float64)
+    return {"class": class_keys, "stats": stats, "weapon": weapons}
+
+
+def skill_table(class_keys):
+    # (třídy, 3) pole: cena, cooldown, násobič, jestli je to DMG skill
+    cost, cd, val, dmg = (np.zeros((len(class_keys), 3)) for _ in range(4))
+    for i, c in enumerate(class_keys):
+        for j, k in enumerate(SKILL_KEYS):
+            s_name, s_cost, s_cd, s_val, s_type = SKILLS_DB[c][k]
+            cost[i, j], cd[i, j], val[i, j], dmg[i, j] = s_cost, s_cd, s_val, s_type == "DMG"
+    return cost, cd, val, dmg.astype(bool)
+
+
+def simulate(builds, floors, n_fights, policy="attack", seed=None):
+    # Každý build x patro x n_fights je jeden souboj 1 na 1 s běžným démonem daného patra.
+    # Vrací (ttk, survival) pole tvaru (buildy, patra).
+    rng = np.random.default_rng(seed)
+    floors = np.asarray(floors)
+    n_builds, n_floors = len(builds["class"]), len(floors)
+    lanes = n_builds * n_floors * n_fights
+    b = np.repeat(np.arange(n_builds), n_floors * n_fights)
+    f = np.tile(np.repeat(floors, n_fights), n_builds)
+
+    stats, weapon = builds["stats"][b], builds["weapon"][b]
+    max_hp = stats[:, 0] * 10
+    max_mana = stats[:, 3] * 5 + stats[:, 6]
+    total_def = stats[:, 5] + stats[:, 1] // 5
+    crit_chance = np.minimum(stats[:, 4], 50)
+    w_min, w_max = weapon[:, 0].astype(np.int64), weapon[:, 1].astype(np.int64)
+    bonus = np.floor(stats[np.arange(lanes), weapon[:, 2].astype(np.int64)] * weapon[:, 3]).astype(np.int64)
+    regen = np.maximum(1, np.floor(max_mana * 0.05)).astype(np.int64)
+
+    # Enemy(floor): náhodný typ z dostupných na patře, škálovaný 1 + patro * 0.15
+    n_avail = np.maximum(1, np.searchsorted(DEMON_MIN_FLOOR, f, side="right"))
+    kind = rng.integers(0, n_avail)
+    scale = 1.0 + f * 0.15
+    e_hp = np.floor(DEMON_HP[kind] * scale).astype(np.int64)
+    dmg_taken = np.maximum(1, np.floor(DEMON_DMG[kind] * scale).astype(np.int64) - total_def)
+
+    hp, mana = max_hp.copy(), max_mana.copy()
+    if policy == "skills":
+        s_cost, s_cd, s_val, s_dmg = (a[b] for a in skill_table(builds["class"]))
+        cooldowns = np.zeros((lanes, 3), dtype=np.int64)
+
+    active = np.ones(lanes, dtype=bool)
+    won = np.zeros(lanes, dtype=bool)
+    turns = np.zeros(lanes, dtype=np.int64)
+    for _ in range(MAX_TURNS):
+        if not active.any(): break
+        total = rng.integers(w_min, w_max + 1) + bonus
+        crit = rng.integers(1, 101, size=lanes) <= crit_chance
+        total = np.where(crit, (total * 1.5).astype(np.int64), total)
+
+        if policy == "skills":
+            # Nejsilnější dostupný DMG skill, jinak obyčejný útok
+            usable = s_dmg & (mana[:, None] >= s_cost) & (cooldowns == 0) & active[:, None]
+            pick = np.argmax(np.where(usable, s_val, -1.0), axis=1)
+            use = usable[np.arange(lanes), pick]
+            mult = np.where(use, s_val[np.arange(lanes), pick], 1.0)
+            total = np.where(use, (total * mult).astype(np.int64), total)
+            mana = mana - np.where(use, s_cost[np.arange(lanes), pick], 0).astype(np.int64)
+            cooldowns[use, pick[use]] = s_cd[use, pick[use]]
+
+        e_hp = e_hp - np.where(active, total, 0)
+        turns += active
+        killed = active & (e_hp <= 0)
+        won |= killed
+        active &= ~killed
+
+        if policy == "skills":
+            cooldowns = np.where(active[:, None] & (cooldowns > 0), cooldowns - 1, cooldowns)
+        mana = np.where(active, np.minimum(max_mana, mana + regen), mana)
+        hp = hp - np.where(active, dmg_taken, 0)
+        active &= hp > 0
+
+    shape = (n_builds, n_floors, n_fights)
+    won, turns = won.reshape(shape), turns.reshape(shape)
+    ttk = np.where(won.any(axis=2), (turns * won).sum(axis=2) / np.maximum(1, won.sum(axis=2)), np.nan)
+    return ttk, won.mean(axis=2)
+
+
+def balance_tables(floors=range(1, 31), n_fights=10000, policy="attack", seed=None):
+    builds = class_builds()
+    ttk, survival = simulate(builds, list(floors), n_fights, policy, seed)
+    return {c: {"floors": list(floors), "ttk": ttk[i], "survival": survival[i]} for i, c in enumerate(builds["class"])}
+
+
+# --- KONTROLA PROTI SKALÁRNÍM PRAVIDLŮM ---
+def choose_action(player, policy):
+    if policy == "skills":
+        best, best_val = "ATTACK", 0
+        for k in SKILL_KEYS:
+            s_name, s_cost, s_cd, s_val, s_type = SKILLS_DB[player.class_name][k]
+            if s_type == "DMG" and player.current_mana >= s_cost and player.cooldowns[k] == 0 and s_val > best_val:
+                best, best_val = k, s_val
+        return best
+    return "ATTACK"
+
+
+def scalar_duel(class_key, floor, policy="attack"):
+    # Jeden souboj přes skutečný GameEngine.combat
+    eng = GameEngine()
+    eng.start("sim", class_key)
+    eng.floor = floor
+    eng.map[(0, 0)].set_enemies([Enemy(floor)])
+    eng.state = "COMBAT"
+    turns = 0
+    while eng.state == "COMBAT" and turns < MAX_TURNS:
+        eng.step(choose_action(eng.player, policy))
+        turns += 1
+    return turns, eng.state == "EXPLORE"
+
+
+def check_against_scalar(floors=(1, 5, 12, 25), n_fights=3000, seed=1):
+    # Porovná průměrné TTK a přežití dávkového simulátoru se skalárním enginem (tolerance 4 sigma)
+    random.seed(seed)
+    builds = class_builds()
+    rows, ok = [], True
+    for policy in ["attack", "skills"]:
+        ttk, survival = simulate(builds, floors, n_fights, policy, seed)
+        for i, c in enumerate(builds["class"]):
+            for j, fl in enumerate(floors):
+                results = [scalar_duel(c, fl, policy) for _ in range(n_fights)]
+                wins = [t for t, w in results if w]
+                s_surv = len(wins) / n_fights
+                s_ttk = sum(wins) / len(wins) if wins else float("nan")
+                se_surv = max(np.sqrt(s_surv * (1 - s_surv) / n_fights), 1 / n_fights) * np.sqrt(2)
+                se_ttk = (np.std(wins) / np.sqrt(len(wins)) if len(wins) > 1 else 0) * np.sqrt(2)
+                good = abs(survival[i, j] - s_surv) <= 4 * se_surv + 0.005
+                if wins: good = good and abs(ttk[i, j] - s_ttk) <= 4 * se_ttk + 0.05
+                ok = ok and good
+                rows.append((policy, c, fl, ttk[i, j], s_ttk, survival[i, j], s_surv, good))
+    return ok, rows
+
+
+if __name__ == "__main__":
+    if "--check" in sys.argv:
+        ok, rows = check_against_scalar()
+        for policy, c, fl, v_ttk, s_ttk, v_surv, s_surv, good in rows:
+            print(f"{policy:7} {c:9} F{fl:<3} TTK {v_ttk:6.2f} / {s_ttk:6.2f}   SURV {v_surv:.3f} / {s_surv:.3f}"
+                  f"  {'OK' if good else 'MISMATCH'}")
+        sys.exit(0 if ok else 1)
+
+    policy = "skills" if "--skills" in sys.argv else "attack"
+    start = time.perf_counter()
+    tables = balance_tables(policy=policy)
+    took = time.perf_counter() - start
+    for c, t in tables.items():
+        print(f"--- {c} ({policy}) ---")
+        for fl, ttk, surv in zip(t["floors"], t["ttk"], t["survival"]):
+            print(f"Floor {fl:2}: TTK {ttk:6.2f}  Survival {surv * 100:5.1f}%")
+    fights = sum(len(t["floors"]) for t in tables.values()) * 10000
+    print(f"{fights} fights in {took:.2f}s")
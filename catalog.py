@@ -0,0 +1,179 @@
+# Herní data společná pro hru (engine.py) i web (web.py): třídy, skilly, předměty se stálými čísly,
+# loot, bestiář, bossové a obchod. Odvozené tabulky (spawny po patrech, ceny podle id) se staví
+# jednou při importu a check() při importu hlídá, že k sobě data sedí.
+
+BOSS_COLOR = (255, 40, 40)
+
+# --- LOOT SYSTÉM ---
+LOOT_STANDARD = ["Demon Horn", "Torn Cloth", "Beast Fang", "Shadow Core", "Broken Bone", "Magic Dust", "Goblin Ear",
+                 "Wolf Pelt"]
+LOOT_CRAFTING = ["Iron Ore", "Magic Crystal"]
+
+LOOT_DB = {
+    "Demon Horn": 15, "Torn Cloth": 5, "Beast Fang": 25,
+    "Shadow Core": 50, "Broken Bone": 10, "Magic Dust": 35,
+    "Goblin Ear": 8, "Wolf Pelt": 12,
+    "Iron Ore": 10, "Magic Crystal": 20,
+    "Weapon Scraps": 150, "Armor Scraps": 100
+}
+
+# --- BOSS ZBRANĚ ---
+BOSS_WEAPONS = {
+    "Vulcan's Club": (15, 25, "str", 1.5, 1000),
+    "Metus' Scythe": (10, 30, "int", 1.6, 1500),
+    "Baran's Daggers": (20, 35, "dex", 1.8, 2500)
+}
+
+# --- BESTIÁŘ ---
+# (jméno, od patra, barva, HP, DMG, XP, souls) - seřazené podle patra (balance.py hledá půlením)
+DEMON_TYPES = [
+    ("Goblin", 1, (100, 150, 100), 15, 3, 4, 5),
+    ("Low Rank Demon", 1, (150, 150, 150), 20, 5, 5, 10),
+    ("Dire Wolf", 2, (120, 120, 150), 25, 6, 8, 12),
+    ("Flying Demon", 3, (180, 120, 120), 30, 8, 10, 15),
+    ("Hobgoblin", 4, (100, 180, 100), 45, 12, 18, 25),
+    ("Cerberus", 5, (200, 100, 50), 60, 15, 25, 50),
+    ("Shadow Beast", 7, (80, 80, 80), 70, 18, 30, 35),
+    ("High Orc", 10, (50, 150, 50), 80, 20, 35, 40),
+    ("Vampire", 12, (200, 50, 50), 100, 25, 45, 60),
+    ("Demon Knight", 15, (100, 100, 200), 120, 30, 60, 80),
+    ("Death Knight", 18, (80, 50, 150), 140, 40, 80, 100),
+    ("Arch-Lich", 20, (150, 50, 200), 150, 50, 100, 150),
+    ("Bone Dragon", 25, (220, 220, 220), 200, 60, 150, 200),
+]
+
+# Bossové: (jméno, od patra, zbraň, která z něj může padnout); všichni mají stejný základ škálovaný patrem
+BOSS_TYPES = [("VULCAN", 1, "Vulcan's Club"), ("METUS", 20, "Metus' Scythe"), ("BARAN", 50, "Baran's Daggers")]
+BOSS_DROPS = {name: weapon for name, floor, weapon in BOSS_TYPES}
+BOSS_BASE = (300, 30, 500, 300)  # HP, DMG, XP, souls
+BOSS_DROP_CHANCE = 0.3
+# Materiál na Holy Water za poraženého bosse na daném patře
+FLOOR_MATERIALS = {10: "Purified Blood", 20: "World Tree Fragment", 30: "Echoing Spring Water"}
+
+# --- DEFINICE SKILLŮ ---
+SKILLS_DB = {
+    "FIGHTER": {"Q": ("Smash", 10, 3, 2.0, "DMG"), "W": ("Iron Skin", 15, 5, 10, "BUFF"),
+                "E": ("War Cry", 20, 8, 0.5, "HEAL")},
+    "ASSASSIN": {"Q": ("Vital Strike", 10, 2, 1.5, "DMG"), "W": ("Poison Edge", 15, 4, 2.5, "DMG"),
+                 "E": ("Shadow Step", 20, 6, 0, "ESCAPE")},
+    "MAGE": {"Q": ("Fireball", 15, 2, 2.5, "DMG"), "W": ("Ice Barrier", 20, 5, 20, "BUFF"),
+             "E": ("Meteor", 50, 10, 5.0, "DMG")},
+    "MONARCH": {"Q": ("Dominator's Touch", 10, 1, 2.0, "DMG"), "W": ("Ruler's Authority", 20, 4, 3.0, "DMG"),
+                "E": ("Full Recovery", 50, 10, 1.0, "HEAL")}
+}
+
+# --- CLASSES ---
+CLASSES = {
+    "FIGHTER": {"stats": {"vigor": 15, "str": 12, "dex": 5, "int": 5, "sense": 5, "def": 3, "mana": 30},
+                "weapon": ("Vanguard Shield", 8, 12, "str", 1.0, 0)},
+    "ASSASSIN": {"stats": {"vigor": 8, "str": 8, "dex": 16, "int": 10, "sense": 15, "def": 0, "mana": 40},
+                 "weapon": ("Kasaka's Fang", 10, 18, "dex", 1.3, 0)},
+    "MAGE": {"stats": {"vigor": 6, "str": 4, "dex": 8, "int": 20, "sense": 10, "def": 0, "mana": 100},
+             "weapon": ("Orb of Greed", 12, 20, "int", 1.4, 0)},
+    "MONARCH": {"stats": {"vigor": 15, "str": 15, "dex": 15, "int": 20, "sense": 15, "def": 2, "mana": 80},
+                "weapon": ("Kamish's Wrath", 25, 40, "str", 1.8, 0)}
+}
+
+# --- OBCHOD ---
+# (jméno, cena, od patra, druh); zbraně z obchodu mají staty podle ceny (store_weapon)
+STORE_ITEMS = [
+    ("Healing Stone", 100, 1, "Consumable"), ("Killer Dagger", 500, 1, "Weapon"),
+    ("STR Boost", 300, 1, "Boost"), ("AGI Boost", 300, 1, "Boost"),
+    ("Elixir of Life", 500, 5, "Consumable"), ("Shadow Armor", 1500, 5, "Armor"),
+    ("Demon King's Sword", 2500, 10, "Weapon"), ("Orb of Avarice", 2000, 10, "Weapon"),
+]
+STORE_ARMOR_DEF = 5
+
+
+def store_weapon(cost):
+    # (min dmg, max dmg, stat, násobič) zbraně koupené za cost
+    return int(cost / 50), int(cost / 30), "str", 1.5
+
+
+# --- ČÍSLA PŘEDMĚTŮ ---
+# Stálá čísla předmětů (používá je i save) - nové předměty jen přidávat na konec
+ITEM_NAMES = ["Demon Horn", "Torn Cloth", "Beast Fang", "Shadow Core", "Broken Bone", "Magic Dust", "Goblin Ear",
+              "Wolf Pelt", "Iron Ore", "Magic Crystal", "Weapon Scraps", "Armor Scraps",
+              "Vulcan's Club", "Metus' Scythe", "Baran's Daggers",
+              "Healing Stone", "Elixir of Life", "Purified Blood", "World Tree Fragment", "Echoing Spring Water"]
+ITEM_IDS = {name: i for i, name in enumerate(ITEM_NAMES)}
+EXTRA_ITEM = 0x10000  # předměty mimo katalog dostanou id za běhu, do savu jdou jménem
+EXTRA_NAMES = []
+
+
+def item_id(name):
+    i = ITEM_IDS.get(name)
+    if i is None:
+        i = ITEM_IDS[name] = EXTRA_ITEM + len(EXTRA_NAMES)
+        EXTRA_NAMES.append(name)
+    return i
+
+
+def item_name(i):
+    return EXTRA_NAMES[i - EXTRA_ITEM] if i >= EXTRA_ITEM else ITEM_NAMES[i]
+
+
+# Ceny podle id předmětu - inventář drží id, takže se při prodeji nepřekládá přes jména
+LOOT_VALUES = {ITEM_IDS[name]: value for name, value in LOOT_DB.items()}
+SELL_VALUES = {**LOOT_VALUES, **{ITEM_IDS[name]: w[4] for name, w in BOSS_WEAPONS.items()}}
+
+
+# --- SPAWN TABULKY ---
+# Démoni dostupní na každém patře, postavené jednou; od SPAWN_FLOORS výš se nabídka nemění
+SPAWN_FLOORS = max(d[1] for d in DEMON_TYPES)
+SPAWN_TABLES = [tuple(d for d in DEMON_TYPES if d[1] <= floor) or (DEMON_TYPES[0],) for floor in range(SPAWN_FLOORS + 1)]
+
+
+def spawn_table(floor):
+    return SPAWN_TABLES[min(max(floor, 0), SPAWN_FLOORS)]
+
+
+def boss_type(floor):
+    boss = BOSS_TYPES[0]
+    for b in BOSS_TYPES:
+        if b[1] <= floor: boss = b
+    return boss
+
+
+def boss_stats(floor):
+    # (HP, DMG, XP, souls) bosse na patře
+    scale = 1.0 + (floor * 0.15)
+    return tuple(int(v * scale) for v in BOSS_BASE)
+
+
+# --- KONTROLA ---
+class CatalogError(Exception):
+    pass
+
+
+def check():
+    # Vrací seznam nesrovnalostí mezi tabulkami (předmět bez čísla, drop mimo loot, neseřazený bestiář...)
+    problems = []
+    if len(ITEM_IDS) < len(ITEM_NAMES): problems.append("duplicate names in ITEM_NAMES")
+    used = (list(LOOT_DB) + list(BOSS_WEAPONS) + [b[2] for b in BOSS_TYPES] + list(FLOOR_MATERIALS.values()) +
+            [name for name, cost, floor, kind in STORE_ITEMS if kind == "Consumable"])
+    problems += [f"item '{name}' has no id in ITEM_NAMES" for name in used if name not in ITEM_NAMES]
+    problems += [f"loot drop '{name}' missing from LOOT_DB" for name in LOOT_STANDARD + LOOT_CRAFTING
+                 if name not in LOOT_DB]
+    problems += [f"boss {name} drops unknown weapon '{weapon}'" for name, floor, weapon in BOSS_TYPES
+                 if weapon not in BOSS_WEAPONS]
+    stats = set(CLASSES["FIGHTER"]["stats"])
+    problems += [f"weapon '{name}' scales with unknown stat '{w[2]}'" for name, w in
+                 list(BOSS_WEAPONS.items()) + [(c["weapon"][0], c["weapon"][1:]) for c in CLASSES.values()]
+                 if w[2] not in stats]
+    problems += [f"class {cls} has no skills" for cls in CLASSES if cls not in SKILLS_DB]
+    floors = [d[1] for d in DEMON_TYPES]
+    if floors != sorted(floors) or floors[0] != 1: problems.append("DEMON_TYPES must be sorted by floor from 1")
+    if len({d[0] for d in DEMON_TYPES}) < len(DEMON_TYPES): problems.append("duplicate names in DEMON_TYPES")
+    if [b[1] for b in BOSS_TYPES] != sorted(b[1] for b in BOSS_TYPES): problems.append("BOSS_TYPES must be sorted by floor")
+    problems += [f"store item '{name}' has unknown kind '{kind}'" for name, cost, floor, kind in STORE_ITEMS
+                 if kind not in ("Consumable", "Weapon", "Armor", "Boost")]
+    return problems
+
+
+def validate():
+    problems = check()
+    if problems: raise CatalogError("; ".join(problems))
+
+
+validate()  # při importu - rozbitá data shodí hru i web hned při startu
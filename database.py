@@ -0,0 +1,703 @@
+import os
+import sys
+import json
+import time
+import queue
+import uuid
+import bisect
+import random
+import string
+import sqlite3
+import tempfile
+import datetime
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import Future
+
+# Společná SQLite databáze hry a webu (hunters = odehrané runy, users = účty z webu).
+# Schéma se verzuje přes PRAGMA user_version; MIGRATIONS[v] převede verzi v na v + 1.
+
+DB_PATH = "sololeveling_v15.db"
+BUSY_TIMEOUT_MS = 5000
+
+# Nejlepší run každého lovce (víc patro, při shodě level; při úplné shodě zůstává starší run).
+# Jeden průchod historií přes okenní funkci - migrace 3 a "python database.py --backfill".
+SQL_BACKFILL_BEST = [
+    "DELETE FROM hunter_best",
+    "INSERT INTO hunter_best (name, run_id, date, class, floor, level, souls) "
+    "SELECT name, id, date, class, floor, level, souls FROM (SELECT *, ROW_NUMBER() OVER "
+    "(PARTITION BY name ORDER BY floor DESC, level DESC, id) AS n FROM hunters WHERE name IS NOT NULL) WHERE n = 1",
+    "UPDATE meta SET value = value + 1 WHERE key = 'hunters_version'",
+]
+
+# Souhrnné statistiky (den x třída, třída x patro) z celé historie - migrace 6 a "--backfill".
+# Nové runy do nich přičítají triggery, takže stránka statistik historii runů nikdy nečte.
+# Chybějící patro/level/souls (NULL) se počítá jako 0 - stejně jako v triggerech níž
+STAT_SUMS = ", ".join(["COUNT(*)"] + [f"COALESCE({agg}({col}), 0)" for col in ("floor", "level", "souls")
+                                      for agg in ("MAX", "SUM")])
+SQL_BACKFILL_STATS = [
+    "DELETE FROM daily_class_stats",
+    "DELETE FROM class_floor_stats",
+    f"INSERT INTO daily_class_stats SELECT date, class, {STAT_SUMS} FROM hunters "
+    "WHERE date IS NOT NULL AND class IS NOT NULL GROUP BY date, class",
+    "INSERT INTO class_floor_stats SELECT class, floor, COUNT(*) FROM hunters "
+    "WHERE class IS NOT NULL AND floor IS NOT NULL GROUP BY class, floor",
+]
+
+MIGRATIONS = {
+    0: ["CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, password TEXT)",
+        "CREATE TABLE IF NOT EXISTS hunters (id INTEGER PRIMARY KEY, date TEXT, name TEXT, class TEXT, "
+        "floor INTEGER, level INTEGER, souls INTEGER)"],
+    # Krycí index pro žebříček - ORDER BY floor DESC, level DESC čte index místo třídění celé tabulky
+    1: ["CREATE INDEX IF NOT EXISTS idx_hunters_rank ON hunters (floor DESC, level DESC, name, class, souls, date)"],
+    # Čítač verzí žebříčku - triggery ho zvednou při každé změně hunters, cache v jiných procesech to poznají
+    2: ["CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)",
+        "INSERT OR IGNORE INTO meta VALUES ('hunters_version', 0)"] +
+       [f"CREATE TRIGGER IF NOT EXISTS hunters_version_{op.lower()} AFTER {op} ON hunters BEGIN "
+        f"UPDATE meta SET value = value + 1 WHERE key = 'hunters_version'; END" for op in ("INSERT", "UPDATE", "DELETE")],
+    # Žebříček bez duplicit: jeden řádek na lovce, indexy pro celkové pořadí i pro filtr podle třídy
+    3: ["CREATE TABLE IF NOT EXISTS hunter_best (name TEXT PRIMARY KEY, run_id INTEGER, date TEXT, class TEXT, "
+        "floor INTEGER, level INTEGER, souls INTEGER)",
+        "CREATE INDEX IF NOT EXISTS idx_best_rank ON hunter_best (floor DESC, level DESC, name, class, souls, date, run_id)",
+        "CREATE INDEX IF NOT EXISTS idx_best_class ON hunter_best "
+        "(class, floor DESC, level DESC, name, souls, date, run_id)"] + SQL_BACKFILL_BEST,
+    # Stránkování API po klíči (floor, level, run_id) - hledání v indexu místo OFFSET
+    4: ["CREATE INDEX IF NOT EXISTS idx_best_page ON hunter_best "
+        "(floor DESC, level DESC, run_id DESC, name, class, souls, date)",
+        "CREATE INDEX IF NOT EXISTS idx_best_class_page ON hunter_best "
+        "(class, floor DESC, level DESC, run_id DESC, name, souls, date)"],
+    # uid runu od klienta - opakované odeslání dávky (ztracená odpověď) run nezdvojí
+    5: ["ALTER TABLE hunters ADD COLUMN uid TEXT",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_hunters_uid ON hunters (uid)"],
+    # Statistiky udržované triggerem při každém vloženém runu (i v dávce z /api/runs).
+    # Mazání runů se nepromítá (maxima nejdou odečíst) - po ručním zásahu do hunters spustit --backfill.
+    6: ["CREATE TABLE IF NOT EXISTS daily_class_stats (day TEXT, class TEXT, runs INTEGER, max_floor INTEGER, "
+        "sum_floor INTEGER, max_level INTEGER, sum_level INTEGER, max_souls INTEGER, sum_souls INTEGER, "
+        "PRIMARY KEY (day, class)) WITHOUT ROWID",
+        "CREATE TABLE IF NOT EXISTS class_floor_stats (class TEXT, floor INTEGER, runs INTEGER, "
+        "PRIMARY KEY (class, floor)) WITHOUT ROWID",
+        "CREATE TRIGGER IF NOT EXISTS hunters_stats_insert AFTER INSERT ON hunters "
+        "WHEN new.date IS NOT NULL AND new.class IS NOT NULL BEGIN "
+        "INSERT INTO daily_class_stats VALUES (new.date, new.class, 1, new.floor, new.floor, new.level, new.level, "
+        "new.souls, new.souls) ON CONFLICT (day, class) DO UPDATE SET runs = runs + 1, "
+        "max_floor = MAX(max_floor, excluded.max_floor), sum_floor = sum_floor + excluded.sum_floor, "
+        "max_level = MAX(max_level, excluded.max_level), sum_level = sum_level + excluded.sum_level, "
+        "max_souls = MAX(max_souls, excluded.max_souls), sum_souls = sum_souls + excluded.sum_souls; "
+        "INSERT INTO class_floor_stats VALUES (new.class, new.floor, 1) "
+        "ON CONFLICT (class, floor) DO UPDATE SET runs = runs + 1; END"] + SQL_BACKFILL_STATS,
+    # Hledání lovců: jména bez ohledu na velikost písmen (rozsah v NOCASE indexu) a runy jednoho lovce
+    7: ["CREATE INDEX IF NOT EXISTS idx_users_nocase ON users (username COLLATE NOCASE)",
+        "CREATE INDEX IF NOT EXISTS idx_hunters_name ON hunters (name, floor DESC, level DESC)"],
+    # Žebříček čte hunter_best, krycí index z migrace 1 už žádný dotaz nepoužívá a jen zdržuje každý INSERT
+    8: ["DROP INDEX IF EXISTS idx_hunters_rank"],
+    # Trigger statistik odolný vůči NULL: class_floor_stats je WITHOUT ROWID (klíč NOT NULL), takže run bez
+    # patra shodil celý INSERT do hunters - histogram pater má vlastní trigger jen pro runy s patrem a
+    # součty berou NULL jako 0. Přepočet spraví součty, které už NULL dostaly.
+    9: ["DROP TRIGGER IF EXISTS hunters_stats_insert",
+        "CREATE TRIGGER IF NOT EXISTS hunters_stats_insert AFTER INSERT ON hunters "
+        "WHEN new.date IS NOT NULL AND new.class IS NOT NULL BEGIN "
+        "INSERT INTO daily_class_stats VALUES (new.date, new.class, 1, COALESCE(new.floor, 0), "
+        "COALESCE(new.floor, 0), COALESCE(new.level, 0), COALESCE(new.level, 0), COALESCE(new.souls, 0), "
+        "COALESCE(new.souls, 0)) ON CONFLICT (day, class) DO UPDATE SET runs = runs + 1, "
+        "max_floor = MAX(max_floor, excluded.max_floor), sum_floor = sum_floor + excluded.sum_floor, "
+        "max_level = MAX(max_level, excluded.max_level), sum_level = sum_level + excluded.sum_level, "
+        "max_souls = MAX(max_souls, excluded.max_souls), sum_souls = sum_souls + excluded.sum_souls; END",
+        "CREATE TRIGGER IF NOT EXISTS hunters_floor_stats_insert AFTER INSERT ON hunters "
+        "WHEN new.class IS NOT NULL AND new.floor IS NOT NULL BEGIN "
+        "INSERT INTO class_floor_stats VALUES (new.class, new.floor, 1) "
+        "ON CONFLICT (class, floor) DO UPDATE SET runs = runs + 1; END"] + SQL_BACKFILL_STATS,
+}
+DROPPED_INDEXES = ["idx_hunters_rank"]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# Dotazy jako konstanty - sqlite3 je drží připravené ve své cache příkazů
+SQL_LOGIN = "SELECT password FROM users WHERE username = ?"
+SQL_SAVE_RUN = "INSERT INTO hunters (date, name, class, floor, level, souls) VALUES (?,?,?,?,?,?)"
+SQL_SAVE_RUNS = ("INSERT OR IGNORE INTO hunters (uid, date, name, class, floor, level, souls) "
+                 "VALUES (:uid, :date, :name, :class, :floor, :level, :souls)")
+UPSERT_BEST = ("ON CONFLICT (name) DO UPDATE SET run_id = excluded.run_id, date = excluded.date, "
+               "class = excluded.class, floor = excluded.floor, level = excluded.level, souls = excluded.souls "
+               "WHERE excluded.floor > hunter_best.floor OR "
+               "(excluded.floor = hunter_best.floor AND excluded.level > hunter_best.level)")
+SQL_SAVE_BEST = f"INSERT INTO hunter_best (name, run_id, date, class, floor, level, souls) VALUES (?,?,?,?,?,?,?) {UPSERT_BEST}"
+# Nejlepší run každého lovce z právě vložené dávky (id > poslední id před dávkou)
+SQL_SAVE_BEST_BATCH = ("INSERT INTO hunter_best (name, run_id, date, class, floor, level, souls) "
+                       "SELECT name, id, date, class, floor, level, souls FROM (SELECT *, ROW_NUMBER() OVER "
+                       "(PARTITION BY name ORDER BY floor DESC, level DESC, id) AS n FROM hunters "
+                       f"WHERE id > ? AND name IS NOT NULL) WHERE n = 1 {UPSERT_BEST}")
+# Řádky žebříčku mají tvar řádku hunters (id, date, name, class, floor, level, souls); shody na patře
+# a levelu rozhoduje zbytek indexu, aby pořadí bylo stejné v SQL i v Leaderboard
+BEST_ROW = "SELECT run_id, date, name, class, floor, level, souls FROM hunter_best"
+RANK_ORDER = "floor DESC, level DESC, name, class, souls, date, run_id"
+SQL_RANKINGS = f"{BEST_ROW} ORDER BY {RANK_ORDER} LIMIT ?"
+SQL_RANKINGS_CLASS = f"{BEST_ROW} WHERE class = ? ORDER BY {RANK_ORDER} LIMIT ?"
+# Pořadí lovce = počet lepších + 1, rozsah v indexu nad lovcem
+SQL_RANK = ("SELECT COUNT(*) + 1 FROM hunter_best WHERE floor > ?1 OR (floor = ?1 AND level > ?2) "
+            "OR (floor = ?1 AND level = ?2 AND name < ?3)")
+SQL_RANK_CLASS = ("SELECT COUNT(*) + 1 FROM hunter_best WHERE (class = ?4 AND floor > ?1) "
+                  "OR (class = ?4 AND floor = ?1 AND level > ?2) OR (class = ?4 AND floor = ?1 AND level = ?2 AND name < ?3)")
+SQL_BEST = f"{BEST_ROW} WHERE name = ?"
+# Jména začínající prefixem: username >= prefix AND username < prefix + nejvyšší znak, obojí v NOCASE.
+# Rozsah jde po indexu idx_users_nocase, LIKE '%x%' by četl celou tabulku.
+SQL_SEARCH_USERS = ("SELECT u.username, b.class, b.floor, b.level FROM users u "
+                    "LEFT JOIN hunter_best b ON b.name = u.username "
+                    "WHERE u.username >= ?1 COLLATE NOCASE AND u.username < ?2 COLLATE NOCASE "
+                    "ORDER BY u.username COLLATE NOCASE LIMIT ?3")
+SQL_USER_EXISTS = "SELECT 1 FROM users WHERE username = ?"
+SQL_HUNTER_RUNS = "SELECT id, date, name, class, floor, level, souls FROM hunters WHERE name = ? ORDER BY floor DESC, level DESC LIMIT ?"
+SEARCH_LIMIT = 20
+MAX_SEARCH = 100
+MAX_PAGE = 1000
+SQL_STATS_DAYS = ("SELECT day, class, runs, max_floor, sum_floor, max_level, sum_level, max_souls, sum_souls "
+                  "FROM daily_class_stats WHERE day >= ? ORDER BY day DESC, class")
+SQL_STATS_CLASSES = ("SELECT class, SUM(runs), MAX(max_floor), SUM(sum_floor), MAX(max_level), SUM(sum_level), "
+                     "MAX(max_souls), SUM(sum_souls) FROM daily_class_stats GROUP BY class ORDER BY class")
+SQL_STATS_FLOORS = "SELECT class, floor, runs FROM class_floor_stats ORDER BY class, floor"
+
+
+def ladder_sql(after=False, cls=False, since=False, until=False):
+    # Stránka žebříčku pro API: pořadí (floor, level, run_id) sestupně, after = klíč posledního řádku
+    # předchozí stránky. Řádková hodnota (floor, level, run_id) < (?, ?, ?) je hledání v indexu.
+    where = [cond for cond, on in [("class = :cls", cls), ("(floor, level, run_id) < (:floor, :level, :run_id)", after),
+                                   ("date >= :since", since), ("date <= :until", until)] if on]
+    return (f"{BEST_ROW}{' WHERE ' + ' AND '.join(where) if where else ''} "
+            f"ORDER BY floor DESC, level DESC, run_id DESC LIMIT :limit")
+
+
+def ladder_page(query, limit, after=None, cls=None, since=None, until=None):
+    # after = (floor, level, run_id) nebo None; vrací (řádky, klíč další stránky nebo None)
+    args = {"limit": limit, "cls": cls, "since": since, "until": until}
+    if after: args.update(floor=after[0], level=after[1], run_id=after[2])
+    rows = query(ladder_sql(bool(after), bool(cls), bool(since), bool(until)), args)
+    last = rows[-1] if len(rows) == limit else None
+    return rows, (last[4], last[5], last[0]) if last else None
+SQL_VERSION = "SELECT value FROM meta WHERE key = 'hunters_version'"
+LEADERBOARD_SIZE = 10
+
+
+def rank_key(row):
+    # row = (id, date, name, class, floor, level, souls), stejné pořadí jako RANK_ORDER
+    return -row[4], -row[5], row[2], row[3], row[6], row[1], row[0]
+
+
+def tune(conn):
+    # WAL: hra a web se navzájem neblokují (čtení nečeká na zápis), busy timeout místo "database is locked"
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+
+
+def migrate(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    while version < SCHEMA_VERSION:
+        with conn:
+            for sql in MIGRATIONS[version]: conn.execute(sql)
+            version += 1
+            conn.execute(f"PRAGMA user_version = {version}")
+    return version
+
+
+def stats_summary(query, days=30):
+    # Statistiky jen ze souhrnných tabulek: posledních `days` dní po třídách, celkově po třídách
+    # (pick rate, průměry) a histogram dosažených pater. Velikost nezávisí na počtu runů.
+    since = (datetime.date.today() - datetime.timedelta(days=days - 1)).isoformat()
+    daily = [{"day": day, "class": cls, "runs": runs, "max_floor": mf, "avg_floor": sf / runs, "max_level": ml,
+              "avg_level": sl / runs, "max_souls": ms, "avg_souls": ss / runs}
+             for day, cls, runs, mf, sf, ml, sl, ms, ss in query(SQL_STATS_DAYS, (since,))]
+    rows = query(SQL_STATS_CLASSES)
+    total = sum(r[1] for r in rows) or 1
+    classes = {cls: {"runs": runs, "pick_rate": runs / total, "max_floor": mf, "avg_floor": sf / runs,
+                     "max_level": ml, "avg_level": sl / runs, "max_souls": ms, "avg_souls": ss / runs}
+               for cls, runs, mf, sf, ml, sl, ms, ss in rows}
+    floors = {}
+    for cls, floor, runs in query(SQL_STATS_FLOORS): floors.setdefault(cls, {})[floor] = runs
+    return {"since": since, "daily": daily, "classes": classes, "floors": floors}
+
+
+def search_hunters(query, prefix, limit=SEARCH_LIMIT):
+    # Registrovaní lovci se jménem na prefix (bez ohledu na velikost písmen), abecedně;
+    # řádky (jméno, třída, patro, level) nejlepšího runu, None u lovců bez runu
+    return query(SQL_SEARCH_USERS, (prefix, prefix + "\U0010ffff", limit))
+
+
+def hunter_rank(query, name):
+    # (pořadí celkově, pořadí v jeho třídě, nejlepší run) lovce; None pro neznámého lovce
+    best = query(SQL_BEST, (name,))
+    if not best: return None
+    row = best[0]
+    rank = query(SQL_RANK, (row[4], row[5], row[2]))[0][0]
+    return rank, query(SQL_RANK_CLASS, (row[4], row[5], row[2], row[3]))[0][0], row
+
+
+def save_runs(conn, runs):
+    # Dávka runů (slovníky uid/date/name/class/floor/level/souls) v jedné transakci přes executemany;
+    # BEGIN IMMEDIATE bere zápisový zámek hned, ne až uprostřed. Vrací počet nově uložených runů.
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM hunters").fetchone()[0]
+        conn.executemany(SQL_SAVE_RUNS, runs)
+        added = conn.execute("SELECT COUNT(*) FROM hunters WHERE id > ?", (last_id,)).fetchone()[0]
+        if added: conn.execute(SQL_SAVE_BEST_BATCH, (last_id,))
+    return added
+
+
+def check_query_plans(conn):
+    # Vrací seznam problémů - dotazy žebříčku musí jít přes krycí index bez třídění
+    problems = []
+    for sql, args in [(SQL_RANKINGS, (LEADERBOARD_SIZE,)), (SQL_RANKINGS_CLASS, ("MAGE", LEADERBOARD_SIZE)),
+                      (SQL_RANK, (1, 1, "")), (SQL_RANK_CLASS, (1, 1, "", "MAGE")), (SQL_BEST, ("",)),
+                      (SQL_LOGIN, ("",)), (SQL_VERSION, ()), (SQL_SEARCH_USERS, ("a", "b", SEARCH_LIMIT)),
+                      (SQL_USER_EXISTS, ("",)), (SQL_HUNTER_RUNS, ("", SEARCH_LIMIT)),
+                      (ladder_sql(True, True, True, True), {"cls": "MAGE", "floor": 1, "level": 1, "run_id": 1,
+                                                            "since": "", "until": "", "limit": MAX_PAGE}),
+                      (ladder_sql(True), {"floor": 1, "level": 1, "run_id": 1, "limit": MAX_PAGE})]:
+        plan = " | ".join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, args))
+        if "USE TEMP B-TREE" in plan: problems.append(f"{sql}: sorts ({plan})")
+        if "SCAN " in plan and "COVERING INDEX" not in plan: problems.append(f"{sql}: table scan ({plan})")
+        problems += [f"{sql}: uses dropped index {name}" for name in DROPPED_INDEXES if name in plan]
+    problems += [f"index {name} should have been dropped" for (name,) in
+                 conn.execute(f"SELECT name FROM sqlite_master WHERE type = 'index' AND name IN "
+                              f"({','.join('?' * len(DROPPED_INDEXES))})", DROPPED_INDEXES)]
+    return problems
+
+
+def check_stats_triggers(conn):
+    # Vrací seznam problémů - runy s NULL (starý klient, ruční zásah) nesmí shodit INSERT a statistiky
+    # z triggerů musí sedět s přepočtem z historie. Vše v transakci, která se na konci vrátí.
+    problems = []
+    tables = ("daily_class_stats", "class_floor_stats")
+    day = "1900-01-01"  # den, ve kterém skutečné runy nejsou
+    conn.commit()
+    try:
+        conn.execute("BEGIN")
+        for floor, level, souls in [(None, None, None), (3, None, 7), (None, 5, None), (4, 2, 1)]:
+            try:
+                conn.execute(SQL_SAVE_RUN, (day, "__check__", "MAGE", floor, level, souls))
+            except sqlite3.Error as e:
+                problems.append(f"run with floor={floor} level={level} souls={souls} rejected: {e}")
+        by_trigger = [conn.execute(f"SELECT * FROM {t} ORDER BY 1, 2").fetchall() for t in tables]
+        for sql in SQL_BACKFILL_STATS: conn.execute(sql)
+        by_backfill = [conn.execute(f"SELECT * FROM {t} ORDER BY 1, 2").fetchall() for t in tables]
+        problems += [f"{t}: trigger totals differ from backfill" for t, a, b in zip(tables, by_trigger, by_backfill)
+                     if a != b]
+        query = lambda sql, args=(): conn.execute(sql, args).fetchall()
+        try:
+            stats_summary(query)
+        except TypeError as e:
+            problems.append(f"stats_summary fails on NULL runs: {e}")
+    finally:
+        conn.rollback()
+    return problems
+
+
+class Leaderboard:
+    # Top N lovců (hunter_best) v paměti, volitelně jen jedné třídy. get() se databáze ptá jen na
+    # čítač v meta; žebříček čte znovu, až když čítač změnil někdo jiný. Vlastní nový rekord
+    # se zařadí přes offer() bez dotazu.
+    def __init__(self, query, size=LEADERBOARD_SIZE, cls=None):
+        self.query, self.size, self.cls = query, size, cls
+        self.rows, self.version = [], None
+        self.lock = threading.Lock()
+        self.hits, self.reloads = 0, 0
+
+    def get(self):
+        version = self.query(SQL_VERSION)[0][0]
+        with self.lock:
+            if version == self.version:
+                self.hits += 1
+                return list(self.rows)
+        if self.cls:
+            rows = self.query(SQL_RANKINGS_CLASS, (self.cls, self.size))
+        else:
+            rows = self.query(SQL_RANKINGS, (self.size,))
+        with self.lock:
+            self.rows, self.version = rows, version
+            self.reloads += 1
+            return list(rows)
+
+    def offer(self, row, version):
+        # Run uložený tímto procesem (row = nový rekord lovce, None když rekord nepřekonal);
+        # verze o jedna vyšší = mezitím nezapisoval nikdo jiný
+        with self.lock:
+            if self.version is None or version != self.version + 1:
+                self.version = None
+                return
+            self.version = version
+            if row is None: return
+            # Starý rekord téhož lovce je horší než nový - zmizí i z žebříčku jiné třídy, než ve které padl nový
+            rows = [r for r in self.rows if r[2] != row[2]]
+            if self.cls and row[3] != self.cls:
+                # Plný žebříček přišel o řádek a náhradníka za ním v cache nemá - načte se znovu
+                if len(rows) < len(self.rows) and len(self.rows) == self.size: self.version = None
+                self.rows = rows
+                return
+            self.rows = rows
+            if len(self.rows) < self.size or rank_key(row) < rank_key(self.rows[-1]):
+                bisect.insort(self.rows, row, key=rank_key)
+                del self.rows[self.size:]
+
+
+class RejectedBatch(Exception):
+    # send() pro RunUploadQueue: server dávku odmítl (špatná data) - opakovat ji nemá smysl
+    pass
+
+
+class RunUploadQueue:
+    # Fronta dohraných runů na straně klienta. put() run připíše do lokálního souboru (JSON na řádek),
+    # vlákno na pozadí je posílá po dávkách přes send(runs) a odeslané ze souboru smaže.
+    # Co se nepovede odeslat, zůstává v souboru a odejde po restartu hry. Dávku, kterou server
+    # odmítne (RejectedBatch), i nečitelné řádky fronta odloží do path + ".rejected", aby neblokovaly další.
+    def __init__(self, path, send, batch=20, interval=5.0, retry=30.0):
+        self.path, self.send, self.batch, self.interval, self.retry = path, send, batch, interval, retry
+        self.cond = threading.Condition()
+        self.pending = []
+        self.closed = False
+        self.sent, self.rejected, self.last_error = 0, 0, None
+        if os.path.exists(path): self.load()
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+    def load(self):
+        # Poslední řádek může být useknutý pádem uprostřed zápisu - ten se odloží a soubor přepíše,
+        # jinak by se k němu další put() připsal a rozbil i nový run
+        bad = []
+        with open(self.path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if not line.strip(): continue
+                try:
+                    self.pending.append(json.loads(line))
+                except ValueError:
+                    bad.append(line.rstrip("\n") + "\n")
+        if bad:
+            with open(self.path + ".rejected", "a", encoding="utf-8") as f: f.writelines(bad)
+            self.rewrite()
+
+    def rewrite(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(run) + "\n" for run in self.pending)
+        os.replace(tmp, self.path)
+
+    def put(self, name, p_class, floor, level, souls):
+        run = {"uid": uuid.uuid4().hex, "date": datetime.datetime.now().strftime("%Y-%m-%d"), "name": name,
+               "class": p_class, "floor": floor, "level": level, "souls": souls}
+        with self.cond:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(run) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.pending.append(run)
+            if len(self.pending) >= self.batch: self.cond.notify()
+
+    def loop(self):
+        wait = self.interval
+        while True:
+            with self.cond:
+                if not self.closed: self.cond.wait(wait)
+                if self.closed: return
+            wait = self.interval if self.flush() else self.retry
+
+    def flush(self):
+        # Pošle všechno čekající po dávkách; False při chybě (zbytek počká na další pokus)
+        while True:
+            with self.cond:
+                runs = self.pending[:self.batch]
+            if not runs: return True
+            rejected = False
+            try:
+                self.send(runs)
+            except RejectedBatch as e:
+                self.last_error, rejected = f"batch rejected: {e}", True
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                return False
+            with self.cond:
+                if rejected:
+                    with open(self.path + ".rejected", "a", encoding="utf-8") as f:
+                        f.writelines(json.dumps(run) + "\n" for run in runs)
+                    self.rejected += len(runs)
+                else:
+                    self.sent += len(runs)
+                    self.last_error = None
+                del self.pending[:len(runs)]
+                self.rewrite()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self.thread.join()
+        self.flush()
+
+
+def post_runs(url, token, timeout=5.0):
+    # send() pro RunUploadQueue: POST dávky na /api/runs webu se sdíleným klíčem (SOLOLEVELING_INGEST_TOKEN webu).
+    # 4xx = server data odmítl (RejectedBatch); 401/403 (klíč, vypnutý příjem) a 408/429 se zkouší znovu.
+    def send(runs):
+        headers = {"Content-Type": "application/json", "X-Ingest-Token": token}
+        req = urllib.request.Request(url, json.dumps({"runs": runs}).encode(), headers)
+        try:
+            with urllib.request.urlopen(req, timeout=timeout) as resp: resp.read()
+        except urllib.error.HTTPError as e:
+            if 400 <= e.code < 500 and e.code not in (401, 403, 408, 429):
+                raise RejectedBatch(f"HTTP {e.code}: {e.read()[:200].decode('utf-8', 'replace').strip()}")
+            raise
+    return send
+
+
+class ConnectionPool:
+    # Dlouho žijící spojení pro web: vlákno si při prvním dotazu vezme volné spojení (čtecí nebo
+    # zapisovací) a release() na konci požadavku ho vrátí. Vlákno workeru tak drží jedno spojení
+    # a i dev server, který zakládá vlákno na každý požadavek, spojení nezakládá znovu.
+    def __init__(self, path, tuned=False):
+        self.path, self.tuned = path, tuned
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.idle = {True: [], False: []}
+        self.opens, self.queries, self.query_time = 0, 0, 0.0
+
+    def setup(self):
+        # Jednou při startu aplikace: migrace schématu (read-only spojení nic vytvořit nemůžou) a s tuned
+        # i WAL - ten se zapíše do souboru databáze natrvalo, proto jen na výslovné přání (DB_TUNED webu)
+        conn = sqlite3.connect(self.path)
+        try:
+            if self.tuned: tune(conn)
+            return migrate(conn)
+        finally:
+            conn.close()
+
+    def open(self, readonly):
+        if readonly:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        with self.lock: self.opens += 1
+        return conn
+
+    def connection(self, readonly=True):
+        held = getattr(self.local, "held", None)
+        if held is None: held = self.local.held = {}
+        conn = held.get(readonly)
+        if conn is None:
+            with self.lock: conn = self.idle[readonly].pop() if self.idle[readonly] else None
+            conn = held[readonly] = conn or self.open(readonly)
+        return conn
+
+    def release(self):
+        held, self.local.held = getattr(self.local, "held", None) or {}, {}
+        with self.lock:
+            for readonly, conn in held.items(): self.idle[readonly].append(conn)
+
+    def timed(self, fn):
+        start = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            took = time.perf_counter() - start
+            with self.lock:
+                self.queries += 1
+                self.query_time += took
+
+    def query(self, sql, args=()):
+        conn = self.connection(readonly=True)
+        return self.timed(lambda: conn.execute(sql, args).fetchall())
+
+    def write(self, fn):
+        # fn(conn) nad zapisovacím spojením vlákna, s měřením času
+        conn = self.connection(readonly=False)
+        return self.timed(lambda: fn(conn))
+
+    def execute(self, sql, args=()):
+        conn = self.connection(readonly=False)
+
+        def run():
+            with conn: return conn.execute(sql, args)
+        return self.timed(run)
+
+    def stats(self):
+        with self.lock:
+            return {"opens": self.opens, "queries": self.queries, "query_ms": round(self.query_time * 1000, 3),
+                    "idle": {"ro": len(self.idle[True]), "rw": len(self.idle[False])}}
+
+    def close(self):
+        self.release()
+        with self.lock:
+            for conns in self.idle.values():
+                for conn in conns: conn.close()
+                conns.clear()
+
+
+class DatabaseManager:
+    def __init__(self, db_name=DB_PATH, tuned=False):
+        self.conn = sqlite3.connect(db_name)
+        self.cursor = self.conn.cursor()
+        if tuned: tune(self.conn)
+        self.create_table()
+        self.leaderboard = Leaderboard(self.query)
+
+    def create_table(self):
+        migrate(self.conn)
+
+    def query(self, sql, args=()):
+        return self.conn.execute(sql, args).fetchall()
+
+    def verify_login(self, username, password):
+        self.cursor.execute(SQL_LOGIN, (username,))
+        user = self.cursor.fetchone()
+        if user is None:
+            # Hráč neexistuje na webu, nepustíme ho do hry!
+            return False
+        else:
+            return user[0] == password
+
+    def save_run(self, name, p_class, floor, level, souls):
+        date = datetime.datetime.now().strftime("%Y-%m-%d")
+        self.cursor.execute(SQL_SAVE_RUN, (date, name, p_class, floor, level, souls))
+        row = (self.cursor.lastrowid, date, name, p_class, floor, level, souls)
+        self.cursor.execute(SQL_SAVE_BEST, (name,) + row[:2] + row[3:])
+        improved = self.cursor.rowcount > 0
+        version = self.query(SQL_VERSION)[0][0]
+        self.conn.commit()
+        self.leaderboard.offer(row if improved else None, version)
+
+    def save_runs(self, runs):
+        added = save_runs(self.conn, runs)
+        self.leaderboard.version = None  # dávka zvedne čítač o víc než 1, žebříček se načte znovu
+        return added
+
+    def get_rankings(self, limit=8, cls=None):
+        # Nejlepší run každého lovce, seřazeno; řádky ve tvaru (id, date, name, class, floor, level, souls)
+        if cls is None and limit <= self.leaderboard.size: return self.leaderboard.get()[:limit]
+        if cls: return self.query(SQL_RANKINGS_CLASS, (cls, limit))
+        return self.query(SQL_RANKINGS, (limit,))
+
+    def hunter_rank(self, name):
+        return hunter_rank(self.query, name)
+
+
+def is_busy(error):
+    # OperationalError kvůli zámku jiného spojení - po chvíli může projít
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+class DatabaseWorker:
+    # DatabaseManager pro herní smyčku ve vlastním vlákně: volání se zařadí do fronty a hned vrátí
+    # Future, hra se každý snímek jen podívá, jestli je hotové. Zamčená databáze (zapisuje web) se
+    # zkouší znovu s rostoucí pauzou; co se nestihne do timeoutu, skončí chybou TimeoutError.
+    def __init__(self, factory=DatabaseManager, timeout=10.0, retries=5, backoff=0.2):
+        self.factory, self.timeout, self.retries, self.backoff = factory, timeout, retries, backoff
+        self.requests = queue.Queue()
+        self.db = None  # vzniká až ve vlákně - sqlite3 spojení patří vláknu, které ho otevřelo
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+    def submit(self, method, *args):
+        future = Future()
+        self.requests.put((future, method, args, time.monotonic() + self.timeout))
+        return future
+
+    def verify_login(self, username, password):
+        return self.submit("verify_login", username, password)
+
+    def save_run(self, name, p_class, floor, level, souls):
+        return self.submit("save_run", name, p_class, floor, level, souls)
+
+    def get_rankings(self, limit=8, cls=None):
+        return self.submit("get_rankings", limit, cls)
+
+    def loop(self):
+        while True:
+            item = self.requests.get()
+            if item is None: break
+            future, method, args, deadline = item
+            if not future.set_running_or_notify_cancel(): continue
+            try:
+                future.set_result(self.call(method, args, deadline))
+            except Exception as e:
+                future.set_exception(e)
+        if self.db: self.db.conn.close()
+
+    def call(self, method, args, deadline):
+        attempt = 0
+        while True:
+            left = deadline - time.monotonic()
+            if left <= 0: raise TimeoutError(f"{method}: database did not respond in time")
+            try:
+                if self.db is None: self.db = self.factory()
+                # Čekání na zámek uvnitř SQLite nesmí přetáhnout termín požadavku
+                self.db.conn.execute(f"PRAGMA busy_timeout = {int(min(left * 1000, BUSY_TIMEOUT_MS))}")
+                return getattr(self.db, method)(*args)
+            except sqlite3.OperationalError as e:
+                # Znovu jen "database is locked/busy" (zapisuje web); chybějící tabulka nebo chyba disku
+                # se opakováním nespraví a jde rovnou ven
+                if self.db: self.db.conn.rollback()
+                if not is_busy(e): raise
+                pause = self.backoff * 2 ** attempt
+                attempt += 1
+                if attempt > self.retries or time.monotonic() + pause > deadline: raise
+                time.sleep(pause)
+
+    def close(self):
+        # Dokončí všechno zařazené (i uložení posledního runu) a zavře spojení
+        self.requests.put(None)
+        self.thread.join()
+
+
+# --- BENCHMARK ---
+def search_benchmark(n_users=1000000, n_queries=200, seed=1):
+    # Hledání podle prefixu přes NOCASE index proti LIKE '%x%' nad n_users náhodnými jmény
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "bench.db"))
+        migrate(conn)
+        start = time.perf_counter()
+        with conn:
+            conn.executemany("INSERT INTO users VALUES (?, 'x')",
+                             (("".join(rng.choices(string.ascii_letters, k=6)) + str(i),) for i in range(n_users)))
+        t_fill = time.perf_counter() - start
+        query = lambda sql, args=(): conn.execute(sql, args).fetchall()
+        prefixes = ["".join(rng.choices(string.ascii_letters, k=rng.randint(2, 4))) for _ in range(n_queries)]
+        rows = []
+        for label, fn, reps in [
+                ("prefix range", lambda p: search_hunters(query, p), n_queries),
+                ("LIKE '%x%'", lambda p: query("SELECT username FROM users WHERE username LIKE ? "
+                                               "ORDER BY username COLLATE NOCASE LIMIT ?",
+                                               (f"%{p}%", SEARCH_LIMIT)), max(1, n_queries // 20))]:
+            start = time.perf_counter()
+            for p in prefixes[:reps]: fn(p)
+            rows.append((label, (time.perf_counter() - start) / reps * 1000))
+        conn.close()
+    return t_fill, rows
+
+
+if __name__ == "__main__":
+    # python database.py --check [cesta]: migrace + kontrola plánů dotazů
+    # python database.py --backfill cesta: znovu postaví hunter_best a statistiky z celé historie runů
+    # python database.py --bench-search [počet]: benchmark hledání lovců (výchozí milion jmen)
+    if "--bench-search" in sys.argv:
+        counts = [int(a) for a in sys.argv[1:] if a.isdigit()]
+        t_fill, rows = search_benchmark(*counts[:1])
+        print(f"{counts[0] if counts else 1000000} users inserted in {t_fill:.2f}s")
+        for label, ms in rows: print(f"{label:>14}: {ms:8.3f} ms/query")
+        sys.exit(0)
+    if "--backfill" in sys.argv:
+        conn = sqlite3.connect([a for a in sys.argv[1:] if a != "--backfill"][0])
+        migrate(conn)
+        start = time.perf_counter()
+        with conn:
+            for sql in SQL_BACKFILL_BEST + SQL_BACKFILL_STATS: conn.execute(sql)
+        n = conn.execute("SELECT COUNT(*) FROM hunter_best").fetchone()[0]
+        d = conn.execute("SELECT COUNT(*) FROM daily_class_stats").fetchone()[0]
+        print(f"hunter_best: {n} hunters, daily_class_stats: {d} rows in {time.perf_counter() - start:.2f}s")
+        sys.exit(0)
+    if "--check" in sys.argv:
+        paths = [a for a in sys.argv[1:] if a != "--check"]
+        conn = sqlite3.connect(paths[0] if paths else ":memory:")
+        print(f"schema version {migrate(conn)}")
+        problems = check_query_plans(conn) + check_stats_triggers(conn)
+        for p in problems: print("CHECK:", p)
+        print("OK" if not problems else f"{len(problems)} problem(s)")
+        sys.exit(1 if problems else 0)
@@ -0,0 +1,1145 @@
+import random
+import math
+import os
+import pickle
+import time
+import shutil
+import tempfile
+import threading
+
+from catalog import (BOSS_COLOR, LOOT_STANDARD, LOOT_CRAFTING, LOOT_DB, BOSS_WEAPONS, SKILLS_DB, CLASSES,
+                     BOSS_DROPS, BOSS_DROP_CHANCE, FLOOR_MATERIALS, STORE_ITEMS, STORE_ARMOR_DEF, ITEM_IDS, LOOT_VALUES,
+                     SELL_VALUES, item_id, item_name, store_weapon, spawn_table, boss_type, boss_stats)
+
+# Herní pravidla bez pygame - Game v app.py je jen vykreslování a vstup nad tímto jádrem.
+
+
+# --- ENTITY ---
+def restore_slots(obj, state):
+    # __setstate__ pro třídy se __slots__ - umí i staré pickle savy, kde byl stav v __dict__
+    if isinstance(state, tuple): state = {**(state[0] or {}), **(state[1] or {})}
+    for k, v in state.items(): setattr(obj, k, v)
+
+
+class Weapon:
+    __slots__ = ("name", "min_dmg", "max_dmg", "scaling_stat", "scaling_rank", "value")
+    __setstate__ = restore_slots
+
+    def __init__(self, name, min_d, max_d, stat, rank, val):
+        self.name, self.min_dmg, self.max_dmg = name, min_d, max_d
+        self.scaling_stat, self.scaling_rank, self.value = stat, rank, val
+
+
+class Inventory:
+    # Multimnožina předmětů: id -> počet. Seřazený pohled pro obrazovku inventáře se drží v cache
+    # a zahodí se jen při změně. Navenek se chová jako původní seznam jmen (in, count, append, remove).
+    __slots__ = ("counts", "view")
+
+    def __init__(self, items=()):
+        self.counts, self.view = {}, None
+        for name in items: self.add(name)
+
+    def __getstate__(self):
+        return {"counts": {item_name(i): n for i, n in self.counts.items()}}
+
+    def __setstate__(self, state):
+        self.counts, self.view = {}, None
+        for name, n in state["counts"].items(): self.add(name, n)
+
+    def add(self, name, n=1):
+        if n <= 0: return
+        i = item_id(name)
+        self.counts[i] = self.counts.get(i, 0) + n
+        self.view = None
+
+    append = add
+
+    def extend(self, names):
+        for name in names: self.add(name)
+
+    def __iadd__(self, names):
+        self.extend(names)
+        return self
+
+    def discard(self, name, n=1):
+        # Odebere až n kusů, vrací kolik jich opravdu ubylo
+        i = ITEM_IDS.get(name)
+        have = self.counts.get(i, 0)
+        n = min(n, have)
+        if n <= 0: return 0
+        if n == have:
+            del self.counts[i]
+        else:
+            self.counts[i] = have - n
+        self.view = None
+        return n
+
+    def remove(self, name):
+        if not self.discard(name): raise ValueError(f"{name} not in inventory")
+
+    def pop_where(self, pred):
+        # Odebere všechny předměty, pro jejichž jméno platí pred - jeden průchod, vrací [(jméno, počet)]
+        taken = [(item_name(i), n) for i, n in self.counts.items() if pred(item_name(i))]
+        for name, n in taken: del self.counts[ITEM_IDS[name]]
+        if taken: self.view = None
+        return taken
+
+    def count(self, name):
+        return self.counts.get(ITEM_IDS.get(name), 0)
+
+    def __contains__(self, name):
+        return ITEM_IDS.get(name) in self.counts
+
+    def items(self):
+        # [(jméno, počet)] seřazené podle jména
+        if self.view is None: self.view = sorted((item_name(i), n) for i, n in self.counts.items())
+        return self.view
+
+    def names(self):
+        return [name for name, n in self.items()]
+
+    def __len__(self):
+        return sum(self.counts.values())
+
+    def __iter__(self):
+        for name, n in self.items():
+            for _ in range(n): yield name
+
+    def __repr__(self):
+        return f"Inventory({dict(self.items())})"
+
+
+class Player:
+    __slots__ = ("name", "grid_x", "grid_y", "prev_x", "prev_y", "class_name", "stats", "level", "xp", "xp_next",
+                 "souls", "shadows", "stat_points", "has_holy_water", "weapon", "armor_name", "inventory", "max_hp",
+                 "current_hp", "max_mana", "current_mana", "total_def", "cooldowns")
+    __setstate__ = restore_slots
+
+    def __init__(self, name, class_key="FIGHTER"):
+        self.name = name
+        self.grid_x, self.grid_y = 0, 0
+        self.prev_x, self.prev_y = 0, 0
+        self.class_name = class_key
+
+        c = CLASSES[class_key]
+        self.stats = c["stats"].copy()
+        self.level, self.xp, self.xp_next = 1, 0, 100
+        self.souls, self.shadows = 0, 0
+        self.stat_points = 0
+        self.has_holy_water = False
+
+        w = c["weapon"]
+        self.weapon = Weapon(w[0], w[1], w[2], w[3], w[4], w[5])
+        self.armor_name = "Basic Clothes"
+        self.inventory = Inventory(["Healing Stone"])
+
+        self.max_hp, self.current_hp = 0, 0
+        self.max_mana, self.current_mana = 0, 0
+        self.total_def = 0
+        self.cooldowns = {"Q": 0, "W": 0, "E": 0}
+
+        self.recalculate()
+        self.current_hp = self.max_hp
+        self.current_mana = self.max_mana
+
+    def recalculate(self):
+        self.max_hp = (self.stats["vigor"] * 10)
+        self.max_mana = (self.stats["int"] * 5) + self.stats.get("mana", 20)
+        self.total_def = self.stats["def"] + (self.stats["str"] // 5)
+        if self.current_hp > self.max_hp: self.current_hp = self.max_hp
+        if self.current_mana > self.max_mana: self.current_mana = self.max_mana
+
+    def check_level_up(self):
+        leveled_up = False
+        while self.xp >= self.xp_next:
+            self.xp -= self.xp_next
+            self.level += 1
+            self.stat_points += 5
+            self.xp_next = int(self.xp_next * 1.2)
+            leveled_up = True
+        if leveled_up:
+            self.recalculate()
+            self.current_hp = self.max_hp
+            self.current_mana = self.max_mana
+        return leveled_up
+
+    def tick_cooldowns(self):
+        for k in self.cooldowns:
+            if self.cooldowns[k] > 0: self.cooldowns[k] -= 1
+        regen = max(1, int(self.max_mana * 0.05))
+        self.current_mana = min(self.max_mana, self.current_mana + regen)
+        if self.has_holy_water:
+            hp_regen = max(2, int(self.max_hp * 0.05))
+            self.current_hp = min(self.max_hp, self.current_hp + hp_regen)
+
+    def attack(self, rng=random):
+        base = rng.randint(self.weapon.min_dmg, self.weapon.max_dmg)
+        stat = self.stats.get(self.weapon.scaling_stat, 10)
+        total = base + int(stat * self.weapon.scaling_rank)
+        crit = rng.randint(1, 100) <= min(self.stats["sense"], 50)
+        if crit: total = int(total * 1.5)
+        return total, crit
+
+    def use_shadows(self):
+        if self.shadows >= 3:
+            self.shadows -= 3
+            return self.stats["int"] * 5
+        return 0
+
+    def get_power_rating(self):
+        avg_dmg = (self.weapon.min_dmg + self.weapon.max_dmg) / 2
+        stat_bonus = self.stats[self.weapon.scaling_stat] * self.weapon.scaling_rank
+        return self.max_hp + ((avg_dmg + stat_bonus) * 6) + (self.total_def * 5)
+
+
+class Enemy:
+    __slots__ = ("is_boss", "name", "color", "hp", "dmg", "xp", "souls", "max_hp")
+    __setstate__ = restore_slots
+
+    def __init__(self, floor, is_boss=False, rng=random):
+        self.is_boss = is_boss
+        scale = 1.0 + (floor * 0.15)
+        if is_boss:
+            self.name, self.color = boss_type(floor)[0], BOSS_COLOR
+            self.hp, self.dmg, self.xp, self.souls = boss_stats(floor)
+        else:
+            # Tabulka dostupných démonů je pro každé patro předpočítaná v katalogu
+            n, _, c, hp, d, xp_val, s = rng.choice(spawn_table(floor))
+            self.name, self.color = n, c
+            self.hp, self.dmg = int(hp * scale), int(d * scale)
+            self.xp, self.souls = int(xp_val * scale), int(s * scale)
+        self.max_hp = self.hp
+
+    def get_power_rating(self):
+        return self.max_hp + (self.dmg * 6)
+
+
+DIRS = ['N', 'S', 'E', 'W']
+DIR_BITS = {'N': 1, 'S': 2, 'E': 4, 'W': 8}
+OPPOSITE = {'N': 'S', 'S': 'N', 'E': 'W', 'W': 'E'}
+ALL_EXITS = 15
+NO_ENEMIES = ()  # sdílená prázdná n-tice pro všechny vyčištěné místnosti
+
+
+class ExitsView:
+    # Pohled na bitovou masku místnosti, který se chová jako starý dict {'N': bool, ...}
+    __slots__ = ("room",)
+
+    def __init__(self, room):
+        self.room = room
+
+    def __getitem__(self, d):
+        return bool(self.room.mask & DIR_BITS[d])
+
+    def __setitem__(self, d, value):
+        if value:
+            self.room.mask |= DIR_BITS[d]
+        else:
+            self.room.mask &= ~DIR_BITS[d]
+
+    def get(self, d, default=None):
+        return bool(self.room.mask & DIR_BITS[d]) if d in DIR_BITS else default
+
+    def keys(self):
+        return list(DIRS)
+
+    def values(self):
+        return [self[d] for d in DIRS]
+
+    def items(self):
+        return [(d, self[d]) for d in DIRS]
+
+    def __iter__(self):
+        return iter(DIRS)
+
+    def __len__(self):
+        return len(DIRS)
+
+    def __eq__(self, other):
+        return dict(self.items()) == dict(other.items() if hasattr(other, "items") else other)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class Room:
+    __slots__ = ("mask", "enemies")
+    __setstate__ = restore_slots
+
+    def __init__(self, from_dir=None, rng=random):
+        self.enemies = NO_ENEMIES
+        self.mask = 0
+        for d in DIRS:
+            if rng.random() > 0.4: self.mask |= DIR_BITS[d]
+        if from_dir:
+            self.mask |= DIR_BITS[OPPOSITE[from_dir]]
+
+    @property
+    def exits(self):
+        return ExitsView(self)
+
+    @exits.setter
+    def exits(self, value):
+        if isinstance(value, int):
+            self.mask = value
+        else:
+            self.mask = sum(DIR_BITS[d] for d, v in value.items() if v)
+
+    def set_enemies(self, enemies):
+        self.enemies = list(enemies) or NO_ENEMIES
+
+    def add_enemy(self, enemy):
+        if self.enemies is NO_ENEMIES: self.enemies = []
+        self.enemies.append(enemy)
+
+    def remove_enemy(self, enemy):
+        self.enemies.remove(enemy)
+        if not self.enemies: self.enemies = NO_ENEMIES
+
+
+# --- MAPA PO CHUNCÍCH ---
+CHUNK_BITS = 4
+CHUNK = 1 << CHUNK_BITS  # 16x16 místností na chunk
+PRESENT = 0x10  # bajt buňky: PRESENT | maska východů, 0 = neprozkoumáno
+
+
+class MapChunk:
+    __slots__ = ("cells", "enemies", "count")
+
+    def __init__(self):
+        self.cells = bytearray(CHUNK * CHUNK)
+        self.enemies = {}  # index buňky -> seznam nepřátel, jen obsazené místnosti
+        self.count = 0
+
+
+class RoomRef:
+    # Místnost uložená v ChunkedMap - stejné API jako Room, zapisuje rovnou do chunku
+    __slots__ = ("store", "chunk", "i", "x", "y")
+
+    def __init__(self, store, chunk, i, x, y):
+        self.store, self.chunk, self.i, self.x, self.y = store, chunk, i, x, y
+
+    @property
+    def mask(self):
+        return self.chunk.cells[self.i] & 15
+
+    @mask.setter
+    def mask(self, value):
+        self.chunk.cells[self.i] = PRESENT | value
+
+    @property
+    def enemies(self):
+        return self.chunk.enemies.get(self.i, NO_ENEMIES)
+
+    exits = Room.exits
+
+    def set_enemies(self, enemies):
+        self.store.put_enemies(self.chunk, self.i, self.x, self.y, list(enemies))
+
+    def add_enemy(self, enemy):
+        self.store.put_enemies(self.chunk, self.i, self.x, self.y, list(self.enemies) + [enemy])
+
+    def remove_enemy(self, enemy):
+        enemies = list(self.enemies)
+        enemies.remove(enemy)
+        self.store.put_enemies(self.chunk, self.i, self.x, self.y, enemies)
+
+
+class ChunkedMap:
+    # Mapa patra po chuncích 16x16. Chová se jako původní dict {(x, y): Room}, navíc umí
+    # rooms_in_rect() pro výřez obrazovky, drží množinu místností s nepřáteli (occupied)
+    # a se spill_dir odkládá chunky daleko od hráče na disk.
+    def __init__(self, spill_dir=None, keep_radius=4, max_loaded=256):
+        self.chunks = {}
+        self.occupied = set()
+        self.rooms = 0
+        self.spill_dir, self.keep_radius, self.max_loaded = spill_dir, keep_radius, max_loaded
+        self.spilled, self.spill_path = set(), None
+
+    def chunk(self, cx, cy, create=False):
+        c = self.chunks.get((cx, cy))
+        if c is None:
+            if (cx, cy) in self.spilled:
+                c = self.load_chunk(cx, cy)
+            elif create:
+                c = self.chunks[(cx, cy)] = MapChunk()
+        return c
+
+    def __contains__(self, key):
+        x, y = key
+        c = self.chunk(x >> CHUNK_BITS, y >> CHUNK_BITS)
+        return c is not None and c.cells[(y & (CHUNK - 1)) << CHUNK_BITS | (x & (CHUNK - 1))] != 0
+
+    def get(self, key, default=None):
+        x, y = key
+        c = self.chunk(x >> CHUNK_BITS, y >> CHUNK_BITS)
+        if c is None: return default
+        i = (y & (CHUNK - 1)) << CHUNK_BITS | (x & (CHUNK - 1))
+        if not c.cells[i]: return default
+        return RoomRef(self, c, i, x, y)
+
+    def __getitem__(self, key):
+        room = self.get(key)
+        if room is None: raise KeyError(key)
+        return room
+
+    def __setitem__(self, key, room):
+        self.set_room(key[0], key[1], room.mask, room.enemies)
+
+    def set_room(self, x, y, mask, enemies=NO_ENEMIES):
+        c = self.chunk(x >> CHUNK_BITS, y >> CHUNK_BITS, create=True)
+        i = (y & (CHUNK - 1)) << CHUNK_BITS | (x & (CHUNK - 1))
+        if not c.cells[i]:
+            c.count += 1
+            self.rooms += 1
+        c.cells[i] = PRESENT | mask
+        self.put_enemies(c, i, x, y, enemies)
+
+    def put_enemies(self, c, i, x, y, enemies):
+        if enemies:
+            c.enemies[i] = list(enemies)
+            self.occupied.add((x, y))
+        else:
+            c.enemies.pop(i, None)
+            self.occupied.discard((x, y))
+
+    def __len__(self):
+        return self.rooms
+
+    def iter_rooms(self):
+        # (x, y, maska, nepřátelé) pro všechny místnosti, včetně odložených chunků - ty se jen přečtou
+        # ze souboru a zůstanou na disku (ukládání savu jinak natáhlo celou mapu zpět do paměti)
+        for cx, cy in list(self.chunks) + list(self.spilled):
+            c = self.chunks.get((cx, cy)) or self.load_chunk(cx, cy, keep=False)
+            for i, v in enumerate(c.cells):
+                if v: yield cx * CHUNK + (i & (CHUNK - 1)), cy * CHUNK + (i >> CHUNK_BITS), v & 15, \
+                    c.enemies.get(i, NO_ENEMIES)
+
+    def rooms_in_rect(self, x0, y0, x1, y1):
+        # (x, y, maska, nepřátelé) pro místnosti v obdélníku včetně hranic, bez alokace RoomRef
+        for cy in range(y0 >> CHUNK_BITS, (y1 >> CHUNK_BITS) + 1):
+            for cx in range(x0 >> CHUNK_BITS, (x1 >> CHUNK_BITS) + 1):
+                c = self.chunk(cx, cy)
+                if c is None: continue
+                bx, by = cx * CHUNK, cy * CHUNK
+                lx0, lx1 = max(x0, bx) - bx, min(x1, bx + CHUNK - 1) - bx
+                cells, enemies = c.cells, c.enemies
+                for ly in range(max(y0, by) - by, min(y1, by + CHUNK - 1) - by + 1):
+                    row = ly << CHUNK_BITS
+                    for i, v in enumerate(cells[row | lx0:(row | lx1) + 1], row | lx0):
+                        if v: yield bx + (i & (CHUNK - 1)), by + ly, v & 15, enemies.get(i, NO_ENEMIES)
+
+    def items(self):
+        for x, y, mask, enemies in self.iter_rooms(): yield (x, y), self[(x, y)]
+
+    def keys(self):
+        for x, y, mask, enemies in self.iter_rooms(): yield x, y
+
+    __iter__ = keys
+
+    def values(self):
+        for key, room in self.items(): yield room
+
+    # --- ODKLÁDÁNÍ NA DISK ---
+    def spill_far(self, x, y):
+        if not self.spill_dir or len(self.chunks) <= self.max_loaded: return
+        if self.spill_path is None: self.spill_path = tempfile.mkdtemp(prefix="map_", dir=self.spill_dir)
+        pcx, pcy = x >> CHUNK_BITS, y >> CHUNK_BITS
+        for key in [k for k in self.chunks if max(abs(k[0] - pcx), abs(k[1] - pcy)) > self.keep_radius]:
+            c = self.chunks.pop(key)
+            with open(os.path.join(self.spill_path, "%d_%d.chunk" % key), "wb") as f:
+                pickle.dump((bytes(c.cells), c.enemies, c.count), f)
+            self.spilled.add(key)
+
+    def load_chunk(self, cx, cy, keep=True):
+        # keep=False: jen kopie ke čtení, chunk zůstane odložený na disku
+        path = os.path.join(self.spill_path, "%d_%d.chunk" % (cx, cy))
+        with open(path, "rb") as f:
+            cells, enemies, count = pickle.load(f)
+        c = MapChunk()
+        c.cells[:], c.enemies, c.count = cells, enemies, count
+        if keep:
+            os.remove(path)
+            self.chunks[(cx, cy)] = c
+            self.spilled.discard((cx, cy))
+        return c
+
+    def close(self):
+        if self.spill_path: shutil.rmtree(self.spill_path, ignore_errors=True)
+        self.spill_path, self.spilled = None, set()
+
+
+# --- LOG ---
+LOG_CAPACITY = 8
+
+
+def log_category(text):
+    return "SYSTEM" if "SYSTEM" in text else ("COMBAT" if "COMBAT" in text else "INFO")
+
+
+class LogEntry:
+    # surface si doplní vykreslování (app.py) při prvním zobrazení, engine ho nepoužívá
+    __slots__ = ("text", "category", "surface")
+
+    def __init__(self, text, category=None):
+        self.text, self.category, self.surface = text, category or log_category(text), None
+
+
+class CombatLog:
+    # Kruhový buffer posledních LOG_CAPACITY zpráv + neomezená historie pro scrollback.
+    # S history_path se historie zapisuje do souboru (řádek na zprávu) a čte se z něj přes offsety.
+    # Iterace a indexování vrací texty jako původní seznam.
+    def __init__(self, capacity=LOG_CAPACITY, history_path=None):
+        self.capacity, self.history_path = capacity, history_path
+        self.rev, self.history_file = 0, None
+        self.reset()
+
+    def reset(self, lines=()):
+        self.ring, self.start, self.size = [None] * self.capacity, 0, 0
+        self.history, self.offsets = [], []
+        if self.history_path:
+            if self.history_file: self.history_file.close()
+            self.history_file = open(self.history_path, "w+", encoding="utf-8")
+        for text in lines: self.add(text)
+        self.rev += 1
+
+    def add(self, text, category=None):
+        entry = LogEntry(text, category)
+        if self.size < self.capacity:
+            self.ring[(self.start + self.size) % self.capacity] = entry
+            self.size += 1
+        else:
+            self.ring[self.start] = entry
+            self.start = (self.start + 1) % self.capacity
+        if self.history_path:
+            self.history_file.seek(0, os.SEEK_END)
+            self.offsets.append(self.history_file.tell())
+            self.history_file.write(text.replace("\n", " ") + "\n")
+        else:
+            self.history.append(text)
+        self.rev += 1
+        return entry
+
+    append = add
+
+    def entries(self):
+        return [self.ring[(self.start + i) % self.capacity] for i in range(self.size)]
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for entry in self.entries(): yield entry.text
+
+    def __getitem__(self, i):
+        return [entry.text for entry in self.entries()][i]
+
+    def history_len(self):
+        return len(self.offsets) if self.history_path else len(self.history)
+
+    def history_slice(self, start, stop):
+        start, stop = max(0, start), min(stop, self.history_len())
+        if not self.history_path: return self.history[start:stop]
+        if start >= stop: return []
+        self.history_file.flush()
+        self.history_file.seek(self.offsets[start])
+        return [self.history_file.readline().rstrip("\n") for _ in range(stop - start)]
+
+    def close(self):
+        if self.history_file: self.history_file.close()
+        self.history_file = None
+
+
+# --- UKLÁDÁNÍ ---
+class SaveWriter:
+    # Zápis savu na pozadí: všechna mark_dirty() během delay se slijí do jednoho zápisu,
+    # soubor se zapisuje do .tmp a pak atomicky přejmenuje.
+    def __init__(self, path, encode, delay=0.25):
+        self.path, self.encode, self.delay = path, encode, delay
+        self.cond = threading.Condition()
+        self.write_lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.dirty, self.closed = False, False
+        self.generation = 0
+        self.requests, self.saves = 0, 0
+        self.last_save_ms, self.last_error = None, None
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+    def mark_dirty(self):
+        with self.cond:
+            self.dirty = True
+            self.requests += 1
+            self.cond.notify()
+
+    def loop(self):
+        while True:
+            with self.cond:
+                while not self.dirty and not self.closed: self.cond.wait()
+                if self.closed: return
+            time.sleep(self.delay)
+            self.flush()
+
+    def flush(self):
+        # flush_lock: kdo volá flush, počká i na zápis, který už běží ve vlákně
+        with self.flush_lock:
+            with self.cond:
+                if not self.dirty: return
+                self.dirty = False
+                generation = self.generation
+            start = time.perf_counter()
+            tmp = self.path + ".tmp"
+            # encode() bere zámek enginu, proto se volá mimo write_lock (discard běží pod zámkem enginu)
+            try:
+                data = self.encode()
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                return
+            with self.write_lock:
+                if generation != self.generation: return
+                try:
+                    with open(tmp, "wb") as f:
+                        f.write(data)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(tmp, self.path)
+                    self.saves += 1
+                    self.last_error = None
+                except Exception as e:
+                    self.last_error = f"{type(e).__name__}: {e}"
+                self.last_save_ms = (time.perf_counter() - start) * 1000
+
+    def discard(self):
+        # Zahodí čekající zápis a smaže save (konec hry)
+        with self.cond:
+            self.dirty = False
+            self.generation += 1
+        with self.write_lock:
+            for path in [self.path, self.path + ".tmp"]:
+                if os.path.exists(path): os.remove(path)
+
+    def close(self):
+        self.flush()
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self.thread.join()
+
+
+# --- HERNÍ JÁDRO ---
+MOVES = {"MOVE_N": (0, 1, 'N'), "MOVE_S": (0, -1, 'S'), "MOVE_E": (1, 0, 'E'), "MOVE_W": (-1, 0, 'W')}
+COMBAT_ACTIONS = ["ATTACK", "Q", "W", "E", "SHADOWS", "POTION", "RUN"]
+EXPLORE_ACTIONS = ["BUY", "SELL", "SELL_ALL", "EQUIP", "CRAFT", "STAT"]
+STAT_KEYS = ["str", "dex", "int", "vigor", "sense"]
+
+
+class GameEngine:
+    def __init__(self, save_file=None, spill_dir=None, history_path=None, record_dir=None, record_keep=None):
+        # record_keep = kolik nejnovějších nahrávek v record_dir nechat (None = replay.MAX_RECORDINGS)
+        self.save_file, self.spill_dir, self.record_dir, self.record_keep = save_file, spill_dir, record_dir, record_keep
+        self.map = None
+        # Veškerá náhoda hry jde přes rng běhu - stejné seed + stejné akce = stejná hra (replay.py)
+        self.rng, self.seed = random.Random(), None
+        self.recorder = None
+        self.log = CombatLog(history_path=history_path)
+        self.lock = threading.RLock()
+        self.saver = SaveWriter(save_file, self.encode_save) if save_file else None
+        self.save_error = None
+        self.map_rev = 0
+        self.reset()
+
+    def reset(self):
+        self.end_recording()
+        self.player = None
+        self.log.reset()
+        self.set_map(ChunkedMap(self.spill_dir))
+        self.map_rev += 1
+        self.floor = 1
+        self.state = "EXPLORE"
+        self.has_key, self.boss_spawned, self.boss_active = False, False, False
+        self.boss_coords, self.player_moves = None, 0
+        self.store = [(name, cost) for name, cost, floor, kind in STORE_ITEMS if floor <= 1]
+
+    def start(self, name, class_key="FIGHTER", seed=None):
+        with self.lock:
+            return self.new_run(name, class_key, seed)
+
+    def new_run(self, name, class_key, seed=None):
+        # seed=None vylosuje nový; s record_dir se akce běhu nahrávají (replay.Recorder)
+        self.end_recording()
+        self.seed = random.getrandbits(64) if seed is None else seed
+        self.rng.seed(self.seed)
+        self.start_recording(name, class_key)
+        self.player = Player(name, class_key)
+        self.floor = 1
+        self.set_map(ChunkedMap(self.spill_dir))
+        self.map[(0, 0)] = Room(rng=self.rng)
+        self.map[(0, 0)].mask = ALL_EXITS
+        self.map_rev += 1
+        self.log.reset([f"SYSTEM: Welcome, Hunter {name}."])
+        self.has_key, self.boss_spawned, self.boss_active = False, False, False
+        self.boss_coords, self.player_moves = None, 0
+        self.state = "EXPLORE"
+        return self.observe()
+
+    def save_game(self):
+        if self.saver: self.saver.mark_dirty()
+
+    def encode_save(self):
+        # Volá se z vlákna SaveWriteru, zámek drží stav v klidu po dobu serializace
+        import savecodec
+        with self.lock:
+            return savecodec.encode(self)
+
+    def start_recording(self, name, class_key, save=b""):
+        # save = bajty savu, ze kterého běh pokračuje (prázdné u nového běhu)
+        if self.record_dir:
+            import replay
+            self.recorder = replay.Recorder.create(self.record_dir, self.seed, name, class_key, save, self.record_keep)
+
+    def end_recording(self):
+        # Nahrávka končí otiskem stavu, podle kterého replay pozná, že došel ke stejnému výsledku
+        if self.recorder:
+            self.recorder.close(self.fingerprint() if self.player else None)
+            self.recorder = None
+
+    def fingerprint(self):
+        p = self.player
+        return (self.floor, p.level, p.xp, p.souls, int(p.current_hp), p.grid_x, p.grid_y, len(self.map))
+
+    def close(self):
+        self.end_recording()
+        if self.saver: self.saver.close()
+        self.map.close()
+        self.log.close()
+
+    def set_map(self, game_map):
+        if self.map is not None: self.map.close()
+        self.map = game_map
+
+    def load_game(self, name):
+        if self.saver: self.saver.flush()
+        if not self.save_file or not os.path.exists(self.save_file): return False
+        with self.lock:
+            return self.read_save(name)
+
+    def read_save(self, name):
+        import savecodec
+        try:
+            with open(self.save_file, "rb") as f:
+                raw = f.read()
+            data = savecodec.decode(raw)
+        except (OSError, savecodec.SaveFormatError):
+            return False
+
+        if data["player"].name != name: return False
+        self.resume(data, raw)
+        return True
+
+    def resume(self, data, raw, seed=None):
+        # Pokračování ze savu: data = savecodec.decode(raw). rng dostane nový seed a nahrávka nese
+        # seed i celý save, replay tak pokračování zopakuje od stejného stavu
+        self.end_recording()
+        self.seed = random.getrandbits(64) if seed is None else seed
+        self.rng.seed(self.seed)
+        self.start_recording(data["player"].name, data["player"].class_name, raw)
+        self.player = data["player"]
+        self.floor = data["floor"]
+        self.log.reset(data["log"])
+        self.set_map(data["map"])
+        self.map.spill_dir = self.spill_dir
+        self.map_rev += 1
+        self.has_key, self.boss_spawned = data["has_key"], data["boss_spawned"]
+        self.boss_active, self.boss_coords = data["boss_active"], data["boss_coords"]
+        self.store = data["store"]
+        self.player_moves = 0  # boss se hýbe každý druhý tah - počítá se od pokračování, jako v replay
+        self.state = "EXPLORE"
+        self.sync_state()
+        return self.observe()
+
+    def delete_save(self):
+        if self.saver: self.saver.discard()
+
+    # --- API PRO SKRIPTY ---
+    def step(self, action, arg=None):
+        with self.lock:
+            if self.recorder: self.recorder.record(action, arg)
+            self.apply(action, arg)
+            return self.observe()
+
+    def apply(self, action, arg):
+        if self.saver and self.saver.last_error != self.save_error:
+            self.save_error = self.saver.last_error
+            if self.save_error: self.add_log("SYSTEM: Save failed! " + self.save_error)
+        if self.state == "EXPLORE":
+            if action in MOVES:
+                self.move(*MOVES[action])
+            elif action == "BUY":
+                self.buy(arg)
+            elif action == "SELL":
+                self.sell_item(arg)
+            elif action == "SELL_ALL":
+                self.sell_all_loot()
+            elif action == "EQUIP":
+                self.equip(arg)
+            elif action == "CRAFT":
+                if isinstance(arg, tuple):
+                    self.craft(*arg)
+                else:
+                    self.craft(arg)
+            elif action == "STAT":
+                self.upgrade_stat(arg)
+        elif self.state == "COMBAT":
+            if action in COMBAT_ACTIONS: self.combat(action)
+        elif self.state == "NEXT_FLOOR":
+            if action == "NEXT_FLOOR": self.next_floor()
+        self.sync_state()
+
+    def legal_actions(self):
+        if self.state == "EXPLORE":
+            curr = self.map[(self.player.grid_x, self.player.grid_y)]
+            return [a for a, (_, _, d) in MOVES.items() if curr.exits.get(d)] + EXPLORE_ACTIONS
+        if self.state == "COMBAT": return list(COMBAT_ACTIONS)
+        if self.state == "NEXT_FLOOR": return ["NEXT_FLOOR"]
+        return []
+
+    def observe(self):
+        p = self.player
+        room = self.map.get((p.grid_x, p.grid_y))
+        return {
+            "state": self.state, "floor": self.floor, "pos": (p.grid_x, p.grid_y),
+            "hp": p.current_hp, "max_hp": p.max_hp, "mana": p.current_mana, "max_mana": p.max_mana,
+            "level": p.level, "xp": p.xp, "souls": p.souls, "shadows": p.shadows, "stat_points": p.stat_points,
+            "exits": dict(room.exits) if room else {},
+            "enemies": [(e.name, e.hp, e.max_hp, e.is_boss) for e in room.enemies] if room else [],
+            "log": list(self.log), "done": self.state == "GAMEOVER",
+        }
+
+    def sync_state(self):
+        if self.state == "EXPLORE":
+            curr_room = self.map.get((self.player.grid_x, self.player.grid_y))
+            if curr_room and curr_room.enemies: self.state = "COMBAT"
+
+    # --- PRAVIDLA ---
+    def check_shop_unlocks(self):
+        for name, cost, floor, kind in STORE_ITEMS:
+            if 1 < floor <= self.floor and (name, cost) not in self.store: self.store.append((name, cost))
+
+    def add_log(self, txt, category=None):
+        self.log.add(txt, category)
+
+    def generate_room(self, x, y, from_dir):
+        if (x, y) not in self.map:
+            r = Room(from_dir, self.rng)
+            if self.rng.random() < (0.5 + self.floor * 0.02) and (x != 0 or y != 0):
+                for _ in range(self.rng.randint(1, 3)): r.add_enemy(Enemy(self.floor, rng=self.rng))
+            if self.has_key and not self.boss_spawned and math.hypot(x, y) > 5:
+                r.set_enemies([Enemy(self.floor, is_boss=True)])
+                self.boss_spawned, self.boss_active, self.boss_coords = True, True, (x, y)
+                self.add_log("WARNING: Boss Signature Detected!")
+            self.map[(x, y)] = r
+
+    def move_boss(self):
+        if not self.boss_active or not self.boss_coords: return
+        bx, by = self.boss_coords
+        px, py = self.player.grid_x, self.player.grid_y
+        if (bx, by) == (px, py): return
+
+        nbx, nby = bx, by
+        if bx < px:
+            nbx += 1
+        elif bx > px:
+            nbx -= 1
+        if nbx == bx:
+            if by < py:
+                nby += 1
+            elif by > py:
+                nby -= 1
+
+        if (nbx, nby) in self.map:
+            old_room, target_room = self.map[(bx, by)], self.map[(nbx, nby)]
+            boss_obj = next((e for e in old_room.enemies if e.is_boss), None)
+            if boss_obj:
+                old_room.remove_enemy(boss_obj)
+                target_room.add_enemy(boss_obj)
+                self.boss_coords = (new_bx, new_by) = (nbx, nby)
+                if (nbx, nby) == (px, py):
+                    self.add_log("ALERT: BOSS HAS FOUND YOU!")
+                    self.state = "COMBAT"
+
+    def move(self, dx, dy, d_str):
+        curr = self.map[(self.player.grid_x, self.player.grid_y)]
+        if curr.enemies: return
+        if not curr.exits.get(d_str): return
+
+        nx, ny = self.player.grid_x + dx, self.player.grid_y + dy
+        self.map_rev += 1
+        self.player.prev_x, self.player.prev_y = self.player.grid_x, self.player.grid_y
+        self.generate_room(nx, ny, d_str)
+        self.player.grid_x, self.player.grid_y = nx, ny
+        self.map.spill_far(nx, ny)
+
+        self.player_moves += 1
+        if self.player_moves % 2 == 0: self.move_boss()
+        self.save_game()
+
+        if self.map[(nx, ny)].enemies:
+            self.state = "COMBAT"
+            self.add_log(f"ENEMIES: {len(self.map[(nx, ny)].enemies)} targets.")
+
+    def get_sellable_loot_value(self):
+        return sum(LOOT_VALUES.get(i, 0) * n for i, n in self.player.inventory.counts.items())
+
+    def count_item(self, item):
+        return self.player.inventory.count(item)
+
+    def remove_items(self, item, count):
+        self.player.inventory.discard(item, count)
+
+    def combat(self, action):
+        room = self.map[(self.player.grid_x, self.player.grid_y)]
+        target = room.enemies[0]
+        turn_ended = True
+        self.map_rev += 1
+
+        if action in ["Q", "W", "E"]:
+            s_name, s_cost, s_cd, s_val, s_type = SKILLS_DB[self.player.class_name][action]
+            if self.player.current_mana < s_cost:
+                self.add_log("SYSTEM: Not enough Mana!");
+                turn_ended = False
+            elif self.player.cooldowns[action] > 0:
+                self.add_log(f"SYSTEM: {s_name} is on CD!");
+                turn_ended = False
+            else:
+                self.player.current_mana -= s_cost
+                self.player.cooldowns[action] = s_cd
+                self.add_log(f"SKILL: Used {s_name}!")
+
+                if s_type == "DMG":
+                    dmg, crit = self.player.attack(self.rng)
+                    dmg = int(dmg * s_val)
+                    target.hp -= dmg
+                    self.add_log(f"HIT: {dmg} Damage!")
+                elif s_type == "HEAL":
+                    heal = int(self.player.max_hp * s_val) if s_val < 1.0 else int(s_val)
+                    self.player.current_hp = min(self.player.max_hp, self.player.current_hp + heal)
+                    self.add_log(f"HEAL: Recovered {heal} HP.")
+                elif s_type == "BUFF":
+                    self.add_log("BUFF: Effect applied.")
+                elif s_type == "ESCAPE":
+                    self.player.grid_x, self.player.grid_y = self.player.prev_x, self.player.prev_y
+                    self.state = "EXPLORE";
+                    self.add_log("SYSTEM: Vanished into shadows!")
+                    return
+
+        elif action == "RUN":
+            cost = 50 * self.floor
+            if self.player.souls >= cost:
+                self.player.souls -= cost
+                self.player.grid_x, self.player.grid_y = self.player.prev_x, self.player.prev_y
+                self.state = "EXPLORE";
+                self.add_log("ESCAPED!");
+                return
+            else:
+                self.add_log("SYSTEM: Insufficient Souls.");
+                turn_ended = False
+
+        elif action == "ATTACK":
+            dmg, crit = self.player.attack(self.rng)
+            target.hp -= dmg
+            self.add_log(f"ATTACK: {dmg}{' [CRIT]' if crit else ''}")
+
+        elif action == "SHADOWS":
+            dmg = self.player.use_shadows()
+            if dmg > 0:
+                self.add_log(f"ARISE: {dmg} DMG to all.")
+                for e in room.enemies: e.hp -= dmg
+            else:
+                self.add_log("SYSTEM: Need 3 Shadows.");
+                turn_ended = False
+
+        dead_enemies = [e for e in room.enemies if e.hp <= 0]
+        room.set_enemies(e for e in room.enemies if e.hp > 0)
+
+        for e in dead_enemies:
+            self.player.souls += e.souls
+            self.player.xp += e.xp
+            if self.rng.random() < 0.3: self.player.shadows += 1
+
+            if e.is_boss:
+                self.boss_active, self.boss_coords = False, None
+                weapon = BOSS_DROPS.get(e.name)
+                if weapon and self.rng.random() < BOSS_DROP_CHANCE:
+                    self.player.inventory.append(weapon)
+                    self.add_log(f"EPIC DROP: {weapon}!")
+
+                material = FLOOR_MATERIALS.get(self.floor)
+                if material: self.player.inventory.append(material)
+
+            else:
+                if self.rng.random() < 0.4:
+                    if self.rng.random() < 0.5:
+                        drop = self.rng.choice(LOOT_STANDARD)
+                    else:
+                        drop = self.rng.choice(LOOT_CRAFTING)
+                    self.player.inventory.append(drop)
+                    self.add_log(f"DROPPED: {drop}")
+
+            if not self.has_key and self.rng.random() < 0.1:
+                self.has_key = True;
+                self.add_log("ITEM: Found Key.")
+
+        if self.player.check_level_up():
+            self.add_log("SYSTEM: LEVEL UP! Press [C] to Upgrade Stats.")
+
+        if not room.enemies:
+            if any(e.is_boss for e in dead_enemies):
+                self.floor += 1;
+                self.check_shop_unlocks();
+                self.state = "NEXT_FLOOR"
+            else:
+                self.state = "EXPLORE";
+                self.save_game()
+            return
+
+        if turn_ended:
+            self.player.tick_cooldowns()
+            dmg_taken = sum(max(1, e.dmg - self.player.total_def) for e in room.enemies)
+            if dmg_taken > 0:
+                self.player.current_hp -= dmg_taken
+                self.add_log(f"DEFENSE: Took {dmg_taken} dmg.")
+            if self.player.current_hp <= 0:
+                self.delete_save()
+                self.state = "GAMEOVER"
+
+    def upgrade_stat(self, stat):
+        if self.player.stat_points > 0 and stat in STAT_KEYS:
+            self.player.stats[stat] += 1
+            self.player.stat_points -= 1
+            self.player.recalculate()
+
+    def sell_item(self, item):
+        if item not in self.player.inventory: return False
+        val = SELL_VALUES.get(ITEM_IDS.get(item), 0)
+
+        if val > 0:
+            self.player.souls += val
+            self.player.inventory.remove(item)
+            self.add_log(f"SOLD: 1x {item} (+{val} Souls)")
+            return True
+        self.add_log("SYSTEM: Cannot sell this item.")
+        return False
+
+    def equip(self, item):
+        if item in BOSS_WEAPONS and item in self.player.inventory:
+            self.player.inventory.append("Weapon Scraps")
+            w = BOSS_WEAPONS[item]
+            self.player.weapon = Weapon(item, w[0], w[1], w[2], w[3], w[4])
+            self.player.inventory.remove(item)
+            self.add_log(f"EQUIPPED: {item}")
+            self.player.recalculate()
+            return True
+        return False
+
+    def craft(self, recipe, times=1):
+        if recipe == "HOLY_WATER":
+            if not self.player.has_holy_water:
+                if self.count_item("Purified Blood") >= 1 and self.count_item(
+                        "World Tree Fragment") >= 1 and self.count_item("Echoing Spring Water") >= 1:
+                    self.remove_items("Purified Blood", 1);
+                    self.remove_items("World Tree Fragment", 1);
+                    self.remove_items("Echoing Spring Water", 1)
+                    self.player.has_holy_water = True
+                    self.add_log("SYSTEM: Holy Water of Life CRAFTED! (Perm Regen)")
+                else:
+                    self.add_log("SYSTEM: Missing Boss Materials.")
+            else:
+                self.add_log("SYSTEM: Already consumed Holy Water.")
+        elif recipe == "HEALING_STONE":
+            # times=None vyrobí co nejvíc kamenů naráz
+            n = min(self.count_item("Magic Crystal") // 2, self.count_item("Iron Ore"))
+            if times is not None: n = min(n, times)
+            if n >= 1:
+                self.remove_items("Magic Crystal", 2 * n);
+                self.remove_items("Iron Ore", n)
+                self.player.inventory.add("Healing Stone", n)
+                self.add_log("SYSTEM: Healing Stone Crafted." if n == 1 else f"SYSTEM: {n}x Healing Stone Crafted.")
+            else:
+                self.add_log("SYSTEM: Missing Materials.")
+
+    def sell_all_loot(self):
+        sold = self.player.inventory.pop_where(LOOT_DB.__contains__)
+        val = sum(LOOT_DB[item] * n for item, n in sold)
+        if val > 0:
+            self.player.souls += val
+            self.add_log(f"SOLD ALL LOOT: +{val} Souls")
+
+    def buy(self, index):
+        if index is None or not 0 <= index < len(self.store): return
+        name, cost = self.store[index]
+        if self.player.souls >= cost:
+            self.player.souls -= cost
+            if "Healing" in name or "Elixir" in name:
+                self.player.inventory.append(name)
+            elif "Dagger" in name or "Orb" in name or "Sword" in name:
+                self.player.inventory.append("Weapon Scraps")
+                self.player.weapon = Weapon(name, *store_weapon(cost), cost)
+                self.add_log("Old Weapon dismantled.")
+            elif "Armor" in name:
+                self.player.inventory.append("Armor Scraps")
+                self.player.armor_name = name
+                self.player.stats["def"] += STORE_ARMOR_DEF;
+                self.player.recalculate()
+                self.add_log("Old Armor dismantled.")
+            elif "Daily" in name:
+                if "Strength" in name:
+                    self.player.stats["str"] += 2
+                else:
+                    self.player.stats["dex"] += 2
+                self.player.recalculate()
+            self.add_log(f"Purchased {name}.")
+        else:
+            self.add_log("Insufficient Souls.")
+
+    def next_floor(self):
+        self.set_map(ChunkedMap(self.spill_dir))
+        self.map[(0, 0)] = Room(rng=self.rng)
+        self.map[(0, 0)].mask = ALL_EXITS
+        self.player.grid_x, self.player.grid_y = 0, 0
+        self.map_rev += 1
+        self.has_key, self.boss_spawned = False, False
+        self.state = "EXPLORE"
+        self.save_game()
+
+
+# --- PAMĚŤ MAPY ---
+def room_memory_benchmark(n_rooms=100000, enemy_ratio=0.1):
+    # Bajty na prozkoumanou místnost - původní dict/list místnost, __slots__ a maska v dictu, ChunkedMap
+    import tracemalloc
+
+    class DictRoom:
+        def __init__(self, from_dir=None):
+            self.enemies = []
+            self.exits = {'N': False, 'S': False, 'E': False, 'W': False}
+            for d in ['N', 'S', 'E', 'W']:
+                if random.random() > 0.4: self.exits[d] = True
+
+    results = {}
+    for label, cls, store in [("before", DictRoom, dict), ("after", Room, dict), ("chunked", Room, ChunkedMap)]:
+        random.seed(1)
+        tracemalloc.start()
+        game_map = store()
+        for i in range(n_rooms):
+            room = cls()
+            if random.random() < enemy_ratio:
+                room.enemies = [Enemy(5)]
+            game_map[(i % 1000, i // 1000)] = room
+        results[label] = tracemalloc.get_traced_memory()[0] / n_rooms
+        tracemalloc.stop()
+        del game_map
+    return results
+
+
+if __name__ == "__main__":
+    for label, per_room in room_memory_benchmark().items():
+        print(f"{label:>7}: {per_room:.0f} bytes per explored room")
@@ -0,0 +1,211 @@
+import os
+import sys
+import time
+import random
+import struct
+
+from engine import GameEngine, MOVES, COMBAT_ACTIONS, EXPLORE_ACTIONS, STAT_KEYS
+import savecodec
+from savecodec import Reader
+
+# Nahrávka běhu: v hlavičce seed, jméno a třída, u pokračování ze savu i celý save, potom akce
+# GameEngine.step v pořadí, jak přišly. Akce bez argumentu (pohyb, boj) zabere jeden bajt. Stejný
+# výchozí stav + seed + stejné akce = stejná hra, takže přehrání dá přesnou kopii běhu z hlášení
+# chyby a zároveň opakovatelnou zátěž pro profilování.
+
+MAGIC = b"SLRC"
+RECORD_VERSION = 2  # 2: za třídou délka a bajty savu, ze kterého běh pokračuje (0 = nový běh)
+HEADER = struct.Struct("<HQ")  # verze, seed
+SAVE_LEN = struct.Struct("<I")
+MAX_RECORDINGS = 50  # Recorder.create maže starší nahrávky nad tento počet
+ACTIONS = list(MOVES) + COMBAT_ACTIONS + EXPLORE_ACTIONS + ["NEXT_FLOOR"]
+ACTION_CODES = {a: i for i, a in enumerate(ACTIONS)}
+HAS_ARG = 0x80  # bit v kódu akce: následuje argument
+END = 0x7F  # konec běhu, za ním otisk stavu (GameEngine.fingerprint)
+FINGERPRINT = struct.Struct("<iiiiiiiI")  # patro, level, xp, souls, hp, x, y, počet místností
+
+
+class RecordingError(Exception):
+    pass
+
+
+def pack_str(text):
+    raw = text.encode("utf-8")
+    return struct.pack("<H", len(raw)) + raw
+
+
+def pack_arg(arg):
+    # Argumenty akcí: index v obchodě, jméno předmětu nebo statu, recept nebo (recept, počet / None)
+    if arg is None: return b"n"
+    if isinstance(arg, int): return b"i" + struct.pack("<i", arg)
+    if isinstance(arg, str): return b"s" + pack_str(arg)
+    if isinstance(arg, tuple): return b"t" + struct.pack("<B", len(arg)) + b"".join(pack_arg(a) for a in arg)
+    raise RecordingError(f"Cannot record argument {arg!r}")
+
+
+def unpack_str(r):
+    n, = r.unpack("<H")
+    text = r.data[r.pos:r.pos + n].decode("utf-8")
+    r.pos += n
+    return text
+
+
+def unpack_arg(r):
+    tag = r.data[r.pos:r.pos + 1]
+    r.pos += 1
+    if tag == b"n": return None
+    if tag == b"i": return r.unpack("<i")[0]
+    if tag == b"s": return unpack_str(r)
+    if tag == b"t": return tuple(unpack_arg(r) for _ in range(r.unpack("<B")[0]))
+    raise RecordingError(f"Bad argument tag {tag!r} at byte {r.pos - 1}")
+
+
+# --- NAHRÁVÁNÍ ---
+class Recorder:
+    def __init__(self, path, seed, name, class_key, save=b""):
+        self.path, self.actions = path, 0
+        self.file = open(path, "wb")
+        self.file.write(MAGIC + HEADER.pack(RECORD_VERSION, seed) + pack_str(name) + pack_str(class_key) +
+                        SAVE_LEN.pack(len(save)) + save)
+        self.file.flush()
+
+    @classmethod
+    def create(cls, record_dir, seed, name, class_key, save=b"", keep=None):
+        os.makedirs(record_dir, exist_ok=True)
+        prune(record_dir, (keep or MAX_RECORDINGS) - 1)
+        path = os.path.join(record_dir, f"run-{time.strftime('%Y%m%d-%H%M%S')}-{seed:016x}.rec")
+        return cls(path, seed, name, class_key, save)
+
+    def record(self, action, arg=None):
+        code = ACTION_CODES.get(action)
+        if code is None: return  # neznámou akci engine ignoruje, není co přehrávat
+        self.file.write(bytes([code]) if arg is None else bytes([code | HAS_ARG]) + pack_arg(arg))
+        self.file.flush()  # po pádu hry musí v souboru být všechno až do posledního tahu
+        self.actions += 1
+
+    def close(self, fingerprint=None):
+        if fingerprint is not None: self.file.write(bytes([END]) + FINGERPRINT.pack(*fingerprint))
+        self.file.close()
+
+
+def prune(record_dir, keep):
+    # Nechá v adresáři jen `keep` nejnovějších nahrávek
+    paths = sorted((os.path.join(record_dir, f) for f in os.listdir(record_dir) if f.endswith(".rec")),
+                   key=lambda path: (os.path.getmtime(path), path))
+    for path in paths[:max(len(paths) - keep, 0)]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass  # nahrávku má zrovna otevřenou jiná instance hry
+
+
+# --- PŘEHRÁVÁNÍ ---
+def read_recording(data):
+    # {"seed", "name", "class", "save": bajty savu u pokračování (jinak b""), "actions": [(akce, argument)],
+    #  "fingerprint": otisk nebo None (běh nedohrán)}
+    if data[:4] != MAGIC: raise RecordingError("Not a run recording")
+    r = Reader(data, 4)
+    try:
+        version, seed = r.unpack(HEADER)
+        if version not in (1, RECORD_VERSION): raise RecordingError(f"Unknown recording version {version}")
+        rec = {"seed": seed, "name": unpack_str(r), "class": unpack_str(r), "save": b"", "actions": [],
+               "fingerprint": None}
+        if version >= 2:
+            n, = r.unpack(SAVE_LEN)
+            rec["save"] = data[r.pos:r.pos + n]
+            if len(rec["save"]) != n: raise RecordingError("Corrupted recording: truncated save")
+            r.pos += n
+        actions = rec["actions"]
+        while r.pos < len(data):
+            code = data[r.pos]
+            r.pos += 1
+            if code == END:
+                rec["fingerprint"] = r.unpack(FINGERPRINT)
+                break
+            actions.append((ACTIONS[code & ~HAS_ARG], unpack_arg(r) if code & HAS_ARG else None))
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise RecordingError(f"Corrupted recording: {e}")
+    return rec
+
+
+def load(path):
+    with open(path, "rb") as f: return read_recording(f.read())
+
+
+def replay(rec):
+    # Běh znovu v GameEngine bez savů a vykreslování; apply() místo step() vynechá observe() po každém tahu
+    eng = GameEngine()
+    with eng.lock:
+        if rec["save"]:
+            eng.resume(savecodec.decode(rec["save"]), rec["save"], rec["seed"])
+        else:
+            eng.new_run(rec["name"], rec["class"], rec["seed"])
+        for action, arg in rec["actions"]: eng.apply(action, arg)
+    return eng
+
+
+# --- SYNTETICKÁ ZÁTĚŽ ---
+def generate(path, steps=20000, seed=1, class_key="MONARCH"):
+    # Náhodný hráč (jen legální akce) nahraje jeden běh - opakovatelná zátěž bez ručního hraní
+    bot = random.Random(seed)
+    eng = GameEngine()
+    eng.start("Bot", class_key, seed)
+    eng.recorder = Recorder(path, seed, "Bot", class_key)
+    for _ in range(steps):
+        if eng.state == "GAMEOVER": break
+        p = eng.player
+        action, arg = bot.choice(eng.legal_actions()), None
+        if eng.state == "COMBAT":
+            # Při nízkém HP léčit nebo utéct, jinak útočit
+            if p.current_hp < p.max_hp * 0.4:
+                action = "POTION" if "Healing Stone" in p.inventory else "RUN"
+            else:
+                action = bot.choice(["ATTACK"] * 4 + ["Q", "W", "E", "SHADOWS"])
+        elif eng.state == "EXPLORE" and p.stat_points:
+            action = "STAT"
+        elif eng.state == "EXPLORE" and bot.random() < 0.9:
+            moves = [a for a in eng.legal_actions() if a in MOVES]
+            if moves: action = bot.choice(moves)
+        if action == "BUY":
+            arg = bot.randrange(len(eng.store))
+        elif action in ("SELL", "EQUIP"):
+            names = eng.player.inventory.names()
+            arg = bot.choice(names) if names else None
+        elif action == "CRAFT":
+            arg = bot.choice(["HOLY_WATER", "HEALING_STONE", ("HEALING_STONE", None)])
+        elif action == "STAT":
+            arg = bot.choice(STAT_KEYS)
+        eng.step(action, arg)
+    eng.close()
+    return eng
+
+
+if __name__ == "__main__":
+    # python replay.py nahravka.rec [--profile]: přehraje běh a ověří otisk konečného stavu
+    # python replay.py --generate nahravka.rec [tahů] [seed]: nahraje běh náhodného hráče
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if "--generate" in sys.argv:
+        eng = generate(args[0], *(int(a) for a in args[1:3]))
+        print(f"{args[0]}: {os.path.getsize(args[0])} bytes, floor {eng.floor}, state {eng.state}")
+        sys.exit(0)
+
+    rec = load(args[0])
+    start = time.perf_counter()
+    if "--profile" in sys.argv:
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        eng = profiler.runcall(replay, rec)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+    else:
+        eng = replay(rec)
+    took = time.perf_counter() - start
+    n = len(rec["actions"])
+    print(f"{rec['name']} ({rec['class']}, seed {rec['seed']:016x}): {n} actions in {took:.3f}s "
+          f"({n / max(took, 1e-9):.0f} actions/s), floor {eng.floor}, state {eng.state}")
+    if rec["fingerprint"] is None:
+        print("no final fingerprint (run not finished)")
+        sys.exit(0)
+    ok = eng.fingerprint() == rec["fingerprint"]
+    print("fingerprint OK" if ok else f"fingerprint MISMATCH: {eng.fingerprint()} != {rec['fingerprint']}")
+    sys.exit(0 if ok else 1)
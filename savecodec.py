@@ -0,0 +1,340 @@
+import io
+import os
+import copy
+import sys
+import time
+import random
+import pickle
+import struct
+import tempfile
+from array import array
+
+from engine import Player, Enemy, Room, Weapon, ChunkedMap, Inventory, DIRS, DIR_BITS
+from catalog import ITEM_NAMES, item_name
+
+# Binární formát savu (struct/array) místo pickle živých objektů.
+# Soubor: MAGIC, verze, tabulka řetězců, hlavička, hráč, inventář, log, obchod, mapa.
+
+MAGIC = b"SLSV"
+SAVE_VERSION = 1
+
+# Předměty se ukládají stálým číslem z catalog.ITEM_NAMES, ostatní jménem
+CUSTOM_ITEM = 0x8000  # id >= 0x8000 odkazuje do tabulky řetězců souboru
+
+
+HEADER = struct.Struct("<iBii")  # patro, flagy (klíč, boss spawnut, boss aktivní, má souřadnice), boss x, y
+PLAYER = struct.Struct("<HHiiiiiiiiiiiBHii")
+WEAPON = struct.Struct("<HiiHdi")
+ENEMY = struct.Struct("<HiiiiiBBBB")
+
+
+class SaveFormatError(Exception):
+    pass
+
+
+class StringTable:
+    def __init__(self):
+        self.ids, self.items = {}, []
+
+    def id(self, text):
+        i = self.ids.get(text)
+        if i is None:
+            i = self.ids[text] = len(self.items)
+            self.items.append(text)
+        return i
+
+
+# --- ZÁPIS ---
+def encode(engine):
+    strings = StringTable()
+    sid = strings.id
+    body = io.BytesIO()
+    w = body.write
+    p = engine.player
+
+    flags = engine.has_key | engine.boss_spawned << 1 | engine.boss_active << 2 | (engine.boss_coords is not None) << 3
+    bx, by = engine.boss_coords or (0, 0)
+    w(HEADER.pack(engine.floor, flags, bx, by))
+
+    w(PLAYER.pack(sid(p.name), sid(p.class_name), p.grid_x, p.grid_y, p.prev_x, p.prev_y, p.level, p.xp, p.xp_next,
+                  p.souls, p.shadows, p.stat_points, int(p.current_hp), p.has_holy_water, sid(p.armor_name),
+                  int(p.current_mana), len(p.stats)))
+    for k, v in p.stats.items(): w(struct.pack("<Hi", sid(k), v))
+    w(struct.pack("<hhh", p.cooldowns["Q"], p.cooldowns["W"], p.cooldowns["E"]))
+    wp = p.weapon
+    w(WEAPON.pack(sid(wp.name), wp.min_dmg, wp.max_dmg, sid(wp.scaling_stat), wp.scaling_rank, wp.value))
+
+    w(struct.pack("<I", len(p.inventory.counts)))
+    for i, n in p.inventory.counts.items():
+        w(struct.pack("<HI", i if i < len(ITEM_NAMES) else CUSTOM_ITEM + sid(item_name(i)), n))
+
+    w(struct.pack("<H", len(engine.log)))
+    w(array("H", [sid(line) for line in engine.log]).tobytes())
+    w(struct.pack("<H", len(engine.store)))
+    for name, cost in engine.store: w(struct.pack("<Hi", sid(name), cost))
+
+    # Mapa jako sloupce: x, y, maska východů, počet nepřátel; potom záznamy nepřátel za sebou
+    xs, ys, masks, counts = array("i"), array("i"), array("B"), array("B")
+    enemies = bytearray()
+    for x, y, mask, room_enemies in engine.map.iter_rooms():
+        xs.append(x)
+        ys.append(y)
+        masks.append(mask)
+        counts.append(len(room_enemies))
+        for e in room_enemies:
+            enemies += ENEMY.pack(sid(e.name), e.hp, e.max_hp, e.dmg, e.xp, e.souls, *e.color, e.is_boss)
+    w(struct.pack("<I", len(xs)))
+    for a in (xs, ys, masks, counts): w(a.tobytes())
+    w(bytes(enemies))
+
+    out = io.BytesIO()
+    out.write(MAGIC + struct.pack("<HI", SAVE_VERSION, len(strings.items)))
+    for text in strings.items:
+        raw = text.encode("utf-8")
+        out.write(struct.pack("<H", len(raw)) + raw)
+    out.write(body.getvalue())
+    return out.getvalue()
+
+
+# --- ČTENÍ ---
+class Reader:
+    def __init__(self, data, pos=0):
+        self.data, self.pos = data, pos
+
+    def unpack(self, st):
+        if isinstance(st, str): st = struct.Struct(st)
+        values = st.unpack_from(self.data, self.pos)
+        self.pos += st.size
+        return values
+
+    def array(self, typecode, n):
+        a = array(typecode)
+        size = a.itemsize * n
+        if self.pos + size > len(self.data): raise ValueError("Truncated array")
+        a.frombytes(self.data[self.pos:self.pos + size])
+        self.pos += size
+        return a
+
+
+def decode(data):
+    # Vrací stav v nejnovějším schématu; staré verze projdou MIGRATIONS
+    if data[:4] == MAGIC:
+        version, = struct.unpack_from("<H", data, 4)
+        if version not in DECODERS: raise SaveFormatError(f"Unknown save version {version}")
+        try:
+            state = DECODERS[version](data)
+        except (struct.error, IndexError, ValueError, StopIteration) as e:
+            raise SaveFormatError(f"Corrupted save: {e}")
+    else:
+        version, state = 0, decode_legacy_pickle(data)
+    while version < SAVE_VERSION:
+        state = MIGRATIONS[version](state)
+        version += 1
+    return state
+
+
+def decode_v1(data):
+    r = Reader(data, 6)
+    n_strings, = r.unpack("<I")
+    strings = []
+    for _ in range(n_strings):
+        n, = r.unpack("<H")
+        strings.append(data[r.pos:r.pos + n].decode("utf-8"))
+        r.pos += n
+
+    floor, flags, bx, by = r.unpack(HEADER)
+    (name, class_name, gx, gy, prev_x, prev_y, level, xp, xp_next, souls, shadows, stat_points, hp, holy, armor,
+     mana, n_stats) = r.unpack(PLAYER)
+    p = Player.__new__(Player)
+    p.name, p.class_name, p.armor_name = strings[name], strings[class_name], strings[armor]
+    p.grid_x, p.grid_y, p.prev_x, p.prev_y = gx, gy, prev_x, prev_y
+    p.level, p.xp, p.xp_next, p.souls, p.shadows = level, xp, xp_next, souls, shadows
+    p.stat_points, p.has_holy_water = stat_points, bool(holy)
+    p.stats = {}
+    for _ in range(n_stats):
+        k, v = r.unpack("<Hi")
+        p.stats[strings[k]] = v
+    q, w_cd, e_cd = r.unpack("<hhh")
+    p.cooldowns = {"Q": q, "W": w_cd, "E": e_cd}
+    w_name, w_min, w_max, w_stat, w_rank, w_val = r.unpack(WEAPON)
+    p.weapon = Weapon(strings[w_name], w_min, w_max, strings[w_stat], w_rank, w_val)
+
+    n_items, = r.unpack("<I")
+    p.inventory = Inventory()
+    for _ in range(n_items):
+        item, n = r.unpack("<HI")
+        p.inventory.add(strings[item - CUSTOM_ITEM] if item >= CUSTOM_ITEM else ITEM_NAMES[item], n)
+    p.max_hp = p.max_mana = p.total_def = 0
+    p.current_hp, p.current_mana = hp, mana
+    p.recalculate()
+
+    n_log, = r.unpack("<H")
+    log = [strings[i] for i in r.array("H", n_log)]
+    n_store, = r.unpack("<H")
+    store = []
+    for _ in range(n_store):
+        s, cost = r.unpack("<Hi")
+        store.append((strings[s], cost))
+
+    n_rooms, = r.unpack("<I")
+    xs, ys, masks, counts = r.array("i", n_rooms), r.array("i", n_rooms), r.array("B", n_rooms), r.array("B", n_rooms)
+    records = ENEMY.iter_unpack(data[r.pos:r.pos + ENEMY.size * sum(counts)])
+    game_map = ChunkedMap()
+    for x, y, mask, count in zip(xs, ys, masks, counts):
+        room_enemies = []
+        for _ in range(count):
+            e_name, e_hp, e_max, e_dmg, e_xp, e_souls, cr, cg, cb, boss = next(records)
+            e = Enemy.__new__(Enemy)
+            e.name, e.hp, e.max_hp, e.dmg, e.xp, e.souls = strings[e_name], e_hp, e_max, e_dmg, e_xp, e_souls
+            e.color, e.is_boss = (cr, cg, cb), bool(boss)
+            room_enemies.append(e)
+        game_map.set_room(x, y, mask, room_enemies)
+
+    return {"player": p, "floor": floor, "map": game_map, "log": log, "store": store,
+            "has_key": bool(flags & 1), "boss_spawned": bool(flags & 2), "boss_active": bool(flags & 4),
+            "boss_coords": (bx, by) if flags & 8 else None}
+
+
+class LegacyUnpickler(pickle.Unpickler):
+    # Staré savy obsahují třídy z __main__ (app.py spuštěné jako skript)
+    def find_class(self, module, name):
+        if name in ("Player", "Enemy", "Room", "Weapon"): return globals()[name]
+        return super().find_class(module, name)
+
+
+def decode_legacy_pickle(data):
+    try:
+        return LegacyUnpickler(io.BytesIO(data)).load()
+    except Exception as e:
+        raise SaveFormatError(f"Unreadable save: {e}")
+
+
+def migrate_0_to_1(state):
+    # Pickle savy z doby před binárním formátem - doplní chybějící atributy hráče a klíče
+    p = state["player"]
+    if not hasattr(p, 'stat_points'): p.stat_points = 0
+    if not hasattr(p, 'has_holy_water'): p.has_holy_water = False
+    if not hasattr(p, 'armor_name'): p.armor_name = "Basic Clothes"
+    if isinstance(p.inventory, list): p.inventory = Inventory(p.inventory)
+    state.setdefault("boss_spawned", False)
+    state.setdefault("boss_active", False)
+    state.setdefault("boss_coords", None)
+    state.setdefault("store", [])
+    game_map = ChunkedMap()
+    for (x, y), room in state["map"].items(): game_map.set_room(x, y, room.mask, room.enemies)
+    state["map"] = game_map
+    return state
+
+
+DECODERS = {1: decode_v1}
+MIGRATIONS = {0: migrate_0_to_1}
+
+
+# --- BENCHMARK ---
+def build_sample_engine(n_rooms, seed=1):
+    from engine import GameEngine
+    random.seed(seed)
+    eng = GameEngine()
+    eng.start("Benchmark", "ASSASSIN")
+    eng.player.inventory += random.choices(ITEM_NAMES, k=200)
+    side = int(n_rooms ** 0.5) + 1
+    for i in range(n_rooms - 1):
+        room = Room(random.choice(DIRS))
+        if random.random() < 0.3:
+            room.set_enemies(Enemy(random.randint(1, 30)) for _ in range(random.randint(1, 3)))
+        eng.map[(i % side, i // side + 1)] = room
+    return eng
+
+
+# --- KONTROLA ---
+def check_spilled_save(n_rooms=3000):
+    # Vrací seznam problémů - uložení mapy s chunky odloženými na disk je nesmí vrátit do paměti
+    # a save musí obsahovat i odložené místnosti
+    problems = []
+    with tempfile.TemporaryDirectory() as tmp:
+        eng = build_sample_engine(n_rooms)
+        game_map = eng.map
+        game_map.spill_dir, game_map.keep_radius, game_map.max_loaded = tmp, 1, 4
+        game_map.spill_far(0, 0)
+        spilled, loaded = set(game_map.spilled), set(game_map.chunks)
+        files = sorted(os.listdir(game_map.spill_path))
+        if not spilled: problems.append("no chunks were spilled")
+        rooms = sorted((x, y, mask, len(enemies)) for x, y, mask, enemies in game_map.iter_rooms())
+        data = encode(eng)
+        if game_map.spilled != spilled or set(game_map.chunks) != loaded:
+            problems.append(f"saving reloaded {len(spilled - game_map.spilled)} spilled chunks")
+        if sorted(os.listdir(game_map.spill_path)) != files: problems.append("saving removed spilled chunk files")
+        saved = sorted((x, y, mask, len(enemies)) for x, y, mask, enemies in decode(data)["map"].iter_rooms())
+        if len(rooms) != n_rooms or saved != rooms: problems.append(f"save has {len(saved)} of {n_rooms} rooms")
+        game_map.close()
+    return problems
+
+
+def check_legacy_save(n_rooms=1000):
+    # Starý pickle save (legacy_state) musí projít decode() -> migrate_0_to_1 zpět do stejné mapy a inventáře
+    eng = build_sample_engine(n_rooms)
+    data = pickle.dumps(legacy_state(eng))
+    problems = ["legacy save pickles the live ChunkedMap"] if b"ChunkedMap" in data else []
+    state = decode(data)
+    if not isinstance(state["map"], ChunkedMap): problems.append("legacy map was not migrated to ChunkedMap")
+    rooms = sorted((x, y, mask, len(enemies)) for x, y, mask, enemies in eng.map.iter_rooms())
+    if sorted((x, y, mask, len(enemies)) for x, y, mask, enemies in state["map"].iter_rooms()) != rooms:
+        problems.append("legacy save rooms differ after migration")
+    if state["player"].inventory.counts != eng.player.inventory.counts:
+        problems.append("legacy save inventory differs after migration")
+    return problems
+
+
+class LegacyRoom:
+    # Místnost jako v pickle savech před binárním formátem: __dict__ s exits (dict) a enemies (seznam).
+    # Pickluje se jako Room, takže ji při načtení vytvoří LegacyUnpickler stejně jako u starého savu.
+    def __init__(self, mask, enemies):
+        self.enemies = list(enemies)
+        self.exits = {d: bool(mask & DIR_BITS[d]) for d in DIRS}
+
+    def __reduce__(self):
+        return object.__new__, (Room,), self.__dict__
+
+
+def legacy_state(eng):
+    # Stav ve tvaru starého pickle savu: mapa jako dict {(x, y): Room}, inventář a log jako seznamy.
+    # Místnosti přes iter_rooms - RoomRef by do pickle vzal celou ChunkedMap.
+    p = copy.copy(eng.player)
+    p.inventory = [item_name(i) for i, n in eng.player.inventory.counts.items() for _ in range(n)]
+    game_map = {(x, y): LegacyRoom(mask, enemies) for x, y, mask, enemies in eng.map.iter_rooms()}
+    return {"player": p, "floor": eng.floor, "map": game_map, "log": list(eng.log),
+            "has_key": eng.has_key, "boss_spawned": eng.boss_spawned, "boss_active": eng.boss_active,
+            "boss_coords": eng.boss_coords, "store": eng.store}
+
+
+def benchmark(sizes=(10, 1000, 100000)):
+    rows = []
+    for n in sizes:
+        eng = build_sample_engine(n)
+        state = legacy_state(eng)
+        # Pickle se čte přes decode(), tedy i s migrate_0_to_1 - tak jako starý save při načtení
+        for fmt, enc, dec in [("pickle", lambda: pickle.dumps(state), decode),
+                              ("binary", lambda: encode(eng), decode)]:
+            reps = max(1, 2000 // n)
+            start = time.perf_counter()
+            for _ in range(reps): data = enc()
+            t_enc = (time.perf_counter() - start) / reps
+            start = time.perf_counter()
+            for _ in range(reps): dec(data)
+            t_dec = (time.perf_counter() - start) / reps
+            rows.append((len(eng.map), fmt, len(data), t_enc * 1000, t_dec * 1000))
+    return rows
+
+
+if __name__ == "__main__":
+    # python savecodec.py [--check]: benchmark formátů savu, s --check kontrola savu s odloženou mapou
+    # a načtení starého pickle savu
+    if "--check" in sys.argv:
+        problems = check_spilled_save() + check_legacy_save()
+        for p in problems: print("CHECK:", p)
+        print("OK" if not problems else f"{len(problems)} problem(s)")
+        sys.exit(1 if problems else 0)
+    print(f"{'rooms':>7} {'format':>7} {'bytes':>10} {'encode ms':>10} {'decode ms':>10}")
+    for rooms, fmt, size, t_enc, t_dec in benchmark():
+        print(f"{rooms:>7} {fmt:>7} {size:>10} {t_enc:>10.2f} {t_dec:>10.2f}")
+    sys.exit(0)
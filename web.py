@@ -1,52 +1,49 @@
-from flask import Flask, render_template_string, request, redirect, url_for
+from flask import Flask, request, redirect, url_for, jsonify, Response
+from markupsafe import Markup
 import sqlite3
+import datetime
+import gzip
+import hashlib
 import os
+import hmac
+from catalog import (LOOT_DB, BOSS_WEAPONS, DEMON_TYPES, BOSS_TYPES, BOSS_DROP_CHANCE, CLASSES, STORE_ITEMS,
+                     STORE_ARMOR_DEF, store_weapon, boss_stats)
+
+from database import (ConnectionPool, Leaderboard, ladder_page, save_runs, stats_summary, search_hunters, hunter_rank,
+                      SQL_VERSION, SQL_USER_EXISTS, SQL_HUNTER_RUNS, MAX_PAGE, SEARCH_LIMIT, MAX_SEARCH)
 
 app = Flask(__name__)
 DB_PATH = 'sololeveling_v15.db'
+DB_TUNED = False  # WAL pro souběh s hrou - mění soubor databáze natrvalo, stejně jako DB_TUNED v app.py
+db = ConnectionPool(DB_PATH, DB_TUNED)
+db.setup()  # schéma jednou při startu, ne při každém POST
+
+
+@app.teardown_appcontext
+def release_db(exc):
+    db.release()
+
 
 # --- HERNÍ DATA PRO WIKI ---
-LOOT_DB = {
-    "Demon Horn": 15, "Torn Cloth": 5, "Beast Fang": 25,
-    "Shadow Core": 50, "Broken Bone": 10, "Magic Dust": 35,
-    "Goblin Ear": 8, "Wolf Pelt": 12,
-    "Iron Ore": 10, "Magic Crystal": 20,
-    "Weapon Scraps": 150, "Armor Scraps": 100
-}
-
-BOSS_WEAPONS = {
-    "Vulcan's Club": (15, 25, "STR", 1.5, 1000),
-    "Metus' Scythe": (10, 30, "INT", 1.6, 1500),
-    "Baran's Daggers": (20, 35, "DEX", 1.8, 2500)
-}
+# Všechno z catalog.py, které používá i hra - wiki tak nemůže ukazovat jiná čísla než hra
+HUNTER_CLASSES = list(CLASSES)
+
+# (Jméno, Min Patro, HP, DMG, XP, Souls); bossové se staty na patře, od kterého se objevují
+WIKI_DEMONS = ([(name, floor, hp, dmg, xp, souls) for name, floor, color, hp, dmg, xp, souls in DEMON_TYPES] +
+               [(f"{name} (Boss)", floor) + boss_stats(floor) for name, floor, weapon in BOSS_TYPES])
+
+def store_effect(kind, cost):
+    if kind == "Armor": return f"+{STORE_ARMOR_DEF} Total DEF"
+    min_dmg, max_dmg, stat, rank = store_weapon(cost)
+    return f"{min_dmg} - {max_dmg} DMG ({stat.upper()} scaling)"
+
 
 # (Jméno, Typ, Staty/Efekt, Odemknutí, Cena)
-STORE_EQUIPMENT = [
-    ("Killer Dagger", "Weapon", "10 - 16 DMG (STR scaling)", "Available from Start", 500),
-    ("Shadow Armor", "Armor", "+5 Total DEF", "Unlocks at Floor 5", 1500),
-    ("Demon King's Sword", "Weapon", "50 - 83 DMG (STR scaling)", "Unlocks at Floor 10", 2500),
-    ("Orb of Avarice", "Weapon", "40 - 66 DMG (STR scaling)", "Unlocks at Floor 10", 2000),
-]
-
-# (Jméno, Min Patro, HP, DMG, XP, Souls)
-DEMON_TYPES = [
-    ("Goblin", 1, 15, 3, 4, 5),
-    ("Low Rank Demon", 1, 20, 5, 5, 10),
-    ("Dire Wolf", 2, 25, 6, 8, 12),
-    ("Flying Demon", 3, 30, 8, 10, 15),
-    ("Hobgoblin", 4, 45, 12, 18, 25),
-    ("Cerberus", 5, 60, 15, 25, 50),
-    ("Shadow Beast", 7, 70, 18, 30, 35),
-    ("High Orc", 10, 80, 20, 35, 40),
-    ("Vampire", 12, 100, 25, 45, 60),
-    ("Demon Knight", 15, 120, 30, 60, 80),
-    ("Death Knight", 18, 140, 40, 80, 100),
-    ("Arch-Lich", 20, 150, 50, 100, 150),
-    ("Bone Dragon", 25, 200, 60, 150, 200),
-    ("VULCAN (Boss)", 10, 345, 34, 575, 345),
-    ("METUS (Boss)", 20, 1200, 120, 2000, 1200),
-    ("BARAN (Boss)", 30, 1650, 165, 2750, 1650),
-]
+STORE_EQUIPMENT = [(name, kind, store_effect(kind, cost), "Available from Start" if floor <= 1 else f"Unlocks at Floor {floor}",
+                    cost) for name, cost, floor, kind in STORE_ITEMS if kind in ("Weapon", "Armor")]
+
+# Žebříček celkově a pro každou třídu (None = všechny třídy)
+leaderboards = {cls: Leaderboard(db.query, cls=cls) for cls in [None] + HUNTER_CLASSES}
 
 # --- HTML ŠABLONA ---
 HTML_TEMPLATE = """
@@ -82,6 +79,10 @@ HTML_TEMPLATE = """
         .register-form button { background: #00beff; color: black; padding: 10px 30px; border: none; font-size: 1.3em; font-weight: bold; cursor: pointer; text-transform: uppercase;}
         .register-form button:hover { background: #50ff64; box-shadow: 0 0 15px #50ff64;}
 
+        .class-filter { text-align: center; font-size: 1.2em; }
+        .class-filter a { color: #646478; margin: 0 8px; text-decoration: none; text-transform: uppercase; }
+        .class-filter a.active { color: #b432ff; font-weight: bold; text-shadow: 0 0 5px #b432ff; }
+
         .error { color: #ff2828; font-weight: bold; font-size: 1.2em; text-shadow: 0 0 5px #ff2828;}
         .success { color: #50ff64; font-weight: bold; font-size: 1.2em; text-shadow: 0 0 5px #50ff64;}
     </style>
@@ -102,21 +103,11 @@ HTML_TEMPLATE = """
         <button class="tab-btn" onclick="showTab('register')">Register</button>
         <button class="tab-btn" onclick="showTab('bestiary')">Bestiary</button>
         <button class="tab-btn" onclick="showTab('items')">Item Database</button>
+        <button class="tab-btn" onclick="location.href='/stats'">Statistics</button>
     </div>
 
     <div id="rankings" class="tab-content active">
-        <h2 style="color:#ffd700; text-align:center;">Global Rankings</h2>
-        <table>
-            <tr><th>Rank</th><th>Hunter</th><th>Class</th><th>Max Floor</th><th>Level</th><th>Souls</th></tr>
-            {% for h in hunters %}
-            <tr>
-                <td style="color:#ffd700; font-weight:bold;">#{{ loop.index }}</td>
-                <td>{{ h[0] }}</td><td style="color:#b432ff;">{{ h[1] }}</td>
-                <td style="color:#00beff;">{{ h[2] }}</td><td style="color:#50ff64;">{{ h[3] }}</td>
-                <td style="color:#ff2828;">{{ h[4] }}</td>
-            </tr>
-            {% endfor %}
-        </table>
+{{ rankings }}
     </div>
 
     <div id="register" class="tab-content">
@@ -137,6 +128,39 @@ HTML_TEMPLATE = """
         </form>
     </div>
 
+{{ wiki }}
+
+    {% if msg or err %}
+    <script>
+        showTab('register');
+    </script>
+    {% endif %}
+</body>
+</html>
+"""
+
+# Žebříček - jediná část stránky, která se vykresluje podle dat
+RANKINGS_TEMPLATE = """
+        <h2 style="color:#ffd700; text-align:center;">{% if hunter_class %}{{ hunter_class }} {% else %}Global {% endif %}Rankings</h2>
+        <div class="class-filter">
+            <a href="/" class="{% if not hunter_class %}active{% endif %}">All</a>
+            {% for c in classes %}<a href="/?class={{ c }}" class="{% if c == hunter_class %}active{% endif %}">{{ c }}</a>{% endfor %}
+        </div>
+        <table>
+            <tr><th>Rank</th><th>Hunter</th><th>Class</th><th>Max Floor</th><th>Level</th><th>Souls</th></tr>
+            {% for h in hunters %}
+            <tr>
+                <td style="color:#ffd700; font-weight:bold;">#{{ loop.index }}</td>
+                <td><a href="/hunter/{{ h[0] | urlencode }}" style="color:#f0f0ff;">{{ h[0] }}</a></td><td style="color:#b432ff;">{{ h[1] }}</td>
+                <td style="color:#00beff;">{{ h[2] }}</td><td style="color:#50ff64;">{{ h[3] }}</td>
+                <td style="color:#ff2828;">{{ h[4] }}</td>
+            </tr>
+            {% endfor %}
+        </table>
+"""
+
+# Bestiář a databáze předmětů - konstantní, vykreslí se jednou při startu
+WIKI_TEMPLATE = """
     <div id="bestiary" class="tab-content">
         <h2 style="color:#ff2828; text-align:center;">System Bestiary</h2>
         <table>
@@ -172,14 +196,14 @@ HTML_TEMPLATE = """
             {% endfor %}
         </table>
 
-        <h3 style="color:#ffd700; border-bottom: 1px solid #ffd700; margin-top:30px;">Boss Rare Weapons (30% Drop Chance)</h3>
+        <h3 style="color:#ffd700; border-bottom: 1px solid #ffd700; margin-top:30px;">Boss Rare Weapons ({{ (drop_chance * 100) | round | int }}% Drop Chance)</h3>
         <table>
             <tr><th>Weapon Name</th><th>Damage Range</th><th>Scaling Stat</th><th>Scale Multiplier</th><th>Sell Value (Souls)</th></tr>
             {% for name, stats in weapons.items() %}
             <tr>
                 <td style="color:#ffd700;">{{ name }}</td>
                 <td>{{ stats[0] }} - {{ stats[1] }}</td>
-                <td style="color:#00beff;">{{ stats[2] }}</td>
+                <td style="color:#00beff;">{{ stats[2] | upper }}</td>
                 <td>x{{ stats[3] }}</td>
                 <td style="color:#b432ff;">{{ stats[4] }}</td>
             </tr>
@@ -198,33 +222,184 @@ HTML_TEMPLATE = """
             {% endfor %}
         </table>
     </div>
+"""
 
-    {% if msg or err %}
-    <script>
-        showTab('register');
-    </script>
+
+# Statistiky ze souhrnných tabulek (database.stats_summary)
+STATS_TEMPLATE = """
+<!DOCTYPE html>
+<html lang="cs">
+<head>
+    <meta charset="UTF-8">
+    <title>Solo Leveling | Hunter Statistics</title>
+    <link href="https://fonts.googleapis.com/css2?family=Rajdhani:wght@500;700&display=swap" rel="stylesheet">
+    <style>
+        body { background-color: #05080f; color: #f0f0ff; font-family: 'Rajdhani', sans-serif; display: flex; flex-direction: column; align-items: center; margin: 0; padding-bottom: 50px;}
+        h1 { color: #00beff; font-size: 3em; text-transform: uppercase; text-shadow: 0 0 20px #00beff; margin-top: 30px;}
+        a { color: #00beff; }
+        .panel { width: 90%; max-width: 1000px; background: #0a0d18; border: 2px solid #00beff; border-radius: 10px; padding: 20px; margin-top: 20px; box-shadow: 0 0 15px rgba(0, 190, 255, 0.2); }
+        table { width: 100%; border-collapse: collapse; margin-top: 15px; }
+        th { color: #ffd700; padding: 10px; border-bottom: 2px solid #00beff; text-transform: uppercase; }
+        td { padding: 8px; text-align: center; border-bottom: 1px solid #141928; font-size: 1.1em;}
+        .bar { background: #b432ff; height: 12px; display: inline-block; box-shadow: 0 0 5px #b432ff; }
+    </style>
+</head>
+<body>
+    <h1>Hunter Statistics</h1>
+    <a href="/">Back to Rankings</a>
+
+    <div class="panel">
+        <h2 style="color:#ffd700; text-align:center;">Classes</h2>
+        <table>
+            <tr><th>Class</th><th>Runs</th><th>Pick Rate</th><th>Avg Floor</th><th>Max Floor</th><th>Avg Level</th><th>Avg Souls</th></tr>
+            {% for cls, c in stats.classes.items() %}
+            <tr>
+                <td style="color:#b432ff; font-weight:bold;">{{ cls }}</td><td>{{ c.runs }}</td>
+                <td style="color:#50ff64;">{{ '%.1f' % (c.pick_rate * 100) }}%</td>
+                <td style="color:#00beff;">{{ '%.1f' % c.avg_floor }}</td><td style="color:#00beff;">{{ c.max_floor }}</td>
+                <td>{{ '%.1f' % c.avg_level }}</td><td style="color:#ff2828;">{{ '%.0f' % c.avg_souls }}</td>
+            </tr>
+            {% endfor %}
+        </table>
+    </div>
+
+    <div class="panel">
+        <h2 style="color:#00beff; text-align:center;">Runs per Day (since {{ stats.since }})</h2>
+        <table>
+            <tr><th>Day</th><th>Class</th><th>Runs</th><th>Avg Floor</th><th>Max Floor</th><th>Max Level</th><th>Avg Souls</th></tr>
+            {% for d in stats.daily %}
+            <tr>
+                <td>{{ d.day }}</td><td style="color:#b432ff;">{{ d['class'] }}</td><td>{{ d.runs }}</td>
+                <td style="color:#00beff;">{{ '%.1f' % d.avg_floor }}</td><td style="color:#00beff;">{{ d.max_floor }}</td>
+                <td style="color:#50ff64;">{{ d.max_level }}</td><td style="color:#ff2828;">{{ '%.0f' % d.avg_souls }}</td>
+            </tr>
+            {% endfor %}
+        </table>
+    </div>
+
+    <div class="panel">
+        <h2 style="color:#ff2828; text-align:center;">Floor Reached</h2>
+        {% for cls, floors in stats.floors.items() %}
+        <h3 style="color:#b432ff;">{{ cls }}</h3>
+        <table>
+            {% set top = floors.values() | max %}
+            {% for floor, runs in floors.items() %}
+            <tr><td style="width:15%;">Floor {{ floor }}</td><td style="text-align:left;"><span class="bar" style="width: {{ (runs / top * 100) | round(1) }}%;"></span></td><td style="width:15%;">{{ runs }}</td></tr>
+            {% endfor %}
+        </table>
+        {% endfor %}
+    </div>
+</body>
+</html>
+"""
+
+# Profil lovce: nejlepší run, pořadí a jeho nejlepší runy
+HUNTER_TEMPLATE = """
+<!DOCTYPE html>
+<html lang="cs">
+<head>
+    <meta charset="UTF-8">
+    <title>Solo Leveling | {{ name }}</title>
+    <link href="https://fonts.googleapis.com/css2?family=Rajdhani:wght@500;700&display=swap" rel="stylesheet">
+    <style>
+        body { background-color: #05080f; color: #f0f0ff; font-family: 'Rajdhani', sans-serif; display: flex; flex-direction: column; align-items: center; margin: 0; padding-bottom: 50px;}
+        h1 { color: #00beff; font-size: 3em; text-transform: uppercase; text-shadow: 0 0 20px #00beff; margin-top: 30px;}
+        a { color: #00beff; }
+        .panel { width: 90%; max-width: 1000px; background: #0a0d18; border: 2px solid #00beff; border-radius: 10px; padding: 20px; margin-top: 20px; box-shadow: 0 0 15px rgba(0, 190, 255, 0.2); }
+        table { width: 100%; border-collapse: collapse; margin-top: 15px; }
+        th { color: #ffd700; padding: 10px; border-bottom: 2px solid #00beff; text-transform: uppercase; }
+        td { padding: 8px; text-align: center; border-bottom: 1px solid #141928; font-size: 1.1em;}
+    </style>
+</head>
+<body>
+    <h1>{{ name }}</h1>
+    <a href="/">Back to Rankings</a>
+
+    <div class="panel">
+        {% if rank %}
+        <h2 style="color:#ffd700; text-align:center;">Rank #{{ rank[0] }} &middot; {{ rank[2][3] }} #{{ rank[1] }}</h2>
+        <p style="text-align:center; font-size:1.3em;">Best run: Floor <span style="color:#00beff;">{{ rank[2][4] }}</span>,
+            Level <span style="color:#50ff64;">{{ rank[2][5] }}</span>, <span style="color:#ff2828;">{{ rank[2][6] }}</span> souls ({{ rank[2][1] }})</p>
+        {% elif known %}
+        <h2 style="color:#b432ff; text-align:center;">Awakened, no runs yet</h2>
+        {% else %}
+        <h2 style="color:#ff2828; text-align:center;">Unknown Hunter</h2>
+        {% endif %}
+    </div>
+
+    {% if runs %}
+    <div class="panel">
+        <h2 style="color:#00beff; text-align:center;">Best Runs</h2>
+        <table>
+            <tr><th>Date</th><th>Class</th><th>Floor</th><th>Level</th><th>Souls</th></tr>
+            {% for r in runs %}
+            <tr>
+                <td>{{ r[1] }}</td><td style="color:#b432ff;">{{ r[3] }}</td><td style="color:#00beff;">{{ r[4] }}</td>
+                <td style="color:#50ff64;">{{ r[5] }}</td><td style="color:#ff2828;">{{ r[6] }}</td>
+            </tr>
+            {% endfor %}
+        </table>
+    </div>
     {% endif %}
 </body>
 </html>
 """
 
+# --- PŘEDKOMPILOVANÉ ŠABLONY ---
+# Šablony se kompilují jednou při startu a wiki se vykreslí jednou. Stránka bez hlášky z registrace
+# je hlavička + žebříček + patička, kde se vykresluje jen žebříček, a to jen při jeho změně.
+PAGE = app.jinja_env.from_string(HTML_TEMPLATE)
+RANKINGS = app.jinja_env.from_string(RANKINGS_TEMPLATE)
+STATS = app.jinja_env.from_string(STATS_TEMPLATE)
+HUNTER = app.jinja_env.from_string(HUNTER_TEMPLATE)
+WIKI_HTML = Markup(app.jinja_env.from_string(WIKI_TEMPLATE).render(
+    loot=LOOT_DB, weapons=BOSS_WEAPONS, store_equip=STORE_EQUIPMENT, demons=WIKI_DEMONS, drop_chance=BOSS_DROP_CHANCE))
+RANKINGS_SLOT = "<!-- rankings -->"
+PAGE_HEAD, PAGE_TAIL = (part.encode() for part in PAGE.render(rankings=Markup(RANKINGS_SLOT), wiki=WIKI_HTML).split(RANKINGS_SLOT))
+CACHE_CONTROL = "public, no-cache"  # prohlížeč si stránku drží, ale ověří ji přes ETag
+
+page_cache = {}  # třída -> (řádky žebříčku, tělo, gzip tělo, etag)
+
+
+def cached_response(body, gz, etag):
+    # Silný ETag zvlášť pro každé kódování; 304 bez těla, když ho klient už má
+    use_gzip = 'gzip' in request.headers.get('Accept-Encoding', '')
+    if use_gzip: etag += '-gz'
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        resp = Response(gz if use_gzip else body, mimetype='text/html')
+        if use_gzip: resp.headers['Content-Encoding'] = 'gzip'
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = CACHE_CONTROL
+    resp.headers['Vary'] = 'Accept-Encoding'
+    return resp
+
+
+def render_rankings(rows, hunter_class):
+    hunters = [(name, cls, floor, level, souls) for _, _, name, cls, floor, level, souls in rows]
+    return RANKINGS.render(hunters=hunters, classes=HUNTER_CLASSES, hunter_class=hunter_class)
+
 
 @app.route('/')
 def index():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    hunter_class = request.args.get('class')
+    if hunter_class not in leaderboards: hunter_class = None
     try:
-        c.execute('SELECT name, class, floor, level, souls FROM hunters ORDER BY floor DESC, level DESC LIMIT 10')
-        hunters = c.fetchall()
+        rows = leaderboards[hunter_class].get()
     except sqlite3.OperationalError:
-        hunters = []  # Pokud tabulka ještě neexistuje
-    finally:
-        conn.close()
+        rows = []  # Databáze je zrovna nedostupná
 
     msg = request.args.get('msg')
     err = request.args.get('err')
-    return render_template_string(HTML_TEMPLATE, hunters=hunters, loot=LOOT_DB, weapons=BOSS_WEAPONS,
-                                  store_equip=STORE_EQUIPMENT, demons=DEMON_TYPES, msg=msg, err=err)
+    if msg or err:
+        return PAGE.render(rankings=Markup(render_rankings(rows, hunter_class)), wiki=WIKI_HTML, msg=msg, err=err)
+
+    cached = page_cache.get(hunter_class)
+    if cached is None or cached[0] != rows:
+        body = PAGE_HEAD + render_rankings(rows, hunter_class).encode() + PAGE_TAIL
+        cached = page_cache[hunter_class] = (rows, body, gzip.compress(body, 6), hashlib.sha1(body).hexdigest())
+    return cached_response(*cached[1:])
 
 
 @app.route('/register', methods=['POST'])
@@ -236,17 +411,144 @@ def register():
     if not bot_check:
         return redirect(url_for('index', err="You must confirm you are not a bot!"))
 
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, password TEXT)''')
     try:
-        c.execute('INSERT INTO users (username, password) VALUES (?, ?)', (user, pwd))
-        conn.commit()
+        db.execute('INSERT INTO users (username, password) VALUES (?, ?)', (user, pwd))
         return redirect(url_for('index', msg=f"Hunter '{user}' Awakened! You can now login in the game."))
     except sqlite3.IntegrityError:
         return redirect(url_for('index', err="Hunter Name already taken!"))
-    finally:
-        conn.close()
+
+
+@app.route('/api/rankings')
+def api_rankings():
+    # Celý žebříček po stránkách: ?limit=1..1000&after=<next z minulé stránky>&class=MAGE&since=&until=
+    # (data YYYY-MM-DD). since/until filtrují podle data NEJLEPŠÍHO runu lovce (hunter_best.date):
+    # "od X" = lovci, jejichž rekord padl od X, ne nejlepší runy odehrané od X - lovec se starším
+    # rekordem, který od X hrál hůř, ve výsledku není. ETag = verze žebříčku, při shodě 304 bez dotazu.
+    args = request.args
+    try:
+        limit = int(args.get('limit', 100))
+        after = tuple(int(x) for x in args['after'].split('.')) if args.get('after') else None
+        if not 1 <= limit <= MAX_PAGE or (after and len(after) != 3): raise ValueError
+    except ValueError:
+        return jsonify(error=f"limit must be 1-{MAX_PAGE}, after must be floor.level.id"), 400
+    try:
+        # Data se porovnávají jako text, takže jen v normalizovaném tvaru YYYY-MM-DD
+        since, until = (datetime.date.fromisoformat(args[k]).isoformat() if args.get(k) else None
+                        for k in ('since', 'until'))
+    except ValueError:
+        return jsonify(error="since and until must be dates YYYY-MM-DD"), 400
+
+    version = db.query(SQL_VERSION)[0][0]
+    etag = f"v{version}"
+    if request.if_none_match.contains(etag): return '', 304, {'ETag': f'"{etag}"'}
+
+    rows, next_key = ladder_page(db.query, limit, after, args.get('class'), since, until)
+    items = [{"id": run_id, "date": date, "name": name, "class": cls, "floor": floor, "level": level, "souls": souls}
+             for run_id, date, name, cls, floor, level, souls in rows]
+    resp = jsonify(items=items, next='.'.join(map(str, next_key)) if next_key else None)
+    resp.set_etag(etag)
+    return resp
+
+
+MAX_BATCH = 1000
+RUN_FIELDS = {"name": str, "class": str, "floor": int, "level": int, "souls": int}
+# Horní meze čísel z klienta - víc hra nedá a větší číslo by SQLite INTEGER ani nepobral
+RUN_LIMITS = {"floor": 10000, "level": 10000, "souls": 10 ** 12}
+MAX_UID = 64
+# Sdílený klíč klientů, kteří smějí zapisovat runy (posílají ho v hlavičce X-Ingest-Token);
+# bez nastavené proměnné je /api/runs vypnuté
+INGEST_TOKEN = os.environ.get("SOLOLEVELING_INGEST_TOKEN")
+
+
+def parse_run(run, today):
+    # Run z klienta -> slovník pro save_runs; ValueError při chybějícím nebo špatném poli
+    if not isinstance(run, dict): raise ValueError("run must be an object")
+    for k, t in RUN_FIELDS.items():
+        if not isinstance(run.get(k), t) or isinstance(run.get(k), bool): raise ValueError(f"bad field '{k}'")
+    for k, top in RUN_LIMITS.items():
+        if not 0 <= run[k] <= top: raise ValueError(f"field '{k}' must be 0-{top}")
+    if run["class"] not in CLASSES: raise ValueError(f"unknown class '{run['class']}'")
+    # Datum vždy jako YYYY-MM-DD - statistiky a filtry since/until ho porovnávají jako text
+    date = datetime.date.fromisoformat(run.get("date") or today).isoformat()
+    uid = run.get("uid")
+    if uid is not None and (not isinstance(uid, str) or len(uid) > MAX_UID): raise ValueError("bad field 'uid'")
+    return {"uid": uid, "date": date, **{k: run[k] for k in RUN_FIELDS}}
+
+
+@app.route('/api/runs', methods=['POST'])
+def api_runs():
+    # Dávka dohraných runů od klientů: {"runs": [{uid, date, name, class, floor, level, souls}, ...]}
+    # zapsaná jednou transakcí; runy se stejným uid (opakované odeslání) se uloží jen jednou.
+    # Jen s platným X-Ingest-Token a jen pro lovce registrované na webu.
+    if not INGEST_TOKEN: return jsonify(error="run ingestion is disabled"), 403
+    if not hmac.compare_digest(request.headers.get('X-Ingest-Token', ''), INGEST_TOKEN):
+        return jsonify(error="invalid ingest token"), 401
+    data = request.get_json(silent=True)
+    runs = data.get('runs') if isinstance(data, dict) else data
+    if not isinstance(runs, list) or not 1 <= len(runs) <= MAX_BATCH:
+        return jsonify(error=f"expected 1-{MAX_BATCH} runs"), 400
+    today = datetime.date.today().isoformat()
+    try:
+        runs = [parse_run(run, today) for run in runs]
+    except (ValueError, TypeError) as e:
+        return jsonify(error=str(e)), 400
+    unknown = sorted(name for name in {run["name"] for run in runs} if not db.query(SQL_USER_EXISTS, (name,)))
+    if unknown: return jsonify(error=f"unknown hunters: {', '.join(unknown[:10])}"), 400
+    try:
+        added = db.write(lambda conn: save_runs(conn, runs))
+    except sqlite3.OperationalError:
+        return jsonify(error="database busy, retry later"), 503  # zamčená databáze - klient dávku pošle znovu
+    return jsonify(received=len(runs), added=added)
+
+
+@app.route('/api/hunters')
+def api_hunters():
+    # Registrovaní lovci podle začátku jména (bez ohledu na velikost písmen): ?prefix=ab&limit=1..100
+    try:
+        limit = int(request.args.get('limit', SEARCH_LIMIT))
+        if not 1 <= limit <= MAX_SEARCH: raise ValueError
+    except ValueError:
+        return jsonify(error=f"limit must be 1-{MAX_SEARCH}"), 400
+    rows = search_hunters(db.query, request.args.get('prefix', ''), limit)
+    return jsonify(items=[{"name": name, "class": cls, "floor": floor, "level": level}
+                          for name, cls, floor, level in rows])
+
+
+HUNTER_RUNS = 20
+
+
+@app.route('/hunter/<name>')
+def hunter_page(name):
+    rank = hunter_rank(db.query, name)
+    if rank is None and not db.query(SQL_USER_EXISTS, (name,)):
+        return HUNTER.render(name=name, rank=None, known=False, runs=[]), 404
+    return HUNTER.render(name=name, rank=rank, known=True, runs=db.query(SQL_HUNTER_RUNS, (name, HUNTER_RUNS)))
+
+
+def stats_days():
+    try:
+        return min(max(int(request.args.get('days', 30)), 1), 366)
+    except ValueError:
+        return 30
+
+
+@app.route('/stats')
+def stats_page():
+    return STATS.render(stats=stats_summary(db.query, stats_days()))
+
+
+@app.route('/api/stats')
+def api_stats():
+    # Statistiky jako JSON: ?days=1..366 (výchozí 30) pro přehled po dnech
+    return jsonify(stats_summary(db.query, stats_days()))
+
+
+@app.route('/debug/db')
+def db_stats():
+    # Počítadla otevřených spojení a času dotazů
+    hits = sum(lb.hits for lb in leaderboards.values())
+    reloads = sum(lb.reloads for lb in leaderboards.values())
+    return jsonify({**db.stats(), "leaderboard": {"hits": hits, "reloads": reloads}})
 
 
 if __name__ == '__main__':